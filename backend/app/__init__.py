@@ -2,10 +2,30 @@ from flask import Flask
 from flask_cors import CORS
 from flask_mail import Mail
 from config import config
+from .utils.cache import ContentCache, TTLCache
+from .utils.artifacts import ArtifactStore
+from .services.job_service import JobQueue
+from .services.llm_client import LLMClient
+from .utils import stages
 
 # Initialize Flask-Mail at module level for import
 mail = Mail()
 
+# Cache of vision analysis results, keyed by the hash of the decoded image
+analysis_cache = ContentCache()
+
+# Parsed LLM responses, keyed by model, system prompt and normalized prompt
+llm_cache = TTLCache()
+
+# Deadline, retry and circuit-breaker policy for calls to the Gemini API
+llm_client = LLMClient()
+
+# Content-addressed storage for images served under /api/artifacts
+artifact_store = ArtifactStore()
+
+# Background worker pool for asynchronous analysis jobs
+job_queue = JobQueue()
+
 def create_app(config_name='default'):
     """
     Application factory. This function is responsible for creating and
@@ -23,6 +43,12 @@ def create_app(config_name='default'):
 
     # Initialize Flask-Mail with the app
     mail.init_app(app)
+    analysis_cache.init_app(app)
+    llm_cache.init_app(app)
+    llm_client.init_app(app)
+    job_queue.init_app(app)
+    artifact_store.init_app(app)
+    stages.configure(app.config['STAGE_WORKERS'])
 
     # Import and register the API blueprint with the application.
     # We import it here to avoid circular dependency issues.
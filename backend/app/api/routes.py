@@ -1,25 +1,107 @@
-from flask import request, jsonify, current_app
+import json
+import os
+import random
+from contextlib import contextmanager
+from flask import request, jsonify, current_app, send_file, url_for, Response, stream_with_context
 from flask_mail import Message
+from werkzeug.exceptions import RequestEntityTooLarge
 from . import api  # Imports the 'api' blueprint from the __init__.py in the same folder
-from ..services import vision_service, ai_service
-from ..utils import image_utils
-from .. import mail
-import google.api_core.exceptions
-import base64
+from ..services import ai_service, pipeline_service, warmup_service
+from ..services.job_service import QueueFullError
+from ..services.llm_client import LLMUnavailableError
+from ..utils import image_utils, metrics
+from .. import mail, analysis_cache, artifact_store, job_queue
+from ..utils import lazy
+
+# Only needed to classify errors, so the Google SDK is not imported up front
+google_exceptions = lazy.module('google.api_core.exceptions')
+
+def _truncate(value, limit: int) -> str:
+    text = value if isinstance(value, str) else repr(value)
+    return text if len(text) <= limit else f"{text[:limit]}... ({len(text)} chars)"
+
+def _log_request_sample():
+    """
+    Logs a summary of the current request for a REQUEST_LOG_SAMPLE_RATE
+    fraction of requests. Field values are cut to REQUEST_LOG_MAX_CHARS and
+    files are described by name, type and size, so base64 images and uploads
+    never reach the log.
+    """
+    config = current_app.config
+    if random.random() >= config['REQUEST_LOG_SAMPLE_RATE']:
+        return
+    limit = config['REQUEST_LOG_MAX_CHARS']
+    body = request.get_json(silent=True) if request.is_json else request.form.to_dict()
+    if not isinstance(body, dict):
+        body = {} if body is None else {'body': body}
+    fields = {key: _truncate(value, limit) for key, value in body.items()}
+    files = {key: f"{file.filename} ({file.mimetype}, {file.content_length or 'unknown'} bytes)"
+             for key, file in request.files.items()}
+    current_app.logger.info(f"{request.method} {request.path} Content-Type: {request.content_type}, "
+                            f"Content-Length: {request.content_length}, fields: {fields}, files: {files}")
+
+@api.after_request
+def count_request(response):
+    metrics.REQUESTS.inc(endpoint=request.endpoint or 'unknown', status=response.status_code)
+    return response
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Stage latency histograms and pipeline counters in the Prometheus text format."""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+def _chat_error(e: Exception) -> tuple:
+    """Maps an exception raised while answering a chat to (error message, HTTP status)."""
+    if isinstance(e, google_exceptions.InvalidArgument) and "API_KEY_INVALID" in str(e):
+        # Handle invalid API key
+        return 'Invalid Google Gemini API key. Please check your API key in the backend/.env file and ensure it is valid.', 400
+    if isinstance(e, google_exceptions.ResourceExhausted):
+        # Handle quota exceeded
+        return 'API quota exceeded. Please check your Google Gemini API plan and billing details.', 429
+    if isinstance(e, image_utils.ImageTooLargeError):
+        return str(e), 413
+    if isinstance(e, LLMUnavailableError):
+        current_app.logger.warning(f"LLM unavailable in /chat: {e}")
+        return 'The AI service is temporarily unavailable. Please try again shortly.', 503
+    # Log the error for debugging
+    current_app.logger.error(f"An error occurred in /chat: {e}", exc_info=True)
+    return 'An internal server error occurred', 500
+
+def _sse(event: str, data) -> str:
+    """Formats one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _chat_events(prompt, image_array, reduction=1):
+    """
+    Server-sent events for a streamed chat: 'analysis' (image chats only) as
+    soon as the vision analysis is done, a 'token' per chunk of the model's
+    answer, then 'response' with the same payload as the JSON contract, and
+    finally 'done'. Failures after the stream has started arrive as 'error'.
+    """
+    try:
+        for event, data in pipeline_service.stream_chat_pipeline(prompt, image_array, reduction):
+            key = {'token': 'text'}.get(event, event)
+            yield _sse(event, {key: data})
+    except Exception as e:
+        message, status = _chat_error(e)
+        yield _sse('error', {'error': message, 'status': status})
+    yield _sse('done', {})
+
+def _wants_stream(data) -> bool:
+    """Streaming is requested with Accept: text/event-stream or a truthy 'stream' field."""
+    if 'text/event-stream' in request.headers.get('Accept', ''):
+        return True
+    value = request.args.get('stream', data.get('stream') if data else None)
+    return str(value).lower() in ('1', 'true', 'yes')
 
 @api.route('/chat', methods=['POST'])
 def handle_chat():
     """
     Main chat endpoint. Handles both text-only queries and image uploads.
     It robustly checks for data in both multipart/form-data and application/json.
+    Clients that ask for a stream get server-sent events instead of one JSON body.
     """
-    # --- Enhanced Debugging: Log incoming request details ---
-    current_app.logger.info(f"Received request for /api/chat with Content-Type: {request.content_type}")
-    current_app.logger.info(f"Form data received: {request.form.to_dict()}")
-    current_app.logger.info(f"Files received: {request.files.to_dict()}")
-    # Use silent=True to prevent an error if the body is not JSON
-    current_app.logger.info(f"JSON data received: {request.get_json(silent=True)}")
-    # --- End of Debugging ---
+    _log_request_sample()
 
     prompt = None
     image_file = None
@@ -28,7 +110,10 @@ def handle_chat():
     prompt = None
     image_data = None
 
+    data = None
+
     if request.content_type.startswith('multipart/form-data'):
+        data = request.form
         prompt = request.form.get('prompt')
         image_file = request.files.get('image')
         if image_file:
@@ -45,20 +130,24 @@ def handle_chat():
         return jsonify({'error': error_msg}), 400
 
     try:
+        image_array, reduction = None, 1
         if image_data:
             # --- Handle Image + Text Query ---
             if isinstance(image_data, str):  # base64
-                image_array = image_utils.decode_image_from_b64(image_data)
+                image_array, reduction = image_utils.decode_image_from_b64(image_data, **pipeline_service.decode_options())
             else:  # file object
-                image_array = image_utils.decode_image(image_data)
+                image_array, reduction = image_utils.decode_image(image_data, **pipeline_service.decode_options())
             if image_array is None:
                 return jsonify({'error': 'Invalid or unsupported image format'}), 400
 
-            # 1. Get a detailed analysis from the vision service
-            analysis_report, final_pattern = vision_service.analyze_kolam_image(image_array)
+        if _wants_stream(data):
+            # Proxies must not buffer the stream, or the early events lose their point
+            return Response(stream_with_context(_chat_events(prompt, image_array, reduction)),
+                            mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
-            # 2. Pass the report and original prompt to the AI service
-            final_response = ai_service.get_ai_response_with_vision(prompt, analysis_report)
+        if image_array is not None:
+            final_response = pipeline_service.run_chat_pipeline(prompt, image_array, reduction=reduction)['response']
 
         else:
             # --- Handle Text-Only Query ---
@@ -66,84 +155,235 @@ def handle_chat():
         
         return jsonify({'response': final_response})
 
-    except google.api_core.exceptions.InvalidArgument as e:
-        # Handle invalid API key
-        if "API_KEY_INVALID" in str(e):
-            return jsonify({'error': 'Invalid Google Gemini API key. Please check your API key in the backend/.env file and ensure it is valid.'}), 400
-        else:
-            current_app.logger.error(f"An error occurred in /chat: {e}", exc_info=True)
-            return jsonify({'error': 'An internal server error occurred'}), 500
-    except google.api_core.exceptions.ResourceExhausted as e:
-        # Handle quota exceeded
-        return jsonify({'error': 'API quota exceeded. Please check your Google Gemini API plan and billing details.'}), 429
     except Exception as e:
-        # Log the error for debugging
-        current_app.logger.error(f"An error occurred in /chat: {e}", exc_info=True)
-        return jsonify({'error': 'An internal server error occurred'}), 500
+        message, status = _chat_error(e)
+        return jsonify({'error': message}), status
+
+# Room for the multipart boundaries and headers around an uploaded image
+MULTIPART_OVERHEAD = 64 * 1024
+
+def _flag(value) -> bool:
+    """Truthy request option: JSON true, or '1', 'true' or 'yes' in a query string or form."""
+    return str(value).lower() in ('1', 'true', 'yes')
+
+@contextmanager
+def _uploaded_image(max_bytes: int):
+    """
+    Yields the encoded image of an /api/analyze_kolam request, or None, and
+    its options. Raw image/* bodies are streamed into a spooled buffer and
+    multipart uploads are spooled by the form parser; both are read in place
+    and capped at max_bytes while they arrive. A JSON body with 'image_data'
+    as a base64 string is decoded in memory.
+    """
+    if request.mimetype.startswith('image/'):
+        spooled = image_utils.spool_stream(request.stream, max_bytes, request.content_length,
+                                           current_app.config['UPLOAD_SPOOL_BYTES'])
+        with spooled, image_utils.file_buffer(spooled) as view:
+            yield view, request.args
+    elif request.mimetype == 'multipart/form-data':
+        # The image is checked against max_bytes once decoded; this stops the parser early
+        request.max_content_length = max_bytes + MULTIPART_OVERHEAD
+        try:
+            image_file = request.files.get('image')
+        except RequestEntityTooLarge:
+            raise image_utils.ImageTooLargeError(f"Image is larger than {max_bytes} bytes")
+        if image_file is None:
+            yield None, request.form
+            return
+        with image_utils.file_buffer(image_file.stream) as view:
+            yield view, request.values
+    else:
+        data = request.get_json(silent=True) or {}
+        image_data = data.get('image_data')
+        yield (image_utils.b64_to_bytes(image_data, max_bytes) if image_data else None), data
 
 @api.route('/analyze_kolam', methods=['POST'])
 def analyze_kolam():
     """
     Endpoint for analyzing a kolam image and generating a digital regeneration.
-    Expects JSON with 'image_data' as base64 string.
+    Takes the image as a raw image/* body, as the 'image' file of a
+    multipart form, or as JSON with 'image_data' as a base64 string. The
+    original and regenerated images are returned as /api/artifacts URLs, or
+    inline as base64 data URLs when 'inline_images' is true (in the JSON
+    body, the form or the query string).
     """
     current_app.logger.info("Received request for /api/analyze_kolam")
 
-    data = request.get_json()
-    image_data = data.get('image_data')
-
-    if not image_data:
-        return jsonify({'error': 'No image_data provided'}), 400
-
     try:
-        # Decode the base64 image
-        image_array = image_utils.decode_image_from_b64(image_data)
-        if image_array is None:
-            return jsonify({'error': 'Invalid or unsupported image format'}), 400
-
-        # 1. Analyze the image
-        analysis_results, final_pattern = vision_service.analyze_kolam_image(image_array)
-
-        # 2. Generate a description using AI
-        description_dict = ai_service.generate_kolam_description(analysis_results)
-
-        # 3. Generate digital recreation using detected dots and lines
-        # Extract dots and lines from the pattern
-        dots_data = [{'x': dot.x, 'y': dot.y, 'radius': dot.radius} for dot in final_pattern.dots]
-        lines_data = [{'start': line.p1, 'end': line.p2} for line in final_pattern.lines]
-
-        image_result = ai_service.generate_kolam_image(dots_data, lines_data, analysis_results)
-        if image_result['status'] == 'success':
-            regenerated_image_b64 = image_result['image_base64']
-        else:
-            regenerated_image_b64 = ""  # Placeholder for failed generation
-
-        # 4. Encode original image back to base64 for response
-        original_image_b64 = base64.b64encode(image_utils.encode_image_to_bytes(image_array)).decode('utf-8')
-        original_image_data_url = f"data:image/png;base64,{original_image_b64}"
-
-        # 5. Prepare response
-        response = {
-            'original_image': original_image_data_url,
-            'analysis': analysis_results,
-            'description': description_dict,
-            'regenerated_image': f"data:image/png;base64,{regenerated_image_b64}"
-        }
+        options = pipeline_service.decode_options()
+        # Decoded straight from the uploaded buffer, which is kept for the artifact store
+        with _uploaded_image(options['max_bytes']) as (original_bytes, params):
+            if original_bytes is None:
+                return jsonify({'error': 'No image_data provided'}), 400
+            try:
+                image_array, reduction = image_utils.decode_image_bytes(original_bytes, **options)
+            except image_utils.ImageTooLargeError:
+                raise
+            except ValueError:
+                image_array = None
+            if image_array is None:
+                return jsonify({'error': 'Invalid or unsupported image format'}), 400
 
+            timings = {}
+            response = pipeline_service.run_analyze_pipeline(
+                image_array, original_bytes=original_bytes,
+                artifact_base_url=None if _flag(params.get('inline_images')) else _artifact_base_url(),
+                timings=timings, reduction=reduction)
+        current_app.logger.debug("analyze_kolam stage times: " +
+                                 ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in timings.items()))
         return jsonify(response)
 
-    except google.api_core.exceptions.InvalidArgument as e:
+    except google_exceptions.InvalidArgument as e:
         if "API_KEY_INVALID" in str(e):
             return jsonify({'error': 'Invalid Google Gemini API key. Please check your API key in the backend/.env file and ensure it is valid.'}), 400
         else:
             current_app.logger.error(f"An error occurred in /analyze_kolam: {e}", exc_info=True)
             return jsonify({'error': 'An internal server error occurred'}), 500
-    except google.api_core.exceptions.ResourceExhausted as e:
+    except google_exceptions.ResourceExhausted as e:
         return jsonify({'error': 'API quota exceeded. Please check your Google Gemini API plan and billing details.'}), 429
+    except image_utils.ImageTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
     except Exception as e:
         current_app.logger.error(f"An error occurred in /analyze_kolam: {e}", exc_info=True)
         return jsonify({'error': 'An internal server error occurred'}), 500
 
+def _artifact_base_url() -> str:
+    """Absolute URL prefix of /api/artifacts, for building links in responses."""
+    return url_for('api.get_artifact', name='', _external=True)
+
+@api.route('/artifacts/<name>', methods=['GET'])
+def get_artifact(name):
+    """
+    Serves a stored image. Artifacts are immutable, so responses carry a
+    strong ETag and a long Cache-Control lifetime, capped by the store's
+    retention; Range requests are honoured.
+    """
+    path = artifact_store.path_for(name)
+    if path is None:
+        return jsonify({'error': 'Unknown artifact'}), 404
+    max_age = current_app.config['ARTIFACT_MAX_AGE']
+    if artifact_store.retention:
+        max_age = min(max_age, int(artifact_store.retention))
+    response = send_file(path, conditional=True, etag=name.split('.')[0], max_age=max_age)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@api.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queues an analysis job and returns its id immediately.
+    Expects JSON with 'image_data' (one base64 image) or 'images' (a list),
+    and optionally 'type' ('analyze' or 'chat'), 'prompt' for chat jobs and
+    'inline_images' as for /api/analyze_kolam.
+    """
+    data = request.get_json(silent=True) or {}
+    job_type = data.get('type', 'analyze')
+    images = data.get('images') or ([data['image_data']] if data.get('image_data') else [])
+    prompt = data.get('prompt')
+    artifact_base_url = None if data.get('inline_images') else _artifact_base_url()
+
+    if job_type not in ('analyze', 'chat'):
+        return jsonify({'error': f"Unknown job type '{job_type}'"}), 400
+    if not images or not all(isinstance(image, str) for image in images):
+        return jsonify({'error': 'No image_data or images provided'}), 400
+
+    app = current_app._get_current_object()
+
+    def run_job(image_data, on_stage):
+        # Workers run outside the request, so they need their own app context
+        with app.app_context():
+            on_stage('decode')
+            options = pipeline_service.decode_options()
+            try:
+                original_bytes = image_utils.b64_to_bytes(image_data, options['max_bytes'])
+                image_array, reduction = image_utils.decode_image_bytes(original_bytes, **options)
+            except image_utils.ImageTooLargeError:
+                raise
+            except ValueError:
+                raise ValueError('Invalid or unsupported image format')
+
+            try:
+                if job_type == 'chat':
+                    return pipeline_service.run_chat_pipeline(prompt, image_array, on_stage, reduction)
+                return pipeline_service.run_analyze_pipeline(
+                    image_array, on_stage, original_bytes=original_bytes, artifact_base_url=artifact_base_url,
+                    reduction=reduction)
+            except google_exceptions.InvalidArgument as e:
+                if "API_KEY_INVALID" in str(e):
+                    raise RuntimeError('Invalid Google Gemini API key. Please check your API key in the backend/.env file and ensure it is valid.')
+                app.logger.error(f"An error occurred in job: {e}", exc_info=True)
+                raise RuntimeError('An internal server error occurred')
+            except google_exceptions.ResourceExhausted:
+                raise RuntimeError('API quota exceeded. Please check your Google Gemini API plan and billing details.')
+            except Exception as e:
+                app.logger.error(f"An error occurred in job: {e}", exc_info=True)
+                raise RuntimeError('An internal server error occurred')
+
+    try:
+        job_id = job_queue.submit(job_type, images, run_job)
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+
+    return jsonify({'job_id': job_id, 'status_url': f"/api/jobs/{job_id}"}), 202
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Returns the status, per-stage progress and results of a job.
+    Pass 'wait' (seconds) to long-poll until the job changes past 'since'
+    (the version from a previous response) or finishes.
+    """
+    wait = min(request.args.get('wait', 0, type=float), current_app.config['JOB_MAX_WAIT'])
+    since = request.args.get('since', -1, type=int)
+
+    if wait > 0:
+        job = job_queue.wait(job_id, since, wait)
+    else:
+        job = job_queue.get(job_id)
+
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job)
+
+@api.route('/job_stats', methods=['GET'])
+def job_stats():
+    """Returns the job queue depth and worker counts."""
+    return jsonify(job_queue.stats())
+
+@api.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """Returns hit, miss and eviction counters of the analysis cache."""
+    return jsonify(analysis_cache.stats())
+
+@api.route('/ai_stats', methods=['GET'])
+def ai_stats():
+    """Returns LLM latency percentiles, API calls made and saved by the response cache."""
+    return jsonify(ai_service.llm_stats())
+
+@api.route('/health/live', methods=['GET'])
+def liveness():
+    """Liveness probe: the worker is up and serving requests. Touches no dependencies."""
+    return jsonify({'status': 'alive', 'pid': os.getpid()})
+
+@api.route('/health/ready', methods=['GET'])
+def readiness():
+    """
+    Readiness probe: 503 while the warm-up analysis is running or after it
+    failed, and while the job queue is full, 200 otherwise. The dev server
+    skips the warm-up and reports ready with 'warm' false.
+    """
+    warmup = warmup_service.state()
+    jobs = job_queue.stats()
+    queue_full = jobs['queued'] >= jobs['max_pending']
+    ready = warmup['status'] in ('cold', 'ready') and not queue_full
+    return jsonify({
+        'status': 'ready' if ready else 'unavailable',
+        'warm': warmup['status'] == 'ready',
+        'warmup': warmup,
+        'queue_full': queue_full,
+    }), 200 if ready else 503
+
 @api.route('/contact', methods=['POST'])
 def handle_contact():
     """
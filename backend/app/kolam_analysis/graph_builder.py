@@ -0,0 +1,105 @@
+from typing import Iterable
+
+import numpy as np
+from app.utils import lazy
+
+spatial = lazy.module('scipy.spatial')
+
+# How many nearest dots to fetch for each line pixel. Only the closest two are
+# used, the extra candidates show whether a dot not fetched ties for second.
+NEIGHBOUR_CANDIDATES = 4
+
+# Line pixels are queried in blocks so memory stays bounded on large photos.
+PIXEL_CHUNK_SIZE = 1 << 18
+
+
+def nearest_dot_pairs(dot_array: np.ndarray, pixels_xy: np.ndarray, tree: "spatial.cKDTree" = None) -> np.ndarray:
+    """
+    Returns an (M, 2) array with the indices of the two closest dots for every
+    pixel, closest first. Pixels where a distance tie decides the pair are
+    resolved with np.argsort over their full distance row, exactly as the
+    original per-pixel loop did, so the edges and the order they are first
+    seen in match it. A k-d tree over the dots can be passed in when it is
+    reused across calls.
+    """
+    dot_array = np.asarray(dot_array, dtype=np.float64)
+    pixels_xy = np.asarray(pixels_xy, dtype=np.float64)
+    dot_count = len(dot_array)
+    if dot_count < 2 or len(pixels_xy) == 0:
+        return np.empty((0, 2), dtype=np.intp)
+
+    k = min(NEIGHBOUR_CANDIDATES, dot_count)
+    tree = spatial.cKDTree(dot_array) if tree is None else tree
+    pairs = np.empty((len(pixels_xy), 2), dtype=np.intp)
+
+    for start in range(0, len(pixels_xy), PIXEL_CHUNK_SIZE):
+        block = pixels_xy[start:start + PIXEL_CHUNK_SIZE]
+        dist, idx = tree.query(block, k=k, workers=-1)
+        pairs[start:start + len(block)] = idx[:, :2]
+
+        # Where the two closest dots are equally far, or a third dot (fetched
+        # or not) is as far as the second, the pair depends on how ties are
+        # broken. The original loop used np.argsort, which is not stable, over
+        # the whole distance row; those rows are recomputed the same way.
+        ambiguous = dist[:, 0] == dist[:, 1]
+        if k > 2:
+            ambiguous |= dist[:, 1] == dist[:, 2]
+        ambiguous = np.flatnonzero(ambiguous)
+        if ambiguous.size:
+            exact = spatial.distance.cdist(block[ambiguous], dot_array)
+            pairs[start + ambiguous] = np.argsort(exact, axis=1)[:, :2]
+
+    return pairs
+
+
+def unique_edges(pairs: np.ndarray, dot_count: int) -> np.ndarray:
+    """
+    Collapses per-pixel dot pairs into unique undirected edges. The first
+    occurrence of every edge is kept, in its original order and orientation.
+    """
+    if len(pairs) == 0:
+        return np.empty((0, 2), dtype=np.intp)
+    _, first_seen = np.unique(_edge_keys(pairs, dot_count), return_index=True)
+    return pairs[np.sort(first_seen)]
+
+
+def _edge_keys(pairs: np.ndarray, dot_count: int) -> np.ndarray:
+    low = np.minimum(pairs[:, 0], pairs[:, 1]).astype(np.int64)
+    high = np.maximum(pairs[:, 0], pairs[:, 1]).astype(np.int64)
+    return low * dot_count + high
+
+
+def build_edges(dot_array: np.ndarray, line_image: np.ndarray) -> np.ndarray:
+    """
+    Connects every "on" pixel of the line image to its two closest dots and
+    returns the unique (i, j) edges in the order they are first seen when the
+    image is scanned row by row.
+    """
+    # argwhere yields (y, x); the dots are stored as (x, y)
+    line_pixels = np.argwhere(line_image > 0)
+    pairs = nearest_dot_pairs(dot_array, line_pixels[:, ::-1])
+    return unique_edges(pairs, len(dot_array))
+
+
+def build_edges_from_pixels(dot_array: np.ndarray, pixel_chunks: Iterable[np.ndarray]) -> np.ndarray:
+    """
+    Same as build_edges, for line pixels that arrive as a stream of (x, y)
+    coordinate chunks in row-major order (see image_processor.iter_line_pixels).
+    Each chunk is matched as it comes in and only edges not seen in earlier
+    chunks are kept, so the result equals build_edges over the whole image.
+    """
+    dot_array = np.asarray(dot_array, dtype=np.float64)
+    dot_count = len(dot_array)
+    if dot_count < 2:
+        return np.empty((0, 2), dtype=np.intp)
+
+    tree = spatial.cKDTree(dot_array)
+    seen = np.empty(0, dtype=np.int64)
+    edges = []
+    for pixels_xy in pixel_chunks:
+        chunk_edges = unique_edges(nearest_dot_pairs(dot_array, pixels_xy, tree), dot_count)
+        keys = _edge_keys(chunk_edges, dot_count)
+        new = ~np.isin(keys, seen)
+        edges.append(chunk_edges[new])
+        seen = np.concatenate([seen, keys[new]])
+    return np.concatenate(edges) if edges else np.empty((0, 2), dtype=np.intp)
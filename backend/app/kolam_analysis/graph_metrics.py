@@ -0,0 +1,58 @@
+from typing import Any, Dict
+
+import numpy as np
+
+from app.utils import lazy
+
+nx = lazy.module('networkx')
+sparse = lazy.module('scipy.sparse')
+csgraph = lazy.module('scipy.sparse.csgraph')
+
+
+def graph_metrics(adjacency: "sparse.csr_matrix") -> Dict[str, Any]:
+    """
+    Whole-graph properties of a kolam from its symmetric CSR adjacency
+    matrix, in O(V + E):
+
+    - components: connected components, isolated dots included
+    - loops: the cyclomatic number E - V + C, i.e. the size of a cycle basis
+    - connected: whether there is exactly one component
+    - odd_degree: number of dots with an odd number of edges
+    - eulerian_path / eulerian_circuit: whether all edges can be drawn in one
+      stroke (ending anywhere / back at the start). The edges must lie in a
+      single component, isolated dots aside, with 0 or 2 odd-degree dots for
+      a path and none for a circuit. A pattern without edges has neither.
+    """
+    node_count = adjacency.shape[0]
+    degrees = np.diff(adjacency.indptr)
+    edge_count = int(degrees.sum()) // 2
+    components, labels = csgraph.connected_components(adjacency, directed=False)
+    odd_degree = int(np.count_nonzero(degrees % 2))
+
+    drawn = labels[degrees > 0]
+    single_stroke = edge_count > 0 and bool((drawn == drawn[0]).all())
+    return {
+        "components": int(components),
+        "loops": edge_count - node_count + int(components),
+        "connected": components == 1,
+        "odd_degree": odd_degree,
+        "eulerian_path": single_stroke and odd_degree in (0, 2),
+        "eulerian_circuit": single_stroke and odd_degree == 0,
+    }
+
+
+def networkx_graph_metrics(graph: "nx.Graph") -> Dict[str, Any]:
+    """
+    The same metrics computed with networkx, as a reference for graph_metrics.
+    Builds the full cycle basis, so it is much slower on large patterns.
+    """
+    drawn = graph.subgraph([n for n, d in graph.degree() if d > 0])
+    has_edges = drawn.number_of_edges() > 0
+    return {
+        "components": nx.number_connected_components(graph),
+        "loops": len(nx.cycle_basis(graph)),
+        "connected": graph.number_of_nodes() > 0 and nx.is_connected(graph),
+        "odd_degree": sum(1 for _, d in graph.degree() if d % 2),
+        "eulerian_path": has_edges and nx.has_eulerian_path(drawn),
+        "eulerian_circuit": has_edges and nx.is_eulerian(drawn),
+    }
@@ -1,35 +1,187 @@
-import cv2
+import time
 import numpy as np
-from typing import List
+from typing import Iterator, List, Optional, Tuple
+from app.utils import lazy, stages
 from .models import Dot
 
+cv2 = lazy.module('cv2')
+
+# Connected components smaller than this (in pixels) are treated as noise.
+DESPECKLE_MIN_AREA = 20
+
+# Gaussian blur kernel and adaptive threshold window used by preprocess_image
+PREPROCESS_BLUR_SIZE = 5
+THRESHOLD_BLOCK_SIZE = 11
+THRESHOLD_C = 2
+# Rows of context a tile needs above and below it: an output pixel depends on
+# the threshold window over blurred pixels, each depending on the blur kernel
+TILE_HALO = PREPROCESS_BLUR_SIZE // 2 + THRESHOLD_BLOCK_SIZE // 2
+
+# Offsets of the 8 neighbours P2..P9 used by Zhang-Suen thinning, clockwise
+# starting from the pixel above. Neighbour k is stored in bit k of a code.
+_NEIGHBOUR_OFFSETS = [(-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)]
+
+def _build_thinning_luts() -> Tuple[np.ndarray, np.ndarray]:
+    """Precomputes, for every 8-neighbour code, whether Zhang-Suen deletes the pixel."""
+    first = np.zeros(256, dtype=bool)
+    second = np.zeros(256, dtype=bool)
+    for code in range(256):
+        p = [(code >> bit) & 1 for bit in range(8)]
+        p2, p3, p4, p5, p6, p7, p8, p9 = p
+        neighbours = sum(p)
+        transitions = sum(1 for k in range(8) if p[k] == 0 and p[(k + 1) % 8] == 1)
+        if not (2 <= neighbours <= 6 and transitions == 1):
+            continue
+        first[code] = p2 * p4 * p6 == 0 and p4 * p6 * p8 == 0
+        second[code] = p2 * p4 * p8 == 0 and p2 * p6 * p8 == 0
+    return first, second
+
+_THINNING_LUTS = _build_thinning_luts()
+
 def preprocess_image(image: np.ndarray) -> np.ndarray:
     """Converts a color image to a clean, binary format suitable for line analysis."""
     if image is None: 
         return None
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    blurred = cv2.GaussianBlur(gray, (PREPROCESS_BLUR_SIZE, PREPROCESS_BLUR_SIZE), 0)
     # Adaptive thresholding is excellent for handling variations in lighting.
     # THRESH_BINARY_INV makes the kolam lines white (255) and the background black (0).
     binary_image = cv2.adaptiveThreshold(
         blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-        cv2.THRESH_BINARY_INV, 11, 2
+        cv2.THRESH_BINARY_INV, THRESHOLD_BLOCK_SIZE, THRESHOLD_C
     )
     return binary_image
 
-def detect_dots(image: np.ndarray) -> List[Dot]:
-    """Detects black, circular dots (pulli) using multiple detection methods for robustness."""
-    if image is None or image.size == 0:
-        return []
+def preprocess_image_tiled(image: np.ndarray, tile_rows: int = 512) -> np.ndarray:
+    """
+    preprocess_image run on horizontal bands of tile_rows rows in parallel on
+    the stage pool. Each band is processed with TILE_HALO extra rows of
+    context on either side, which are then cut off, so the stitched result is
+    bit-identical to processing the whole image at once.
+    """
+    if image is None:
+        return None
+    height = image.shape[0]
+    if tile_rows <= 0 or height <= tile_rows:
+        return preprocess_image(image)
 
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    binary_image = np.empty(image.shape[:2], dtype=np.uint8)
 
-    # Method 1: Hough Circle Transform for circular dots
+    def process_tile(top: int):
+        bottom = min(top + tile_rows, height)
+        context_top, context_bottom = max(0, top - TILE_HALO), min(height, bottom + TILE_HALO)
+        tile = preprocess_image(image[context_top:context_bottom])
+        binary_image[top:bottom] = tile[top - context_top:bottom - context_top]
+
+    stages.run_stages({f"tile_{top}": (lambda top=top: process_tile(top), ())
+                       for top in range(0, height, tile_rows)})
+    return binary_image
+
+def iter_line_pixels(line_image: np.ndarray, tile_rows: int = 512) -> Iterator[np.ndarray]:
+    """
+    Yields the (x, y) coordinates of the "on" pixels of a line image one band
+    of tile_rows rows at a time, in the same row-major order as a single
+    np.argwhere over the whole image.
+    """
+    tile_rows = tile_rows if tile_rows > 0 else max(1, line_image.shape[0])
+    for top in range(0, line_image.shape[0], tile_rows):
+        ys, xs = np.nonzero(line_image[top:top + tile_rows])
+        yield np.stack([xs, ys + top], axis=1)
+
+def remove_small_components(binary_image: np.ndarray, min_area: int = DESPECKLE_MIN_AREA) -> np.ndarray:
+    """Removes connected specks smaller than min_area pixels from a binary image."""
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(
+        (binary_image > 0).astype(np.uint8), connectivity=8
+    )
+    keep = stats[:, cv2.CC_STAT_AREA] >= min_area
+    keep[0] = False  # label 0 is the background
+    return np.where(keep[labels], 255, 0).astype(np.uint8)
+
+def skeletonize(binary_image: np.ndarray) -> np.ndarray:
+    """
+    Thins white strokes to one-pixel-wide centrelines with the Zhang-Suen
+    algorithm. Each sub-iteration is evaluated for the whole image at once
+    through a lookup table on the 8-neighbour code of every pixel.
+    """
+    skeleton = np.zeros(binary_image.shape, dtype=np.uint8)
+    rows = np.flatnonzero(binary_image.any(axis=1))
+    cols = np.flatnonzero(binary_image.any(axis=0))
+    if rows.size == 0:
+        return skeleton
+
+    # Only the bounding box of the strokes needs to be thinned
+    y0, y1 = rows[0], rows[-1] + 1
+    x0, x1 = cols[0], cols[-1] + 1
+    img = (binary_image[y0:y1, x0:x1] > 0).astype(np.uint8)
+    h, w = img.shape
+    padded = np.zeros((h + 2, w + 2), dtype=np.uint8)
+    code = np.empty((h, w), dtype=np.uint8)
+
+    changed = True
+    while changed:
+        changed = False
+        for lut in _THINNING_LUTS:
+            padded[1:-1, 1:-1] = img
+            code.fill(0)
+            for bit, (dy, dx) in enumerate(_NEIGHBOUR_OFFSETS):
+                code |= padded[1 + dy:1 + dy + h, 1 + dx:1 + dx + w] << bit
+            delete = lut[code] & (img == 1)
+            if delete.any():
+                img[delete] = 0
+                changed = True
+
+    skeleton[y0:y1, x0:x1] = img * 255
+    return skeleton
+
+def extract_centrelines(binary_image: np.ndarray, min_area: int = DESPECKLE_MIN_AREA) -> Tuple[np.ndarray, dict]:
+    """
+    Despeckles a binary line image and thins it to one-pixel-wide centrelines.
+    Returns the skeleton together with pixel counts and timing for the stage.
+    """
+    start_time = time.perf_counter()
+    pixels_before = int(np.count_nonzero(binary_image))
+    cleaned = remove_small_components(binary_image, min_area)
+    skeleton = skeletonize(cleaned)
+    stats = {
+        "pixels_before": pixels_before,
+        "pixels_after": int(np.count_nonzero(skeleton)),
+        "seconds": time.perf_counter() - start_time,
+    }
+    return skeleton, stats
+
+# Candidates from different detectors closer than this many pixels (on both
+# axes) are taken to be the same dot.
+DUPLICATE_DISTANCE = 10
+
+class _DotGrid:
+    """
+    Spatial hash of accepted dot centres in DUPLICATE_DISTANCE-sized cells.
+    A dot closer than the distance on both axes lies in one of the 3x3 cells
+    around a query, so duplicate checks stay constant time per dot.
+    """
+
+    def __init__(self, cell: int = DUPLICATE_DISTANCE):
+        self.cell = cell
+        self.cells = {}
+
+    def add(self, x: int, y: int, value=None):
+        self.cells.setdefault((x // self.cell, y // self.cell), []).append((x, y, value))
+
+    def near(self, x: int, y: int) -> list:
+        """Entries closer than the cell size to (x, y) on both axes."""
+        cx, cy = x // self.cell, y // self.cell
+        return [entry
+                for kx in (cx - 1, cx, cx + 1)
+                for ky in (cy - 1, cy, cy + 1)
+                for entry in self.cells.get((kx, ky), ())
+                if abs(entry[0] - x) < self.cell and abs(entry[1] - y) < self.cell]
+
+def hough_dot_candidates(gray: np.ndarray) -> List[Dot]:
+    """Dark-centred circles found by the Hough Circle Transform."""
     circles = cv2.HoughCircles(
         gray, cv2.HOUGH_GRADIENT, dp=1, minDist=20,
         param1=50, param2=30, minRadius=3, maxRadius=15
     )
-
     dots = []
     if circles is not None:
         circles = np.uint16(np.around(circles))
@@ -39,51 +191,241 @@ def detect_dots(image: np.ndarray) -> List[Dot]:
             center_intensity = gray[center_y, center_x]
             if center_intensity < 100:  # Dark center
                 dots.append(Dot(x=int(center_x), y=int(center_y), radius=int(radius)))
+    return dots
+
+def contour_dot_candidates(gray: np.ndarray, measure_radius: bool = False) -> List[Dot]:
+    """
+    Centroids of dark, roughly circular blobs of a plausible dot size. The
+    radius is a fixed 5 pixels unless measure_radius derives it from the area.
+    """
+    _, thresh = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY_INV)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    dots = []
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if 20 < area < 1000:  # Reasonable dot size
+            perimeter = cv2.arcLength(contour, True)
+            if perimeter > 0:
+                circularity = 4 * np.pi * area / (perimeter * perimeter)
+                if circularity > 0.5:  # Somewhat circular
+                    M = cv2.moments(contour)
+                    if M["m00"] != 0:
+                        center_x = int(M["m10"] / M["m00"])
+                        center_y = int(M["m01"] / M["m00"])
+                        radius = int(round(np.sqrt(area / np.pi))) if measure_radius else 5
+                        dots.append(Dot(x=center_x, y=center_y, radius=radius))
+    return dots
+
+def blob_dot_candidates(gray: np.ndarray) -> List[Dot]:
+    """Dark blobs found by SimpleBlobDetector with relaxed parameters."""
+    inverted_gray = 255 - gray
+
+    params = cv2.SimpleBlobDetector_Params()
+    params.filterByColor = True
+    params.blobColor = 255
+    params.filterByArea = True
+    params.minArea = 5  # More relaxed
+    params.maxArea = 1000
+    params.filterByCircularity = True
+    params.minCircularity = 0.3  # More relaxed
+    params.filterByConvexity = True
+    params.minConvexity = 0.5  # More relaxed
+    params.filterByInertia = True
+    params.minInertiaRatio = 0.1  # More relaxed
+
+    detector = cv2.SimpleBlobDetector_create(params)
+    keypoints = detector.detect(inverted_gray)
+    return [Dot(x=int(kp.pt[0]), y=int(kp.pt[1]), radius=int(kp.size / 2)) for kp in keypoints]
+
+def detect_dots(image: np.ndarray) -> List[Dot]:
+    """Detects black, circular dots (pulli) using multiple detection methods for robustness."""
+    if image is None or image.size == 0:
+        return []
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    # Method 1: Hough Circle Transform for circular dots
+    dots = hough_dot_candidates(gray)
+    accepted = _DotGrid()
+    for dot in dots:
+        accepted.add(dot.x, dot.y)
+
+    def add_new(candidates: List[Dot]):
+        # Avoid duplicates
+        for dot in candidates:
+            if not accepted.near(dot.x, dot.y):
+                accepted.add(dot.x, dot.y)
+                dots.append(dot)
 
     # Method 2: Contour-based detection for irregular dots
     if len(dots) < 5:  # If Hough didn't find enough, try contours
-        _, thresh = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY_INV)
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if 20 < area < 1000:  # Reasonable dot size
-                perimeter = cv2.arcLength(contour, True)
-                if perimeter > 0:
-                    circularity = 4 * np.pi * area / (perimeter * perimeter)
-                    if circularity > 0.5:  # Somewhat circular
-                        M = cv2.moments(contour)
-                        if M["m00"] != 0:
-                            center_x = int(M["m10"] / M["m00"])
-                            center_y = int(M["m01"] / M["m00"])
-                            # Avoid duplicates
-                            if not any(abs(dot.x - center_x) < 10 and abs(dot.y - center_y) < 10 for dot in dots):
-                                dots.append(Dot(x=center_x, y=center_y, radius=5))
+        add_new(contour_dot_candidates(gray))
 
     # Method 3: SimpleBlobDetector as fallback with relaxed parameters
     if len(dots) < 3:
-        inverted_gray = 255 - gray
-
-        params = cv2.SimpleBlobDetector_Params()
-        params.filterByColor = True
-        params.blobColor = 255
-        params.filterByArea = True
-        params.minArea = 5  # More relaxed
-        params.maxArea = 1000
-        params.filterByCircularity = True
-        params.minCircularity = 0.3  # More relaxed
-        params.filterByConvexity = True
-        params.minConvexity = 0.5  # More relaxed
-        params.filterByInertia = True
-        params.minInertiaRatio = 0.1  # More relaxed
-
-        detector = cv2.SimpleBlobDetector_create(params)
-        keypoints = detector.detect(inverted_gray)
-
-        for kp in keypoints:
-            center_x, center_y = int(kp.pt[0]), int(kp.pt[1])
-            # Avoid duplicates
-            if not any(abs(dot.x - center_x) < 10 and abs(dot.y - center_y) < 10 for dot in dots):
-                dots.append(Dot(x=center_x, y=center_y, radius=int(kp.size / 2)))
-
-    return dots
\ No newline at end of file
+        add_new(blob_dot_candidates(gray))
+
+    return dots
+
+# Fused detection: candidates need this many detectors to agree, unless
+# their size matches the confirmed dots (see detect_dots_fused)
+FUSED_MIN_VOTES = 2
+FUSED_RADIUS_TOLERANCE = 2.0
+
+def _fuse_candidates(candidates: List[Tuple[str, List[Dot]]]) -> List[Dot]:
+    """
+    Clusters the candidates of several detectors through a spatial hash and
+    keeps the clusters that win the vote. Every cluster gets one vote per
+    detector that found it; clusters with FUSED_MIN_VOTES votes are
+    confirmed. A cluster seen by a single detector is kept when its radius is
+    within FUSED_RADIUS_TOLERANCE times the median radius of the confirmed
+    dots, or when nothing was confirmed at all (only one detector works on
+    the image). Positions and radii are averaged over each cluster.
+    """
+    grid = _DotGrid()
+    # Per cluster: sums of x, y and radius, member count and detector names
+    clusters = []
+    for detector, dots in candidates:
+        for dot in dots:
+            near = grid.near(dot.x, dot.y)
+            if near:
+                cluster = clusters[min(entry[2] for entry in near)]
+            else:
+                grid.add(dot.x, dot.y, len(clusters))
+                cluster = [0, 0, 0, 0, set()]
+                clusters.append(cluster)
+            cluster[0] += dot.x
+            cluster[1] += dot.y
+            cluster[2] += dot.radius
+            cluster[3] += 1
+            cluster[4].add(detector)
+    if not clusters:
+        return []
+
+    sums = np.array([cluster[:4] for cluster in clusters], dtype=np.float64)
+    means = sums[:, :3] / sums[:, 3:]
+    votes = np.array([len(cluster[4]) for cluster in clusters])
+    keep = votes >= FUSED_MIN_VOTES
+    if keep.any():
+        typical = np.median(means[keep, 2])
+        keep |= (means[:, 2] <= typical * FUSED_RADIUS_TOLERANCE) & (means[:, 2] >= typical / FUSED_RADIUS_TOLERANCE)
+    else:
+        keep[:] = True
+
+    fused = np.rint(means[keep]).astype(int).tolist()
+    return [Dot(x=x, y=y, radius=max(1, radius)) for x, y, radius in fused]
+
+def detect_dots_fused(image: np.ndarray) -> List[Dot]:
+    """
+    Runs the Hough, contour and blob detectors concurrently on the stage
+    pool and fuses their candidates by confidence voting. Better recall than
+    the cascade in detect_dots, for about the latency of the slowest detector;
+    duplicate merging is linear in the number of candidates.
+    """
+    if image is None or image.size == 0:
+        return []
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    detectors = {
+        'hough': lambda: hough_dot_candidates(gray),
+        'contour': lambda: contour_dot_candidates(gray, measure_radius=True),
+        'blob': lambda: blob_dot_candidates(gray),
+    }
+    found = stages.run_stages({name: (detector, ()) for name, detector in detectors.items()})
+    return _fuse_candidates([(name, found[name]) for name in detectors])
+
+# Dot detection modes selectable through the DOT_DETECTOR setting
+DOT_DETECTORS = {
+    'cascade': detect_dots,
+    'fused': detect_dots_fused,
+}
+
+
+# --- Pyramid processing for large photos ---
+
+# Dot radius (in working pixels) the detectors are tuned for: about the middle
+# of the 3-15 px radii that HoughCircles in detect_dots looks for.
+PYRAMID_TARGET_DOT_RADIUS = 10.0
+# Working resolution bounds, in pixels, used when picking the scale.
+PYRAMID_MAX_PIXELS = 1_500_000
+PYRAMID_MIN_PIXELS = 250_000
+# Resolution of the coarse copy used to estimate the dot size.
+_DOT_SCALE_PROBE_PIXELS = 250_000
+
+def _resize(image: np.ndarray, scale: float) -> np.ndarray:
+    size = (max(1, int(round(image.shape[1] * scale))), max(1, int(round(image.shape[0] * scale))))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+def estimate_dot_radius(image: np.ndarray) -> Optional[float]:
+    """
+    Estimates the typical dot radius in full-resolution pixels from a coarse
+    copy of the image. Dots are the compact, roughly square dark blobs; long
+    strokes are ignored. Returns None when too few dots are visible.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    probe_scale = min(1.0, np.sqrt(_DOT_SCALE_PROBE_PIXELS / gray.size))
+    small = _resize(gray, probe_scale) if probe_scale < 1.0 else gray
+    _, dark = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(dark, connectivity=8)
+
+    stats = stats[1:]
+    w = stats[:, cv2.CC_STAT_WIDTH].astype(np.float64)
+    h = stats[:, cv2.CC_STAT_HEIGHT].astype(np.float64)
+    area = stats[:, cv2.CC_STAT_AREA].astype(np.float64)
+    compact = (area >= 4) & (w / h > 0.7) & (w / h < 1.4) & (area / (w * h) > 0.6)
+    if np.count_nonzero(compact) < 3:
+        return None
+    return float(np.median(np.sqrt(area[compact] / np.pi))) / probe_scale
+
+def choose_working_scale(image: np.ndarray) -> float:
+    """
+    Picks the downscale factor (<= 1) for pyramid processing. The scale brings
+    the estimated dot radius to PYRAMID_TARGET_DOT_RADIUS, kept within the
+    working pixel bounds; without a dot estimate the pixel cap alone is used.
+    """
+    pixels = image.shape[0] * image.shape[1]
+    max_scale = np.sqrt(PYRAMID_MAX_PIXELS / pixels)
+    min_scale = np.sqrt(PYRAMID_MIN_PIXELS / pixels)
+    radius = estimate_dot_radius(image)
+    if radius is None:
+        scale = max_scale
+    else:
+        scale = min(max(PYRAMID_TARGET_DOT_RADIUS / radius, min_scale), max_scale)
+    return float(min(1.0, scale))
+
+def downscale(image: np.ndarray, scale: float) -> np.ndarray:
+    """Resizes an image by scale with area averaging; scale 1 returns it unchanged."""
+    return image if scale >= 1.0 else _resize(image, scale)
+
+def refine_dots(image: np.ndarray, dots: List[Dot]) -> List[Dot]:
+    """
+    Re-centres dots mapped back from a working scale against the
+    full-resolution image. Each dot is replaced by the centroid and size of the
+    dark blob under it; dots whose blob is missing or merged with a stroke
+    keep their mapped position.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    refined = []
+    for dot in dots:
+        half = 2 * max(dot.radius, 2) + 2
+        x0, y0 = max(0, dot.x - half), max(0, dot.y - half)
+        roi = gray[y0:dot.y + half + 1, x0:dot.x + half + 1]
+        if roi.size == 0:
+            refined.append(dot)
+            continue
+        _, dark = cv2.threshold(roi, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        _, labels, stats, centroids = cv2.connectedComponentsWithStats(dark, connectivity=8)
+        label = labels[dot.y - y0, dot.x - x0]
+        expected_area = np.pi * dot.radius ** 2
+        if label == 0 or stats[label, cv2.CC_STAT_AREA] > 4 * expected_area:
+            refined.append(dot)
+            continue
+        cx, cy = centroids[label]
+        radius = int(round(np.sqrt(stats[label, cv2.CC_STAT_AREA] / np.pi)))
+        refined.append(Dot(x=int(round(cx)) + x0, y=int(round(cy)) + y0, radius=max(1, radius)))
+    return refined
+
+def scale_dots(dots: List[Dot], factor: float) -> List[Dot]:
+    """Multiplies dot positions and radii by factor, rounding to whole pixels."""
+    return [Dot(x=int(round(d.x * factor)), y=int(round(d.y * factor)),
+                radius=max(1, int(round(d.radius * factor)))) for d in dots]
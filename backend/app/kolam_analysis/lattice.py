@@ -0,0 +1,264 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.utils import lazy
+
+spatial = lazy.module('scipy.spatial')
+
+# Nearest neighbours per dot whose difference vectors are used for the fit
+NEIGHBOURS = 6
+# Difference vectors longer than this many spacings are ignored
+MAX_SHELL = 1.6
+# Radius, in spacings, within which difference vectors count as the same
+# basis vector, how many vectors are tried as cluster centres and at most
+# how many vectors are clustered (an even subsample of large patterns)
+CLUSTER_TOLERANCE = 0.15
+CLUSTER_SAMPLES = 512
+MAX_CLUSTER_VECTORS = 8192
+# Second basis vector must be at least this many degrees away from the first
+MIN_BASIS_ANGLE = 20.0
+# Basis vectors shorter than this many spacings are degenerate, e.g. when a
+# cluster of opposite difference vectors averages out to about zero
+MIN_BASIS_LENGTH = 0.5
+# Lagrange-Gauss reduction of a valid basis ends in a few steps
+MAX_REDUCTION_STEPS = 32
+# A dot is on the lattice when it lies within this many spacings of its
+# snapped position; the fit is rejected if too few dots are
+SNAP_TOLERANCE = 0.25
+MIN_FIT_RATIO = 0.8
+# Angle and length-ratio tolerances used to name the lattice
+ANGLE_TOLERANCE = 8.0
+LENGTH_TOLERANCE = 0.12
+
+# Neighbour offsets in lattice coordinates. In a hexagonal or staggered
+# lattice the basis vectors are 60 degrees apart, so b - a is a neighbour too.
+SQUARE_OFFSETS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+HEXAGONAL_OFFSETS = ((1, 0), (0, 1), (-1, 1), (-1, 0), (0, -1), (1, -1))
+
+
+class Lattice:
+    """
+    A 2D point lattice fitted to the dots: origin + i * basis[0] + j * basis[1].
+
+    coords holds the integer (i, j) of every dot and on_lattice whether the
+    dot lies close to that point. Dots on the lattice are indexed in a dense
+    grid, so the dot at given coordinates and the neighbours of a dot are
+    found in constant time.
+    """
+    __slots__ = ('kind', 'spacing', 'orientation', 'basis', 'origin', 'coords', 'on_lattice',
+                 'offsets', '_grid', '_grid_offset')
+
+    def __init__(self, kind: str, basis: np.ndarray, origin: np.ndarray, coords: np.ndarray,
+                 on_lattice: np.ndarray):
+        self.kind = kind
+        self.basis = basis
+        self.origin = origin
+        self.coords = coords
+        self.on_lattice = on_lattice
+        self.spacing = float(np.linalg.norm(basis[0]))
+        # Angle of the first basis vector from the image x axis, in degrees
+        self.orientation = float(np.degrees(np.arctan2(basis[0, 1], basis[0, 0])))
+        self.offsets = HEXAGONAL_OFFSETS if kind in ('hexagonal', 'staggered') else SQUARE_OFFSETS
+
+        indexed = np.flatnonzero(on_lattice)
+        low = coords[indexed].min(axis=0) if len(indexed) else np.zeros(2, dtype=np.int64)
+        high = coords[indexed].max(axis=0) if len(indexed) else np.zeros(2, dtype=np.int64)
+        self._grid_offset = low
+        # grid[i - low_i, j - low_j] is the dot at (i, j), or -1. Where two
+        # dots snap to the same point the first one is kept.
+        self._grid = np.full(high - low + 1, -1, dtype=np.int32)
+        cells = coords[indexed] - low
+        self._grid[cells[::-1, 0], cells[::-1, 1]] = indexed[::-1]
+
+    def dot_at(self, i: int, j: int) -> Optional[int]:
+        """Index of the dot at lattice coordinates (i, j), or None."""
+        gi, gj = i - self._grid_offset[0], j - self._grid_offset[1]
+        if 0 <= gi < self._grid.shape[0] and 0 <= gj < self._grid.shape[1]:
+            dot = int(self._grid[gi, gj])
+            return dot if dot >= 0 else None
+        return None
+
+    def neighbours(self, dot: int) -> List[int]:
+        """Indices of the dots at the lattice points next to a dot."""
+        if not self.on_lattice[dot]:
+            return []
+        i, j = self.coords[dot].tolist()
+        found = (self.dot_at(i + di, j + dj) for di, dj in self.offsets)
+        return [n for n in found if n is not None]
+
+    def neighbour_table(self) -> np.ndarray:
+        """(N, K) array with the neighbour of every dot at each offset, or -1."""
+        table = np.full((len(self.coords), len(self.offsets)), -1, dtype=np.int32)
+        indexed = np.flatnonzero(self.on_lattice)
+        cells = self.coords[indexed] - self._grid_offset
+        shape = np.array(self._grid.shape)
+        for k, offset in enumerate(self.offsets):
+            target = cells + offset
+            inside = ((target >= 0) & (target < shape)).all(axis=1)
+            table[indexed[inside], k] = self._grid[target[inside, 0], target[inside, 1]]
+        return table
+
+    def dimensions(self) -> Tuple[int, int]:
+        """(columns, rows): the longest row of dots along the first basis vector, and the number of rows."""
+        rows = self.coords[self.on_lattice, 1]
+        if len(rows) == 0:
+            return 0, 0
+        _, counts = np.unique(rows, return_counts=True)
+        return int(counts.max()), len(counts)
+
+    def describe(self) -> str:
+        """Short description used as the grid pattern of the analysis, e.g. '5x5 grid'."""
+        columns, rows = self.dimensions()
+        name = {"square": "grid", "diagonal": "diagonal grid"}.get(self.kind, f"{self.kind} grid")
+        return f"{columns}x{rows} {name}"
+
+
+def _densest_vector(vectors: np.ndarray, tolerance: float) -> Optional[np.ndarray]:
+    """Mean of the largest cluster of vectors within tolerance of one of them."""
+    if len(vectors) == 0:
+        return None
+    vectors = vectors[::max(1, len(vectors) // MAX_CLUSTER_VECTORS)]
+    tree = spatial.cKDTree(vectors)
+    step = max(1, len(vectors) // CLUSTER_SAMPLES)
+    samples = vectors[::step]
+    counts = tree.query_ball_point(samples, tolerance, return_length=True)
+    members = tree.query_ball_point(samples[int(np.argmax(counts))], tolerance)
+    return vectors[members].mean(axis=0)
+
+
+def _cross(u: np.ndarray, v: np.ndarray):
+    return u[..., 0] * v[..., 1] - u[..., 1] * v[..., 0]
+
+
+def _is_degenerate(basis: np.ndarray, spacing: float) -> bool:
+    """True when a basis vector is not finite or near zero, or the two are nearly collinear."""
+    if not np.all(np.isfinite(basis)):
+        return True
+    lengths = np.linalg.norm(basis, axis=1)
+    if lengths.min() < MIN_BASIS_LENGTH * spacing:
+        return True
+    return abs(np.linalg.det(basis)) < np.sin(np.radians(MIN_BASIS_ANGLE)) * lengths.prod()
+
+
+def _reduce_basis(a: np.ndarray, b: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Lagrange-Gauss reduction: shortest basis of the same lattice, 60 to 90
+    degrees apart. None if it does not settle within MAX_REDUCTION_STEPS.
+    """
+    if a @ a > b @ b:
+        a, b = b, a
+    for _ in range(MAX_REDUCTION_STEPS):
+        if a @ a == 0:
+            return None
+        b = b - np.round((a @ b) / (a @ a)) * a
+        if b @ b >= a @ a:
+            return a, (-b if a @ b < 0 else b)
+        a, b = b, a
+    return None
+
+
+def _classify(a: np.ndarray, b: np.ndarray) -> str:
+    angle = np.degrees(np.arccos(np.clip(abs(a @ b) / (np.linalg.norm(a) * np.linalg.norm(b)), -1, 1)))
+    ratio = np.linalg.norm(b) / np.linalg.norm(a)
+    if abs(angle - 90) <= ANGLE_TOLERANCE:
+        return "square" if ratio <= 1 + LENGTH_TOLERANCE else "rectangular"
+    # Staggered rows: every other row is shifted by half a spacing
+    if abs(abs(a @ b) / (a @ a) - 0.5) <= LENGTH_TOLERANCE:
+        if abs(angle - 60) <= ANGLE_TOLERANCE and ratio <= 1 + LENGTH_TOLERANCE:
+            return "hexagonal"
+        return "staggered"
+    return "oblique"
+
+
+def _orient_basis(a: np.ndarray, b: np.ndarray, kind: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Picks, among the equivalent nearest basis vectors, the one closest to
+    pointing right along the image x axis as the first, and the one turning
+    towards +y (down the image) at the smallest angle from it as the second,
+    so i counts columns and j rows.
+    """
+    candidates = [a, b, b - a] if kind in ("hexagonal", "staggered") else [a, b]
+    candidates = np.array(candidates + [-v for v in candidates])
+    first = candidates[np.argmin(np.abs(np.arctan2(candidates[:, 1], candidates[:, 0])))]
+    lengths = np.linalg.norm(candidates, axis=1)
+    turning = _cross(first, candidates) / (np.linalg.norm(first) * lengths) > np.sin(np.radians(MIN_BASIS_ANGLE))
+    acute = (candidates @ first) / lengths
+    second = candidates[turning][np.argmax(acute[turning])]
+    return first, second
+
+
+def _snap(points: np.ndarray, origin: np.ndarray, basis: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Integer lattice coordinates of every point, and whether it lies close to that lattice point."""
+    coords = np.rint(np.linalg.solve(basis.T, (points - origin).T).T).astype(np.int64)
+    residuals = np.linalg.norm(points - origin - coords @ basis, axis=1)
+    return coords, residuals <= SNAP_TOLERANCE * np.linalg.norm(basis[0])
+
+
+def fit_lattice(positions: np.ndarray) -> Optional["Lattice"]:
+    """
+    Fits a lattice to dot positions in O(N log N). The basis is estimated
+    from the densest clusters of nearest-neighbour difference vectors,
+    reduced, named (square, diagonal for a square turned by about 45 degrees,
+    rectangular, hexagonal, staggered or oblique) and refined by least
+    squares over the snapped dots. Returns None when there are fewer than
+    four dots, no second direction, a degenerate (zero or collinear) basis,
+    or too few dots close to lattice points.
+    """
+    points = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+    if len(points) < 4:
+        return None
+
+    tree = spatial.cKDTree(points)
+    distances, neighbours = tree.query(points, k=min(NEIGHBOURS + 1, len(points)))
+    spacing = float(np.median(distances[:, 1]))
+    if spacing <= 0:
+        return None
+
+    differences = (points[neighbours[:, 1:]] - points[:, None, :]).reshape(-1, 2)
+    lengths = np.linalg.norm(differences, axis=1)
+    differences = differences[(lengths > 0) & (lengths <= MAX_SHELL * spacing)]
+    # Both signs, so a direction's cluster never splits at the half-plane boundary
+    differences = np.concatenate([differences, -differences])
+    tolerance = CLUSTER_TOLERANCE * spacing
+
+    a = _densest_vector(differences, tolerance)
+    if a is None or np.linalg.norm(a) < MIN_BASIS_LENGTH * spacing:
+        return None
+    sines = np.abs(_cross(a, differences)) / (np.linalg.norm(a) * np.linalg.norm(differences, axis=1))
+    b = _densest_vector(differences[sines > np.sin(np.radians(MIN_BASIS_ANGLE))], tolerance)
+    if b is None:
+        return None
+
+    if _is_degenerate(np.array([a, b]), spacing):
+        return None
+    reduced = _reduce_basis(a, b)
+    if reduced is None:
+        return None
+    a, b = reduced
+    kind = _classify(a, b)
+    a, b = _orient_basis(a, b, kind)
+    if kind == "square" and abs(abs(np.degrees(np.arctan2(a[1], a[0]))) - 45) <= ANGLE_TOLERANCE:
+        kind = "diagonal"
+
+    # Snap every dot relative to the one nearest the centroid, then refine
+    # origin and basis by least squares over the dots that fit
+    basis = np.array([a, b])
+    origin = points[tree.query(points.mean(axis=0))[1]]
+    for _ in range(2):
+        if _is_degenerate(basis, spacing):
+            return None
+        coords, on_lattice = _snap(points, origin, basis)
+        design = np.column_stack([np.ones(np.count_nonzero(on_lattice)), coords[on_lattice]])
+        # Snapped dots on a single lattice line do not determine both basis vectors
+        if len(design) < 3 or np.linalg.matrix_rank(design) < 3:
+            return None
+        solution, *_ = np.linalg.lstsq(design, points[on_lattice], rcond=None)
+        origin, basis = solution[0], solution[1:]
+
+    if _is_degenerate(basis, spacing):
+        return None
+    coords, on_lattice = _snap(points, origin, basis)
+    if np.count_nonzero(on_lattice) < MIN_FIT_RATIO * len(points):
+        return None
+    return Lattice(kind, basis, origin, coords, on_lattice)
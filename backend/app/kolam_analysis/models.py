@@ -1,6 +1,12 @@
-from dataclasses import dataclass, field
-from typing import List, Tuple, Any
-import networkx as nx
+from collections.abc import Sequence
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Any
+import numpy as np
+from app.utils import lazy
+from .lattice import Lattice, fit_lattice
+
+nx = lazy.module('networkx')
+sparse = lazy.module('scipy.sparse')
 
 # Using dataclasses is a modern Python feature that makes creating
 # classes for storing data clean and simple.
@@ -8,6 +14,7 @@ import networkx as nx
 @dataclass
 class Dot:
     """Represents a single detected dot (pulli) with its coordinates and size."""
+    __slots__ = ('x', 'y', 'radius')
     x: int
     y: int
     radius: int
@@ -15,6 +22,7 @@ class Dot:
 @dataclass
 class Line:
     """Represents a line segment connecting two points."""
+    __slots__ = ('p1', 'p2')
     p1: Tuple[int, int]
     p2: Tuple[int, int]
 
@@ -24,17 +32,204 @@ class AnalysisResult:
     dot_count: int = 0
     line_count: int = 0
     loops: int = 0
+    components: int = 0
     connectivity: str = "N/A"
+    odd_degree_dots: int = 0
     has_eulerian_path: bool = False
+    has_eulerian_circuit: bool = False
     symmetry_score: float = 0.0
+    axis_symmetry: Dict[str, float] = field(default_factory=dict)
     rotational_fold: int = 1
+    symmetry_group: str = "C1"
+    rotation_match_ratios: Dict[int, float] = field(default_factory=dict)
     grid_pattern: str = "N/A"
+    grid_spacing: float = 0.0
+    grid_orientation: float = 0.0
     region: str = "N/A"
 
-@dataclass
+
+def as_dot_array(dots) -> np.ndarray:
+    """Packs Dot objects (or an existing array) into an (N, 3) int32 array of x, y, radius."""
+    if isinstance(dots, DotSequence):
+        return dots._array
+    if isinstance(dots, np.ndarray):
+        return np.ascontiguousarray(dots, dtype=np.int32).reshape(-1, 3)
+    return np.array([(dot.x, dot.y, dot.radius) for dot in dots], dtype=np.int32).reshape(-1, 3)
+
+
+def as_edge_array(edges) -> np.ndarray:
+    """Packs (i, j) dot index pairs into an (E, 2) int32 array."""
+    return np.ascontiguousarray(np.asarray(edges, dtype=np.int32).reshape(-1, 2))
+
+
+class DotSequence(Sequence):
+    """Read-only list view of a dot array; Dot objects are made on access."""
+    __slots__ = ('_array',)
+
+    def __init__(self, array: np.ndarray):
+        self._array = array
+
+    def __len__(self) -> int:
+        return len(self._array)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Dot(x, y, r) for x, y, r in self._array[index].tolist()]
+        x, y, r = self._array[index].tolist()
+        return Dot(x, y, r)
+
+    def __iter__(self) -> Iterator[Dot]:
+        for x, y, r in self._array.tolist():
+            yield Dot(x, y, r)
+
+
+class LineSequence(Sequence):
+    """Read-only list view of the edges as Line segments between dot centres."""
+    __slots__ = ('_dots', '_edges')
+
+    def __init__(self, dot_array: np.ndarray, edge_array: np.ndarray):
+        self._dots = dot_array
+        self._edges = edge_array
+
+    def __len__(self) -> int:
+        return len(self._edges)
+
+    def _line(self, u: int, v: int) -> Line:
+        x1, y1 = self._dots[u, :2].tolist()
+        x2, y2 = self._dots[v, :2].tolist()
+        return Line(p1=(x1, y1), p2=(x2, y2))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._line(u, v) for u, v in self._edges[index].tolist()]
+        u, v = self._edges[index].tolist()
+        return self._line(u, v)
+
+    def __iter__(self) -> Iterator[Line]:
+        for (x1, y1), (x2, y2) in self._dots[self._edges, :2].tolist():
+            yield Line(p1=(x1, y1), p2=(x2, y2))
+
+
+# Marks a lattice that has not been fitted yet; None means no lattice fits
+_NOT_FITTED = object()
+
+
 class KolamPattern:
-    """The main data structure that holds all information about a single kolam."""
-    dots: List[Dot] = field(default_factory=list)
-    lines: List[Line] = field(default_factory=list)
-    graph: nx.Graph = field(default_factory=nx.Graph)
-    analysis: AnalysisResult = field(default_factory=AnalysisResult)
\ No newline at end of file
+    """
+    The main data structure that holds all information about a single kolam.
+
+    Dots are stored as an (N, 3) int32 array of x, y and radius, and edges as
+    an (E, 2) int32 array of dot indices. Everything else is derived from
+    those two arrays: positions and radii are views into the dot array, the
+    CSR adjacency matrix, the networkx graph and the dot lattice are built
+    on first use and dropped when the arrays are replaced, and dots / lines give list-like
+    access through Dot and Line objects for code that wants them.
+    """
+    __slots__ = ('_dot_array', '_edge_array', 'analysis', '_adjacency', '_graph', '_lattice')
+
+    def __init__(self, dots: Iterable = (), edges: Iterable = (), analysis: Optional[AnalysisResult] = None):
+        self._dot_array = as_dot_array(dots)
+        self._edge_array = as_edge_array(edges)
+        self.analysis = analysis if analysis is not None else AnalysisResult()
+        self._adjacency = None
+        self._graph = None
+        self._lattice = _NOT_FITTED
+
+    @property
+    def dot_array(self) -> np.ndarray:
+        return self._dot_array
+
+    @dot_array.setter
+    def dot_array(self, dots):
+        self._dot_array = as_dot_array(dots)
+        self._adjacency = None
+        self._graph = None
+        self._lattice = _NOT_FITTED
+
+    @property
+    def edge_array(self) -> np.ndarray:
+        return self._edge_array
+
+    @edge_array.setter
+    def edge_array(self, edges):
+        self._edge_array = as_edge_array(edges)
+        self._adjacency = None
+        self._graph = None
+
+    @property
+    def dots(self) -> DotSequence:
+        return DotSequence(self._dot_array)
+
+    @property
+    def lines(self) -> LineSequence:
+        return LineSequence(self._dot_array, self._edge_array)
+
+    @property
+    def positions(self) -> np.ndarray:
+        """(N, 2) view of the dot centres."""
+        return self._dot_array[:, :2]
+
+    @property
+    def radii(self) -> np.ndarray:
+        """(N,) view of the dot radii."""
+        return self._dot_array[:, 2]
+
+    def segments(self) -> np.ndarray:
+        """(E, 2, 2) array with the end points of every edge."""
+        return self._dot_array[self._edge_array, :2]
+
+    def degrees(self) -> np.ndarray:
+        """Number of edges at each dot."""
+        return np.bincount(self._edge_array.ravel(), minlength=len(self._dot_array))
+
+    def adjacency(self) -> "sparse.csr_matrix":
+        """Symmetric N x N adjacency matrix in CSR form, built on first use."""
+        if self._adjacency is None:
+            n = len(self._dot_array)
+            u, v = self._edge_array[:, 0], self._edge_array[:, 1]
+            rows = np.concatenate([u, v])
+            cols = np.concatenate([v, u])
+            data = np.ones(len(rows), dtype=np.int8)
+            self._adjacency = sparse.csr_matrix((data, (rows, cols)), shape=(n, n))
+        return self._adjacency
+
+    def lattice(self) -> Optional[Lattice]:
+        """
+        Lattice fitted to the dot positions, on first use; None when the dots
+        do not form a grid. Gives each dot integer lattice coordinates and
+        constant-time lookup of its grid neighbours.
+        """
+        if self._lattice is _NOT_FITTED:
+            self._lattice = fit_lattice(self.positions)
+        return self._lattice
+
+    @property
+    def graph(self) -> "nx.Graph":
+        """
+        networkx view of the pattern, built on first use. Nodes are dot indices
+        with a 'pos' attribute. Changes made to it are not written back.
+        """
+        if self._graph is None:
+            graph = nx.Graph()
+            graph.add_nodes_from((i, {'pos': (x, y)}) for i, (x, y) in enumerate(self.positions.tolist()))
+            graph.add_edges_from(self._edge_array.tolist())
+            self._graph = graph
+        return self._graph
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializes the pattern into plain JSON-compatible types."""
+        return {
+            "dots": [{"x": x, "y": y, "radius": r} for x, y, r in self._dot_array.tolist()],
+            "lines": self.segments().tolist(),
+            "edges": self._edge_array.tolist(),
+            "analysis": asdict(self.analysis),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "KolamPattern":
+        """Rebuilds a pattern produced by to_dict."""
+        dots = np.array([(dot["x"], dot["y"], dot["radius"]) for dot in data["dots"]], dtype=np.int32)
+        analysis = dict(data["analysis"])
+        # JSON turns the integer rotation orders into strings
+        analysis["rotation_match_ratios"] = {int(k): v for k, v in analysis["rotation_match_ratios"].items()}
+        return cls(dots=dots, edges=data["edges"], analysis=AnalysisResult(**analysis))
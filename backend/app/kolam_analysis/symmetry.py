@@ -0,0 +1,181 @@
+import numpy as np
+from typing import Any, Dict, Optional, Tuple
+from app.utils import lazy
+
+spatial = lazy.module('scipy.spatial')
+
+# Two positions closer than this many pixels are always treated as the same spot.
+MIN_TOLERANCE = 5.0
+# Otherwise the tolerance grows with the typical distance between dots.
+SPACING_TOLERANCE_RATIO = 0.25
+
+# Reflections through the centroid, expressed on offsets (dx, dy) from it.
+REFLECTION_AXES = {
+    "vertical": lambda dx, dy: (-dx, dy),
+    "horizontal": lambda dx, dy: (dx, -dy),
+    "diagonal": lambda dx, dy: (dy, dx),
+    "anti_diagonal": lambda dx, dy: (-dy, -dx),
+}
+
+
+def dot_spacing(points: np.ndarray) -> float:
+    """Median distance from each point to its nearest neighbour."""
+    if len(points) < 2:
+        return 0.0
+    distances, _ = spatial.cKDTree(points).query(points, k=2)
+    return float(np.median(distances[:, 1]))
+
+
+def match_tolerance(points: np.ndarray) -> float:
+    """Distance within which two positions are considered the same dot."""
+    return max(MIN_TOLERANCE, SPACING_TOLERANCE_RATIO * dot_spacing(points))
+
+
+class PositionIndex:
+    """
+    Finds, for query positions, the closest indexed point within a tolerance.
+    The points go in a k-d tree once, and each batch of queries is a single
+    tree query, so looking up N positions costs O(N log N).
+    """
+
+    def __init__(self, points: np.ndarray, tolerance: float):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.tolerance = tolerance
+        self._tree = spatial.cKDTree(self.points) if len(self.points) else None
+        # The tree only returns neighbours strictly closer than its bound, and a
+        # point exactly at the tolerance counts as a match
+        self._bound = float(np.nextafter(tolerance, np.inf))
+
+    def lookup(self, x: float, y: float) -> Optional[int]:
+        """Returns the index of the closest point within tolerance, or None."""
+        match = int(self.lookup_many(np.array([[x, y]]))[0])
+        return None if match < 0 else match
+
+    def lookup_many(self, points: np.ndarray) -> np.ndarray:
+        """Vector form of lookup; unmatched queries map to -1."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if self._tree is None or len(points) == 0:
+            return np.full(len(points), -1, dtype=np.int64)
+        _, matches = self._tree.query(points, distance_upper_bound=self._bound)
+        matches = matches.astype(np.int64)
+        # Misses come back as the number of indexed points
+        matches[matches >= len(self.points)] = -1
+        return matches
+
+
+def _edge_keys(edges: np.ndarray, node_count: int) -> np.ndarray:
+    """One int64 key per undirected edge, the same for (i, j) and (j, i)."""
+    low = np.minimum(edges[:, 0], edges[:, 1]).astype(np.int64)
+    high = np.maximum(edges[:, 0], edges[:, 1]).astype(np.int64)
+    return low * node_count + high
+
+
+def reflection_scores(positions: np.ndarray, edges: np.ndarray) -> Dict[str, float]:
+    """
+    Scores edge-preserving reflections about the vertical, horizontal and both
+    diagonal axes through the centroid of the dots. positions is an (N, 2)
+    array of dot centres and edges an (E, 2) array of dot indices. Each score
+    is the share of edges whose mirror image is also an edge.
+    """
+    scores = {axis: 0.0 for axis in REFLECTION_AXES}
+    edges = np.asarray(edges).reshape(-1, 2)
+    if len(edges) == 0:
+        return scores
+
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+    centroid = positions.mean(axis=0)
+    index = PositionIndex(positions, match_tolerance(positions))
+    offsets = positions - centroid
+    edge_keys = np.sort(_edge_keys(edges, len(positions)))
+
+    for axis, reflect in REFLECTION_AXES.items():
+        mx, my = reflect(offsets[:, 0], offsets[:, 1])
+        mirror = index.lookup_many(np.column_stack([mx, my]) + centroid)
+
+        mirrored = mirror[edges]
+        mapped = (mirrored >= 0).all(axis=1)
+        keys = _edge_keys(mirrored[mapped], len(positions))
+        found = np.searchsorted(edge_keys, keys)
+        symmetric_edges = np.count_nonzero(edge_keys[np.minimum(found, len(edge_keys) - 1)] == keys)
+        scores[axis] = symmetric_edges / len(edges)
+
+    return scores
+
+
+# Rotation orders tested by the dihedral detector (order 1 is the identity).
+MAX_ROTATION_ORDER = 8
+# Share of dots and edge midpoints that must map onto another one for a
+# rotation or mirror to count as a symmetry of the pattern.
+SYMMETRY_MATCH_THRESHOLD = 0.9
+# Dots and edge midpoints, away from the centroid, needed before any
+# symmetry above C1 is claimed. Points at the centroid map onto themselves
+# under every rotation and mirror, so they are not counted.
+MIN_SYMMETRY_POINTS = 4
+
+
+def _match_ratio(offsets: np.ndarray, index: PositionIndex, centroid: np.ndarray, matrix: np.ndarray) -> Tuple[int, int]:
+    """Counts how many offsets land on an indexed point after the linear map."""
+    if len(offsets) == 0:
+        return 0, 0
+    mapped = offsets @ matrix.T + centroid
+    return int(np.count_nonzero(index.lookup_many(mapped) >= 0)), len(offsets)
+
+
+def dihedral_symmetry(positions: np.ndarray, edges: np.ndarray) -> Dict[str, Any]:
+    """
+    Finds the dihedral group of the pattern. Every rotation order up to
+    MAX_ROTATION_ORDER is tested by rotating the dots and edge midpoints about
+    the centroid and looking them up in bucketed indexes, then the mirror axes
+    compatible with the best order are tested the same way. The cost is
+    linear in dots plus edges for each of the few dozen maps tried. Returns the group
+    name (C_n or D_n), the order, the number of mirror axes found and the
+    match ratio of every tested order. Patterns with fewer than
+    MIN_SYMMETRY_POINTS dots and edge midpoints off the centroid (a single
+    dot, say) are reported as C1.
+    """
+    result = {"group": "C1", "order": 1, "mirror_axes": 0, "rotation_ratios": {}}
+    dots = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+    if len(dots) == 0:
+        return result
+    midpoints = dots[np.asarray(edges).reshape(-1, 2)].mean(axis=1)
+
+    centroid = dots.mean(axis=0)
+    tolerance = match_tolerance(dots)
+    dot_index = PositionIndex(dots, tolerance)
+    midpoint_index = PositionIndex(midpoints, tolerance)
+    dot_offsets = dots - centroid
+    midpoint_offsets = midpoints - centroid
+    dot_offsets = dot_offsets[np.hypot(dot_offsets[:, 0], dot_offsets[:, 1]) > tolerance]
+    midpoint_offsets = midpoint_offsets[np.hypot(midpoint_offsets[:, 0], midpoint_offsets[:, 1]) > tolerance]
+    if len(dot_offsets) + len(midpoint_offsets) < MIN_SYMMETRY_POINTS:
+        return result
+
+    def ratio(matrix: np.ndarray) -> float:
+        dot_hits, dot_total = _match_ratio(dot_offsets, dot_index, centroid, matrix)
+        mid_hits, mid_total = _match_ratio(midpoint_offsets, midpoint_index, centroid, matrix)
+        return (dot_hits + mid_hits) / (dot_total + mid_total)
+
+    def rotation_ratio(angle: float) -> float:
+        c, s = np.cos(angle), np.sin(angle)
+        return ratio(np.array([[c, -s], [s, c]]))
+
+    # An order only counts if every multiple of its step angle maps the
+    # pattern onto itself; with a loose tolerance a single 2*pi/7 turn can
+    # pass for a 2*pi/8 one on an outer ring, but 2 * 2*pi/7 cannot.
+    for order in range(2, MAX_ROTATION_ORDER + 1):
+        score = min(rotation_ratio(2 * np.pi * k / order) for k in range(1, order // 2 + 1))
+        result["rotation_ratios"][order] = round(score, 3)
+        if score >= SYMMETRY_MATCH_THRESHOLD:
+            result["order"] = order
+
+    # A D_n pattern has n mirror axes spaced pi/n apart. Their offset from the
+    # image axes is unknown, so candidates are tried every pi/(2n).
+    order = result["order"]
+    candidates = 2 * max(order, 2)
+    for k in range(candidates):
+        c, s = np.cos(2 * np.pi * k / candidates), np.sin(2 * np.pi * k / candidates)
+        if ratio(np.array([[c, s], [s, -c]])) >= SYMMETRY_MATCH_THRESHOLD:
+            result["mirror_axes"] += 1
+
+    result["group"] = f"{'D' if result['mirror_axes'] else 'C'}{order}"
+    return result
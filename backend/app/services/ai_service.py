@@ -1,59 +1,205 @@
 import json
 import base64
+import hashlib
 import io
+import re
+import threading
+import time
+from collections import deque
+import numpy as np
 from flask import current_app
-import google.generativeai as genai
-from typing import Dict, Any
+from typing import Any, Dict, Iterator, Tuple
+from app import llm_cache, llm_client, job_queue
+from app.services.job_service import QueueFullError
+from app.services.llm_client import LLMUnavailableError
+from app.services import render_service
+from app.utils import lazy, metrics
+
+# The Gemini SDK takes most of a second to import; it is loaded on the first call
+genai = lazy.module('google.generativeai')
+
+# Process-wide model pool. genai.configure sets global state, so it only runs
+# when the API key changes; models are built once per (API key, model name).
+_model_lock = threading.Lock()
+_models: Dict[tuple, Any] = {}
+_configured_key = None
+
+# Latency of answered requests (cached or not) and of the API calls themselves
+LATENCY_WINDOW = 1000
+_stats_lock = threading.Lock()
+_request_latencies = deque(maxlen=LATENCY_WINDOW)
+_api_latencies = deque(maxlen=LATENCY_WINDOW)
+_counters = {"requests": 0, "api_calls": 0, "api_calls_saved": 0}
 
-# --- Helper Function (No changes needed) ---
 def _get_model():
-    """Initializes and returns the Gemini model instance."""
-    genai.configure(api_key=current_app.config['GOOGLE_API_KEY'])
-    model = genai.GenerativeModel(current_app.config['GEMINI_MODEL_NAME'])
+    """Returns the shared Gemini model instance for the app's key and model name."""
+    global _configured_key
+    api_key = current_app.config['GOOGLE_API_KEY']
+    model_name = current_app.config['GEMINI_MODEL_NAME']
+    model = _models.get((api_key, model_name))
+    if model is not None:
+        return model
+
+    with _model_lock:
+        model = _models.get((api_key, model_name))
+        if model is None:
+            if _configured_key != api_key:
+                genai.configure(api_key=api_key)
+                _configured_key = api_key
+            model = genai.GenerativeModel(model_name)
+            _models[(api_key, model_name)] = model
     return model
 
-# --- Revised AI Interaction Functions ---
-
-def get_ai_response(user_query: str) -> Dict[str, Any]:
+def normalize_prompt(text: str) -> str:
+    """Lowercases, collapses whitespace and drops trailing punctuation."""
+    return re.sub(r'\s+', ' ', text or '').strip().lower().rstrip('?!. ')
+
+def _cache_key(kind: str, system_prompt: str, payload: str) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    for part in (kind, current_app.config['GEMINI_MODEL_NAME'], system_prompt, payload):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def _record_api_call(seconds: float):
+    metrics.STAGE_SECONDS.observe(seconds, stage='llm')
+    with _stats_lock:
+        _counters["api_calls"] += 1
+        _api_latencies.append(seconds)
+
+def _record_request(seconds: float, saved: bool):
+    with _stats_lock:
+        _counters["requests"] += 1
+        _counters["api_calls_saved"] += int(saved)
+        _request_latencies.append(seconds)
+
+def _sdk_attempt(fn):
     """
-    Generates a structured response for a text-only query.
+    Wraps fn(timeout) so each attempt that reaches the SDK is recorded as
+    one API call, with the time until the SDK returned (for a stream, until
+    it opened). Calls rejected by the circuit breaker or the deadline never
+    run it and are not counted.
+    """
+    def attempt(timeout: float):
+        start = time.perf_counter()
+        try:
+            return fn(timeout)
+        finally:
+            _record_api_call(time.perf_counter() - start)
+    return attempt
+
+def _generate(model, contents: list):
+    """
+    Calls the model through llm_client, which enforces the request deadline,
+    retries transient errors and fails fast while the circuit breaker is
+    open.
+    """
+    return llm_client.call(_sdk_attempt(
+        lambda timeout: model.generate_content(contents, request_options={'timeout': timeout})))
 
-    Instead of raw text, this now returns a dictionary which is more
-    convenient for application frontends.
+def _cached_response(key: str, compute) -> Dict[str, Any]:
+    """
+    Returns the cached response for key or computes it. Only responses that
+    parsed as JSON are cached (compute returns them with cacheable=True), so a
+    malformed answer is retried on the next request.
     """
+    start = time.perf_counter()
+    result = llm_cache.get(key)
+    saved = result is not None
+    if not saved:
+        result, cacheable = compute()
+        if cacheable:
+            llm_cache.put(key, result)
+    _record_request(time.perf_counter() - start, saved)
+    return result
+
+def _stream_response(key: str, contents: list, parse, fallback=None) -> Iterator[Tuple[str, Any]]:
+    """
+    Streaming counterpart of _cached_response. Yields ('token', text) for each
+    chunk of the model's answer as it arrives, then ('response', dict) with
+    the answer parsed like the non-streaming call. A cached answer is yielded
+    as the response straight away. When fallback is given, it supplies the
+    response if the LLM is unavailable, or the stream stalls or fails,
+    before any token was sent.
+    """
+    start = time.perf_counter()
+    result = llm_cache.get(key)
+    if result is not None:
+        _record_request(time.perf_counter() - start, True)
+        yield 'response', result
+        return
+
     model = _get_model()
-    system_prompt = current_app.config['KOLAM_GPT_SYSTEM_PROMPT']
-    
+    # The deadline and the circuit breaker cover reading the chunks, not just opening the stream
+    chunks = llm_client.stream(_sdk_attempt(
+        lambda timeout: model.generate_content(contents, stream=True, request_options={'timeout': timeout})))
+    parts = []
+    try:
+        for chunk in chunks:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (safety ratings, finish reasons)
+                continue
+            if text:
+                parts.append(text)
+                yield 'token', text
+    except (LLMUnavailableError,) + llm_client.retryable_errors:
+        # Once tokens are out the fallback cannot replace them, so the error goes to the client
+        if fallback is None or parts:
+            raise
+        _record_request(time.perf_counter() - start, False)
+        yield 'response', fallback()
+        return
+
+    result, cacheable = parse(''.join(parts))
+    if cacheable:
+        llm_cache.put(key, result)
+    _record_request(time.perf_counter() - start, False)
+    yield 'response', result
+
+def _percentile(samples, q: float) -> float:
+    return round(float(np.percentile(samples, q)) * 1000, 2) if samples else 0.0
+
+def llm_stats() -> Dict[str, Any]:
+    """Request and API-call latency percentiles (ms), call counters and cache stats."""
+    with _stats_lock:
+        requests, api = list(_request_latencies), list(_api_latencies)
+        counters = dict(_counters)
+    return dict(
+        counters,
+        request_p50_ms=_percentile(requests, 50),
+        request_p95_ms=_percentile(requests, 95),
+        api_p50_ms=_percentile(api, 50),
+        api_p95_ms=_percentile(api, 95),
+        models=len(_models),
+        cache=llm_cache.stats(),
+        client=llm_client.stats(),
+    )
+
+# --- Revised AI Interaction Functions ---
+
+def _text_prompt(user_query: str) -> str:
     # Updated prompt to ask for a JSON structure
-    prompt = f"""
+    return f"""
     Analyze the following user query and provide a helpful response.
     Return the response as a valid JSON object with a single key "response_text".
     User query: '{user_query}'
     """
-    
-    response = model.generate_content([system_prompt, prompt])
 
+def _parse_text_response(text: str) -> Tuple[Dict[str, Any], bool]:
+    """Parses a text answer. Returns the response and whether it was valid JSON."""
     try:
         # Clean up the response and parse it as JSON
-        cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
-        return json.loads(cleaned_response)
+        cleaned_response = text.strip().replace("```json", "").replace("```", "")
+        return json.loads(cleaned_response), True
     except (json.JSONDecodeError, AttributeError):
         # Fallback for cases where the model doesn't return valid JSON
-        return {"response_text": response.text or "Sorry, I could not generate a valid response."}
-
-
-def get_ai_response_with_vision(user_query: str, analysis_results: dict) -> Dict[str, Any]:
-    """
-    Generates a structured interpretation of the Computer Vision analysis.
-    
-    This function now returns a rich dictionary with a summary, key features,
-    and a cultural interpretation, making it easy to display in distinct UI sections.
-    """
-    model = _get_model()
-    system_prompt = current_app.config['KOLAM_GPT_SYSTEM_PROMPT']
+        return {"response_text": text or "Sorry, I could not generate a valid response."}, False
 
+def _vision_prompt(user_query: str, analysis_results: dict) -> str:
     # Prompt updated to request a specific, structured JSON output
-    prompt_for_llm = f"""
+    return f"""
     Based on the following computer vision analysis of a Kolam, provide a structured interpretation.
     The user's original query was: '{user_query}'.
     
@@ -64,19 +210,90 @@ def get_ai_response_with_vision(user_query: str, analysis_results: dict) -> Dict
     2. "key_features": A list of strings, where each string highlights a key feature (e.g., "Dot Count: 49", "Symmetry: 4-fold rotational").
     3. "interpretation": A paragraph offering a cultural or artistic interpretation of the design.
     """
-    response = model.generate_content([system_prompt, prompt_for_llm])
 
+def _parse_vision_response(text: str) -> Tuple[Dict[str, Any], bool]:
+    """Parses a vision interpretation. Returns the response and whether it was valid JSON."""
     try:
         # Clean and parse the JSON response
-        cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
-        return json.loads(cleaned_response)
+        cleaned_response = text.strip().replace("```json", "").replace("```", "")
+        return json.loads(cleaned_response), True
     except (json.JSONDecodeError, AttributeError):
         # Fallback if JSON is invalid
         return {
             "summary": "Analysis Interpretation Failed",
             "key_features": [],
-            "interpretation": f"Could not generate a structured interpretation. Raw response: {response.text}"
-        }
+            "interpretation": f"Could not generate a structured interpretation. Raw response: {text}"
+        }, False
+
+def _vision_cache_key(user_query: str, analysis_results: dict, system_prompt: str) -> str:
+    # Analysis results round-trip through the JSON analysis cache, so keys are
+    # compared in their string form
+    payload = json.dumps(analysis_results, sort_keys=True, default=str) + '\0' + normalize_prompt(user_query)
+    return _cache_key('vision', system_prompt, payload)
+
+def get_ai_response(user_query: str) -> Dict[str, Any]:
+    """
+    Generates a structured response for a text-only query.
+
+    Instead of raw text, this now returns a dictionary which is more
+    convenient for application frontends. Answers are cached by model,
+    system prompt and the normalized query.
+    """
+    system_prompt = current_app.config['KOLAM_GPT_SYSTEM_PROMPT']
+
+    def compute():
+        response = _generate(_get_model(), [system_prompt, _text_prompt(user_query)])
+        return _parse_text_response(getattr(response, 'text', None))
+
+    return _cached_response(_cache_key('text', system_prompt, normalize_prompt(user_query)), compute)
+
+
+def stream_ai_response(user_query: str) -> Iterator[Tuple[str, Any]]:
+    """
+    Streaming form of get_ai_response: yields ('token', text) chunks as the
+    model produces them, then ('response', dict) with the parsed answer.
+    """
+    system_prompt = current_app.config['KOLAM_GPT_SYSTEM_PROMPT']
+    key = _cache_key('text', system_prompt, normalize_prompt(user_query))
+    return _stream_response(key, [system_prompt, _text_prompt(user_query)], _parse_text_response)
+
+
+def get_ai_response_with_vision(user_query: str, analysis_results: dict) -> Dict[str, Any]:
+    """
+    Generates a structured interpretation of the Computer Vision analysis.
+    
+    This function now returns a rich dictionary with a summary, key features,
+    and a cultural interpretation, making it easy to display in distinct UI sections.
+    Interpretations are cached by the analysis results and the normalized query.
+    When the LLM is unavailable (circuit breaker open, deadline exceeded or
+    transient errors past the retry budget), a deterministic interpretation of
+    the analysis is returned instead.
+    """
+    system_prompt = current_app.config['KOLAM_GPT_SYSTEM_PROMPT']
+
+    def compute():
+        try:
+            response = _generate(_get_model(), [system_prompt, _vision_prompt(user_query, analysis_results)])
+        except (LLMUnavailableError,) + llm_client.retryable_errors:
+            # Breaker open, deadline passed or retries exhausted on a transient error
+            return describe_analysis_offline(analysis_results), False
+        return _parse_vision_response(getattr(response, 'text', None))
+
+    return _cached_response(_vision_cache_key(user_query, analysis_results, system_prompt), compute)
+
+
+def stream_ai_response_with_vision(user_query: str, analysis_results: dict) -> Iterator[Tuple[str, Any]]:
+    """
+    Streaming form of get_ai_response_with_vision: yields ('token', text)
+    chunks, then ('response', dict). Falls back to the deterministic
+    interpretation in the same way.
+    """
+    system_prompt = current_app.config['KOLAM_GPT_SYSTEM_PROMPT']
+    return _stream_response(
+        _vision_cache_key(user_query, analysis_results, system_prompt),
+        [system_prompt, _vision_prompt(user_query, analysis_results)],
+        _parse_vision_response,
+        fallback=lambda: describe_analysis_offline(analysis_results))
 
 
 def generate_kolam_description(analysis_results: dict) -> Dict[str, Any]:
@@ -92,7 +309,7 @@ def generate_kolam_description(analysis_results: dict) -> Dict[str, Any]:
         },
         "symmetry_details": {
             "label": "Symmetry",
-            "value": f"The pattern shows a symmetry score of {analysis_results.get('symmetry_score', 0.0)} and {analysis_results.get('rotational_symmetry_fold', 1)}-fold rotational symmetry."
+            "value": f"The pattern shows a symmetry score of {analysis_results.get('symmetry_score', 0.0)} and {analysis_results.get('rotational_symmetry_fold', 1)}-fold rotational symmetry (symmetry group {analysis_results.get('symmetry_group', 'C1')})."
         },
         "pattern_details": {
             "label": "Repetition Patterns",
@@ -114,33 +331,50 @@ def generate_kolam_description(analysis_results: dict) -> Dict[str, Any]:
     return description_dict
 
 
-def generate_kolam_image(dots: list, lines: list, analysis_results: dict = None) -> Dict[str, Any]:
+def describe_analysis_offline(analysis_results: dict) -> Dict[str, Any]:
     """
-    Generates a digital kolam image using AI-based generation for better accuracy.
-    Falls back to procedural generation if AI fails.
+    Interpretation in the shape of get_ai_response_with_vision, built only
+    from the analysis results. Used when the LLM is unavailable.
     """
-    try:
-        # First try AI-based generation with a descriptive prompt
-        if analysis_results:
-            prompt = create_kolam_generation_prompt(analysis_results, len(dots), len(lines))
-
-            # Try AI generation first
-            try:
-                model = _get_model()
-                response = model.generate_content([
-                    "You are an expert at creating traditional Indian kolam patterns. Generate a beautiful, accurate digital recreation.",
-                    prompt
-                ])
+    description = generate_kolam_description(analysis_results)
+    details = [value for key, value in description.items() if key.endswith('_details')]
+    return {
+        "summary": (f"A kolam of {analysis_results.get('dot_count', 0)} dots and "
+                    f"{analysis_results.get('line_count', 0)} lines with "
+                    f"{analysis_results.get('symmetry_group', 'C1')} symmetry."),
+        "key_features": [f"{detail['label']}: {detail['value']}" for detail in details],
+        "interpretation": ("The AI interpretation service is temporarily unavailable, so this "
+                           "summary is derived directly from the computer vision analysis."),
+    }
 
-                # Extract image from response (this would need to be adjusted based on actual API)
-                # For now, fall through to procedural generation
-                print("AI image generation attempted, falling back to procedural generation")
 
-            except Exception as e:
-                print(f"AI generation failed: {e}, using procedural generation")
+def generate_kolam_image(dots: list, lines: list, analysis_results: dict = None,
+                         size: int = 800, output_format: str = 'png', strategy: str = None,
+                         inline: bool = True) -> Dict[str, Any]:
+    """
+    Generates a digital kolam image with the configured strategy
+    (IMAGE_GENERATOR, 'procedural' by default). dots and lines are lists of
+    dicts or a pattern's arrays, as accepted by render_service.layout. The
+    image is returned as 'image_bytes', and also base64 encoded as
+    'image_base64' when inline is set.
+
+    Local strategies render synchronously. A remote strategy never blocks the
+    response: the procedural image is returned straight away and the remote
+    generation runs as a background job with a timeout, whose id is returned
+    as 'remote_job_id' for polling through /api/jobs/<id>.
+    """
+    strategy = strategy or current_app.config.get('IMAGE_GENERATOR', 'procedural')
+    try:
+        if strategy in IMAGE_GENERATORS:
+            return IMAGE_GENERATORS[strategy](dots, lines, analysis_results, size, output_format, inline=inline)
+        if strategy not in REMOTE_IMAGE_GENERATORS:
+            raise ValueError(f"Unknown image generator '{strategy}'")
 
-        # Fallback: Procedural generation with improved algorithm
-        return generate_procedural_kolam(dots, lines, analysis_results)
+        result = generate_procedural_kolam(dots, lines, analysis_results, size, output_format, inline=inline)
+        job_id = _start_remote_generation(strategy, dots, lines, analysis_results or {}, size, output_format)
+        if job_id is not None:
+            result['remote_job_id'] = job_id
+        return result
 
     except Exception as e:
         return {
@@ -149,6 +383,54 @@ def generate_kolam_image(dots: list, lines: list, analysis_results: dict = None)
             "image_base64": ""
         }
 
+def _start_remote_generation(strategy: str, dots: list, lines: list, analysis_results: dict,
+                             size: int, output_format: str):
+    """Queues a remote image generation job. Returns its id, or None when the queue is full."""
+    app = current_app._get_current_object()
+    generator = REMOTE_IMAGE_GENERATORS[strategy]
+    timeout = app.config.get('IMAGE_GENERATOR_TIMEOUT', 60)
+
+    def run(_, on_stage):
+        # Workers run outside the request, so they need their own app context
+        with app.app_context():
+            on_stage(strategy)
+            return generator(dots, lines, analysis_results, size, output_format, timeout)
+
+    try:
+        return job_queue.submit(f'image:{strategy}', [None], run)
+    except QueueFullError:
+        current_app.logger.warning(f"Job queue full, skipping remote '{strategy}' image generation")
+        return None
+
+def generate_gemini_kolam(dots: list, lines: list, analysis_results: dict, size: int,
+                          output_format: str, timeout: float) -> Dict[str, Any]:
+    """
+    Remote strategy: asks the configured Gemini model for an image of the
+    kolam described by the analysis. Only models that answer with inline
+    image data can succeed; anything else raises ValueError.
+    """
+    model = _get_model()
+    prompt = create_kolam_generation_prompt(analysis_results, len(dots), len(lines))
+    contents = [
+        "You are an expert at creating traditional Indian kolam patterns. Generate a beautiful, accurate digital recreation.",
+        prompt
+    ]
+    response = llm_client.call(_sdk_attempt(
+        lambda remaining: model.generate_content(contents, request_options={'timeout': remaining})),
+        timeout=timeout)
+
+    for candidate in getattr(response, 'candidates', None) or []:
+        for part in getattr(candidate.content, 'parts', None) or []:
+            inline_data = getattr(part, 'inline_data', None)
+            if inline_data is not None and inline_data.mime_type.startswith('image/'):
+                return {
+                    "status": "success",
+                    "message": "Kolam image generated by the remote model.",
+                    "image_base64": base64.b64encode(inline_data.data).decode('utf-8'),
+                    "content_type": inline_data.mime_type
+                }
+    raise ValueError("The model did not return an image")
+
 def create_kolam_generation_prompt(analysis_results: dict, dot_count: int, line_count: int) -> str:
     """Creates a detailed prompt for AI image generation."""
     grid_pattern = analysis_results.get('grid_pattern', 'irregular')
@@ -174,68 +456,24 @@ def create_kolam_generation_prompt(analysis_results: dict, dot_count: int, line_
 
     return prompt.strip()
 
-def generate_procedural_kolam(dots: list, lines: list, analysis_results: dict = None) -> Dict[str, Any]:
-    """Generates a kolam image procedurally with improved algorithms."""
+def generate_procedural_kolam(dots: list, lines: list, analysis_results: dict = None,
+                              size: int = 800, output_format: str = 'png', inline: bool = True) -> Dict[str, Any]:
+    """
+    Generates a kolam image procedurally from the detected dots and lines,
+    as a size x size PNG or as SVG. A default pattern is drawn when no dots
+    were detected. The base64 copy is only made when inline is set.
+    """
     try:
-        import cv2
-        import numpy as np
-
-        # Create a high-quality white canvas
-        img_size = 800  # Higher resolution
-        regenerated_img = np.ones((img_size, img_size, 3), dtype=np.uint8) * 255
-
-        if not dots:
-            # If no dots detected, create a simple default pattern
-            return create_default_kolam_pattern(regenerated_img)
-
-        # Calculate bounds and scaling
-        if dots:
-            x_coords = [d['x'] for d in dots]
-            y_coords = [d['y'] for d in dots]
-            min_x, max_x = min(x_coords), max(x_coords)
-            min_y, max_y = min(y_coords), max(y_coords)
-
-            # Add padding
-            width = max_x - min_x if max_x > min_x else 100
-            height = max_y - min_y if max_y > min_y else 100
-
-            scale_x = (img_size * 0.8) / width if width > 0 else 1
-            scale_y = (img_size * 0.8) / height if height > 0 else 1
-            scale = min(scale_x, scale_y)
-
-            offset_x = img_size * 0.1 - min_x * scale
-            offset_y = img_size * 0.1 - min_y * scale
-
-            # Draw dots with better quality
-            for dot in dots:
-                center = (int(dot['x'] * scale + offset_x), int(dot['y'] * scale + offset_y))
-                radius = max(4, int(dot.get('radius', 3) * scale * 0.5))
-                cv2.circle(regenerated_img, center, radius, (0, 0, 0), -1)
-                # Add a subtle border for better visibility
-                cv2.circle(regenerated_img, center, radius + 1, (0, 0, 0), 1)
-
-            # Draw lines with better quality
-            for line in lines:
-                start_point = (int(line['start'][0] * scale + offset_x),
-                              int(line['start'][1] * scale + offset_y))
-                end_point = (int(line['end'][0] * scale + offset_x),
-                            int(line['end'][1] * scale + offset_y))
-                cv2.line(regenerated_img, start_point, end_point, (0, 0, 0), 3)
-
-        # Apply anti-aliasing for smoother lines
-        regenerated_img = cv2.GaussianBlur(regenerated_img, (3, 3), 0)
-
-        # Convert to base64
-        success, encoded_img = cv2.imencode('.png', regenerated_img, [cv2.IMWRITE_PNG_COMPRESSION, 0])
-        if success:
-            image_base64 = base64.b64encode(encoded_img.tobytes()).decode('utf-8')
-            return {
-                "status": "success",
-                "message": "Digital kolam generated successfully.",
-                "image_base64": image_base64
-            }
-        else:
-            raise ValueError("Failed to encode image")
+        image_bytes, content_type = render_service.render_kolam(dots, lines, size, output_format)
+        result = {
+            "status": "success",
+            "message": "Digital kolam generated successfully." if len(dots) else "Default kolam pattern generated.",
+            "image_bytes": image_bytes,
+            "content_type": content_type
+        }
+        if inline:
+            result["image_base64"] = base64.b64encode(image_bytes).decode('utf-8')
+        return result
 
     except Exception as e:
         return {
@@ -244,45 +482,14 @@ def generate_procedural_kolam(dots: list, lines: list, analysis_results: dict =
             "image_base64": ""
         }
 
-def create_default_kolam_pattern(img) -> Dict[str, Any]:
-    """Creates a default kolam pattern when no dots are detected."""
-    try:
-        import cv2
-
-        # Create a simple but beautiful default kolam pattern
-        center = (img.shape[1] // 2, img.shape[0] // 2)
-        radius = min(img.shape) // 3
-
-        # Draw concentric circles
-        for i in range(3):
-            cv2.circle(img, center, radius - i * 30, (0, 0, 0), 2)
-
-        # Draw radial lines
-        for angle in range(0, 360, 45):
-            x = int(center[0] + radius * np.cos(np.radians(angle)))
-            y = int(center[1] + radius * np.sin(np.radians(angle)))
-            cv2.line(img, center, (x, y), (0, 0, 0), 2)
-
-        # Add some dots
-        for angle in range(0, 360, 30):
-            x = int(center[0] + (radius - 15) * np.cos(np.radians(angle)))
-            y = int(center[1] + (radius - 15) * np.sin(np.radians(angle)))
-            cv2.circle(img, (x, y), 4, (0, 0, 0), -1)
-
-        success, encoded_img = cv2.imencode('.png', img)
-        if success:
-            image_base64 = base64.b64encode(encoded_img.tobytes()).decode('utf-8')
-            return {
-                "status": "success",
-                "message": "Default kolam pattern generated.",
-                "image_base64": image_base64
-            }
-        else:
-            raise ValueError("Failed to encode default pattern")
 
-    except Exception as e:
-        return {
-            "status": "error",
-            "message": f"Default pattern generation failed: {str(e)}",
-            "image_base64": ""
-        }
\ No newline at end of file
+# Image generation strategies, selected by the IMAGE_GENERATOR setting.
+# Local generators take (dots, lines, analysis_results, size, output_format,
+# inline=...) and run inside the request; remote ones take a timeout instead
+# of inline and run as background jobs.
+IMAGE_GENERATORS = {
+    'procedural': generate_procedural_kolam,
+}
+REMOTE_IMAGE_GENERATORS = {
+    'gemini': generate_gemini_kolam,
+}
@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class JobQueue:
+    """
+    Bounded local worker pool for analysis jobs.
+
+    A job carries one or more inputs (images). Workers run the pipeline for
+    each input in turn and record the current stage, so clients can poll, or
+    long-poll through wait(), for progress. Finished jobs are dropped once
+    their result TTL has passed.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 32, result_ttl: float = 600.0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._executor = None
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._pending = 0
+        self._running = 0
+        self._condition = threading.Condition()
+        if hasattr(os, 'register_at_fork'):
+            queue = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: queue() and queue()._forget_executor())
+
+    def init_app(self, app):
+        """Applies the JOB_* settings of a Flask app."""
+        self.workers = app.config.get('JOB_WORKERS', self.workers)
+        self.max_pending = app.config.get('JOB_MAX_PENDING', self.max_pending)
+        self.result_ttl = app.config.get('JOB_RESULT_TTL', self.result_ttl)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created on first use so forked server workers each get their own threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='kolam-job')
+        return self._executor
+
+    def _forget_executor(self):
+        # A forked child inherits the pool object but none of its threads
+        self._executor = None
+        self._condition = threading.Condition()
+
+    def _purge_expired(self):
+        """Drops finished jobs past their TTL. Must be called with the lock held."""
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['expires_at'] is not None and job['expires_at'] <= now]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _touch(self, job: Dict[str, Any]):
+        """Bumps a job's version and wakes long-pollers. Must be called with the lock held."""
+        job['version'] += 1
+        job['updated_at'] = time.time()
+        self._condition.notify_all()
+
+    def submit(self, job_type: str, inputs: List[Any], runner: Callable[[Any, Callable[[str], None]], Any]) -> str:
+        """
+        Queues a job and returns its id. runner(input, on_stage) is called for
+        every input on a worker thread; its return value becomes that input's
+        result and any exception marks only that input as failed.
+        """
+        with self._condition:
+            self._purge_expired()
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"Job queue is full ({self.max_pending} pending jobs)")
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            self._jobs[job_id] = {
+                'id': job_id,
+                'type': job_type,
+                'status': 'queued',
+                'created_at': now,
+                'updated_at': now,
+                'expires_at': None,
+                'version': 0,
+                'items': [{'status': 'queued', 'stage': None, 'completed_stages': [],
+                           'result': None, 'error': None} for _ in inputs],
+            }
+            self._pending += 1
+
+        self._get_executor().submit(self._run, job_id, inputs, runner)
+        return job_id
+
+    def _run(self, job_id: str, inputs: List[Any], runner):
+        with self._condition:
+            job = self._jobs[job_id]
+            job['status'] = 'running'
+            self._pending -= 1
+            self._running += 1
+            self._touch(job)
+
+        try:
+            for item, job_input in zip(job['items'], inputs):
+                def on_stage(stage: str, item=item):
+                    with self._condition:
+                        if item['stage'] is not None:
+                            item['completed_stages'].append(item['stage'])
+                        item['stage'] = stage
+                        item['status'] = 'running'
+                        self._touch(job)
+
+                try:
+                    result, error, status = runner(job_input, on_stage), None, 'done'
+                except Exception as e:
+                    result, error, status = None, str(e), 'failed'
+
+                with self._condition:
+                    if item['stage'] is not None:
+                        item['completed_stages'].append(item['stage'])
+                    item.update(stage=None, status=status, result=result, error=error)
+                    self._touch(job)
+        finally:
+            with self._condition:
+                failed = all(item['status'] == 'failed' for item in job['items'])
+                job['status'] = 'failed' if failed else 'done'
+                job['expires_at'] = time.time() + self.result_ttl
+                self._running -= 1
+                self._touch(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Returns a snapshot of the job, or None if it is unknown or expired."""
+        with self._condition:
+            self._purge_expired()
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def wait(self, job_id: str, since_version: int, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Long-poll: blocks until the job changes past since_version, finishes,
+        or the timeout runs out, then returns its snapshot.
+        """
+        deadline = time.time() + timeout
+        with self._condition:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return None
+                if job['version'] > since_version or job['status'] in ('done', 'failed'):
+                    return self._snapshot(job)
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return self._snapshot(job)
+                self._condition.wait(remaining)
+
+    @staticmethod
+    def _snapshot(job: Dict[str, Any]) -> Dict[str, Any]:
+        snapshot = dict(job)
+        snapshot['items'] = [dict(item, completed_stages=list(item['completed_stages'])) for item in job['items']]
+        return snapshot
+
+    def stats(self) -> Dict[str, int]:
+        """Queue depth and job counts."""
+        with self._condition:
+            self._purge_expired()
+            finished = sum(1 for job in self._jobs.values() if job['status'] in ('done', 'failed'))
+            return {
+                'queued': self._pending,
+                'running': self._running,
+                'finished': finished,
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+            }
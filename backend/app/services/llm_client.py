@@ -0,0 +1,267 @@
+import os
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple, Type
+
+from app.utils import lazy
+
+google_exceptions = lazy.module('google.api_core.exceptions')
+
+
+def default_retryable_errors() -> Tuple[Type[BaseException], ...]:
+    """
+    Upstream errors worth another attempt. Everything else (an invalid API
+    key, a malformed request) is raised straight away and does not count
+    against the circuit breaker. Built when a call fails, so the Google SDK
+    is not imported before it is used.
+    """
+    return (
+        TimeoutError,
+        ConnectionError,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+    )
+
+
+class LLMUnavailableError(Exception):
+    """Raised when the LLM cannot answer within the request's budget."""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+
+class DeadlineExceededError(LLMUnavailableError):
+    """Raised when the request deadline passes before a call succeeds."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After failure_threshold failures in a row the breaker opens and rejects
+    calls for reset_timeout seconds. It then lets a single trial call through
+    (half-open): success closes it again, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now. Claims the trial slot when half-open."""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+            self._trial_running = False
+
+    def release(self):
+        """Frees the trial slot after a call that neither succeeded nor failed upstream."""
+        with self._lock:
+            self._trial_running = False
+
+
+class LLMClient:
+    """
+    Deadline-aware wrapper around blocking LLM calls.
+
+    call(fn) runs fn(timeout) on a worker thread and waits at most for the
+    time left in the request's deadline. Retryable errors are retried with
+    full-jitter exponential backoff, but only while the next attempt can
+    still start before the deadline. Repeated failures trip the circuit
+    breaker, after which calls fail fast with CircuitOpenError.
+
+    The backend is just the callable, so a local fake can stand in for the
+    Gemini SDK. retryable defaults to default_retryable_errors().
+    """
+
+    def __init__(self, timeout: float = 20.0, max_retries: int = 2, base_delay: float = 0.5,
+                 max_delay: float = 4.0, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 workers: int = 8, retryable: Optional[Tuple[Type[BaseException], ...]] = None):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.workers = workers
+        self.retryable = retryable
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._counters_lock = threading.Lock()
+        self._counters = {"calls": 0, "attempts": 0, "retries": 0, "timeouts": 0,
+                          "failures": 0, "rejected": 0}
+        if hasattr(os, 'register_at_fork'):
+            client = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: client() and client()._forget_executor())
+
+    def init_app(self, app):
+        """Applies the LLM_* settings of a Flask app."""
+        self.timeout = app.config.get('LLM_TIMEOUT', self.timeout)
+        self.max_retries = app.config.get('LLM_MAX_RETRIES', self.max_retries)
+        self.base_delay = app.config.get('LLM_RETRY_BASE_DELAY', self.base_delay)
+        self.max_delay = app.config.get('LLM_RETRY_MAX_DELAY', self.max_delay)
+        self.breaker = CircuitBreaker(app.config.get('LLM_BREAKER_THRESHOLD', self.breaker.failure_threshold),
+                                      app.config.get('LLM_BREAKER_RESET', self.breaker.reset_timeout))
+
+    @property
+    def retryable_errors(self) -> Tuple[Type[BaseException], ...]:
+        """The exception types retried by call(), for use in except clauses."""
+        return self.retryable or default_retryable_errors()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created on first use so forked server workers each get their own threads
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='kolam-llm')
+            return self._executor
+
+    def _forget_executor(self):
+        # A forked child inherits the pool object but none of its threads
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._counters_lock:
+            self._counters[name] += 1
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, fn: Callable[[float], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Calls fn(remaining_seconds) until it succeeds, a non-retryable error
+        is raised, the retries run out or the deadline (timeout seconds from
+        now, LLM_TIMEOUT by default) passes. When the retries run out the last
+        upstream error is re-raised.
+        """
+        return self._call(fn, time.monotonic() + (self.timeout if timeout is None else timeout), True)
+
+    def _call(self, fn: Callable[[float], Any], deadline: float, settle: bool) -> Any:
+        # With settle=False a successful attempt leaves the breaker to the caller
+        self._count("calls")
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self._count("rejected")
+                raise CircuitOpenError("LLM circuit breaker is open")
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.breaker.release()
+                raise DeadlineExceededError("LLM request deadline exceeded")
+
+            self._count("attempts")
+            future = self._get_executor().submit(fn, remaining)
+            # Waiting apart from result() keeps a TimeoutError raised by fn
+            # (the builtin that concurrent.futures also raises) retryable
+            if not wait([future], timeout=remaining).done:
+                # The worker thread cannot be interrupted; its result is discarded
+                future.cancel()
+                self._count("timeouts")
+                self.breaker.record_failure()
+                raise DeadlineExceededError(f"LLM call did not finish within {remaining:.1f}s")
+            try:
+                result = future.result()
+            except self.retryable_errors as e:
+                self._count("failures")
+                self.breaker.record_failure()
+                delay = self._backoff(attempt)
+                if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                    raise
+                attempt += 1
+                self._count("retries")
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+
+            if settle:
+                self.breaker.record_success()
+            return result
+
+    def stream(self, fn: Callable[[float], Iterable[Any]], timeout: Optional[float] = None) -> Iterator[Any]:
+        """
+        Streaming form of call(). fn(remaining_seconds) opens the stream
+        with the same retries as call(). Each item is then read on a worker
+        thread within what is left of the same deadline. A read that stalls
+        past the deadline raises DeadlineExceededError. That, or a retryable
+        error mid-stream, counts as a failure on the circuit breaker; only a
+        stream read to the end counts as a success. Items already yielded
+        cannot be taken back, so nothing is retried once the stream is open.
+        """
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        items = iter(self._call(fn, deadline, False))
+        finished = object()
+        settled = False
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                future = self._get_executor().submit(next, items, finished) if remaining > 0 else None
+                if future is None or not wait([future], timeout=remaining).done:
+                    if future is not None:
+                        future.cancel()
+                    self._count("timeouts")
+                    settled = True
+                    self.breaker.record_failure()
+                    raise DeadlineExceededError("LLM stream did not finish before the request deadline")
+                try:
+                    item = future.result()
+                except self.retryable_errors:
+                    self._count("failures")
+                    settled = True
+                    self.breaker.record_failure()
+                    raise
+                if item is finished:
+                    settled = True
+                    self.breaker.record_success()
+                    return
+                yield item
+        finally:
+            # Abandoned by the consumer or ended by a non-retryable error
+            if not settled:
+                self.breaker.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counters_lock:
+            return dict(self._counters, breaker=self.breaker.state)
@@ -0,0 +1,172 @@
+import base64
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+import numpy as np
+from flask import current_app
+from app import analysis_cache, artifact_store
+from app.services import vision_service, ai_service
+from app.utils import image_utils, metrics, stages
+
+# Called with the name of each stage just before it starts
+StageCallback = Optional[Callable[[str], None]]
+
+def _enter(on_stage: StageCallback, stage: str):
+    if on_stage is not None:
+        on_stage(stage)
+
+def decode_options() -> Dict[str, int]:
+    """Upload limits and decode size for image_utils, taken from the app config."""
+    config = current_app.config
+    options = {'max_bytes': config['MAX_IMAGE_BYTES'], 'max_pixels': config['MAX_IMAGE_PIXELS']}
+    # Pyramid mode downsamples anyway, so a reduced decode loses nothing unless
+    # dots are refined against the full-resolution image
+    if config['KOLAM_PYRAMID'] and not config['KOLAM_PYRAMID_REFINE']:
+        options['min_pixels'] = config['DECODE_MIN_PIXELS']
+    return options
+
+def analyze_vision(image_array: np.ndarray, on_stage: StageCallback = None, reduction: int = 1) -> tuple:
+    """
+    Runs the (cached) computer vision analysis for a decoded image.
+    reduction is the factor returned by the decode, so the results come out
+    in the pixels of the uploaded image.
+    """
+    _enter(on_stage, "analyze")
+    with metrics.stage_timer('analyze'):
+        return vision_service.analyze_kolam_image_cached(
+            analysis_cache, image_array,
+            skeletonize=current_app.config['KOLAM_SKELETONIZE'],
+            pyramid=current_app.config['KOLAM_PYRAMID'],
+            refine=current_app.config['KOLAM_PYRAMID_REFINE'],
+            dot_detector=current_app.config['DOT_DETECTOR'],
+            tile_rows=current_app.config['KOLAM_TILE_ROWS'],
+            reduction=reduction)
+
+def original_for_publishing(image_array: np.ndarray, original_bytes: bytes = None,
+                            reduction: int = 1) -> Tuple[bytes, str]:
+    """
+    Bytes and content type of the original image as it is published. The
+    upload's metadata (camera, GPS position) never goes with it: a JPEG is
+    published as uploaded with its metadata segments stripped, and anything
+    else is re-encoded as a PNG, decoded again at full resolution when
+    image_array was decoded at a reduction.
+    """
+    if original_bytes is not None and image_utils.sniff_content_type(original_bytes) == 'image/jpeg':
+        try:
+            return image_utils.strip_jpeg_metadata(original_bytes), 'image/jpeg'
+        except ValueError:
+            # Decodable but not well-formed; re-encoded below
+            pass
+    if reduction > 1 and original_bytes is not None:
+        image_array, _ = image_utils.decode_image_bytes(
+            original_bytes, max_bytes=current_app.config['MAX_IMAGE_BYTES'],
+            max_pixels=current_app.config['MAX_IMAGE_PIXELS'])
+    return image_utils.encode_image_to_bytes(image_array), 'image/png'
+
+def run_analyze_pipeline(image_array: np.ndarray, on_stage: StageCallback = None,
+                         original_bytes: bytes = None, artifact_base_url: str = None,
+                         timings: Dict[str, float] = None, reduction: int = 1) -> Dict[str, Any]:
+    """
+    Full /api/analyze_kolam pipeline for a decoded image: analysis,
+    description and digital recreation. Returns the response dictionary.
+
+    With artifact_base_url the original image and the recreation are saved in
+    the artifact store and returned as URLs. Without it both are inlined as
+    base64 data URLs. When the recreation fails, regenerated_image is null
+    (an empty data URL when inlined) and regenerated_image_error says why.
+    The original is published at the upload's full
+    resolution, without its metadata (see original_for_publishing).
+    reduction is the factor image_array was reduced by when it was decoded.
+
+    After the analysis, the description, the recreation and the encoding of
+    the original image run concurrently. When a timings dict is given, the
+    wall time of each stage in seconds is recorded in it.
+    """
+    timings = {} if timings is None else timings
+    config = current_app.config
+
+    # 1. Analyze the image
+    start = time.perf_counter()
+    analysis_results, final_pattern = analyze_vision(image_array, on_stage, reduction)
+    timings['analyze'] = time.perf_counter() - start
+
+    # 2. Generate a description using AI
+    def describe():
+        return ai_service.generate_kolam_description(analysis_results)
+
+    # 3. Generate digital recreation using detected dots and lines
+    def render():
+        # The renderer takes the pattern's arrays as they are
+        with app.app_context():
+            return ai_service.generate_kolam_image(
+                final_pattern.dot_array, final_pattern.segments(), analysis_results,
+                size=config['RENDER_SIZE'], output_format=config['RENDER_FORMAT'],
+                inline=artifact_base_url is None)
+
+    # 4. Publish the original and regenerated images
+    def encode_original():
+        with app.app_context():
+            data, content_type = original_for_publishing(image_array, original_bytes, reduction)
+        if artifact_base_url is None:
+            # Inline mode for older clients. Uploads other than JPEG still pay
+            # a PNG encode on every request; running as its own stage only
+            # overlaps it with the description and the render.
+            return f"data:{content_type};base64,{base64.b64encode(data).decode('utf-8')}"
+        return artifact_base_url + artifact_store.put(data, content_type)
+
+    def encode(render):
+        if render['status'] != 'success':
+            # Inline clients get an empty data URL as before; the reason is
+            # returned as 'regenerated_image_error' either way
+            return None if artifact_base_url is not None else "data:image/png;base64,"
+        if artifact_base_url is None:
+            return f"data:{render['content_type']};base64,{render['image_base64']}"
+        return artifact_base_url + artifact_store.put(render['image_bytes'], render['content_type'])
+
+    # Stages on pool threads need the app context for the configuration
+    app = current_app._get_current_object()
+    outputs = stages.run_stages({
+        'describe': (describe, ()),
+        'render': (render, ()),
+        'encode_original': (encode_original, ()),
+        'encode': (encode, ('render',)),
+    }, on_stage=on_stage, timings=timings)
+    metrics.observe_stages({name: timings[name] for name in outputs})
+
+    # 5. Prepare response
+    response = {
+        'original_image': outputs['encode_original'],
+        'analysis': analysis_results,
+        'description': outputs['describe'],
+        'regenerated_image': outputs['encode']
+    }
+    if outputs['render']['status'] != 'success':
+        response['regenerated_image_error'] = outputs['render']['message']
+    if 'remote_job_id' in outputs['render']:
+        # A remote generator is still working; poll /api/jobs/<id> for its image
+        response['regenerated_image_job'] = outputs['render']['remote_job_id']
+    return response
+
+def run_chat_pipeline(prompt: str, image_array: np.ndarray, on_stage: StageCallback = None,
+                      reduction: int = 1) -> Dict[str, Any]:
+    """Image branch of /api/chat: vision analysis followed by the AI interpretation."""
+    # 1. Get a detailed analysis from the vision service
+    analysis_report, final_pattern = analyze_vision(image_array, on_stage, reduction)
+
+    # 2. Pass the report and original prompt to the AI service
+    _enter(on_stage, "llm")
+    return {'response': ai_service.get_ai_response_with_vision(prompt, analysis_report)}
+
+def stream_chat_pipeline(prompt: str, image_array: np.ndarray = None,
+                         reduction: int = 1) -> Iterator[Tuple[str, Any]]:
+    """
+    Streaming /api/chat: yields ('analysis', results) as soon as the vision
+    analysis of an image is done, then the ('token', text) and
+    ('response', dict) events of the AI service.
+    """
+    if image_array is None:
+        yield from ai_service.stream_ai_response(prompt)
+        return
+
+    analysis_report, final_pattern = analyze_vision(image_array, reduction=reduction)
+    yield 'analysis', analysis_report
+    yield from ai_service.stream_ai_response_with_vision(prompt, analysis_report)
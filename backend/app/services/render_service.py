@@ -0,0 +1,158 @@
+import hashlib
+from typing import Tuple
+import numpy as np
+from app.utils import lazy
+from app.utils.cache import ContentCache
+
+cv2 = lazy.module('cv2')
+
+# Rendered images, keyed by a hash of the geometry and output settings
+render_cache = ContentCache(max_bytes=16 * 1024 * 1024)
+
+CONTENT_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+LINE_THICKNESS = 3
+# Fixed-point bits used for sub-pixel coordinates in the OpenCV drawing calls
+_SHIFT = 4
+
+def _unit_circle(vertices: int) -> np.ndarray:
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    return np.stack([np.cos(angles), np.sin(angles)], axis=1)
+
+# Polygons approximating dots, and the much larger rings of the default pattern
+_DOT_CIRCLE = _unit_circle(32)
+_RING_CIRCLE = _unit_circle(256)
+
+
+def layout(dots, lines, size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Fits the detected geometry into a size x size canvas with a 10% margin.
+    dots and lines are either lists of dicts ({'x', 'y', 'radius'} and
+    {'start', 'end'}) or arrays as kept by KolamPattern: (N, 3) x, y, radius
+    and (M, 2, 2) segment end points.
+    Returns dot centres (N, 2), dot radii (N,) and line segments (M, 2, 2)
+    as float arrays in canvas coordinates.
+    """
+    if isinstance(dots, np.ndarray):
+        centres = dots[:, :2].astype(np.float64)
+        radii = dots[:, 2].astype(np.float64)
+    else:
+        centres = np.array([[d['x'], d['y']] for d in dots], dtype=np.float64).reshape(-1, 2)
+        radii = np.array([d.get('radius', 3) for d in dots], dtype=np.float64)
+    if isinstance(lines, np.ndarray):
+        segments = lines.astype(np.float64).reshape(-1, 2, 2)
+    else:
+        segments = np.array([[line['start'], line['end']] for line in lines], dtype=np.float64).reshape(-1, 2, 2)
+
+    min_xy = centres.min(axis=0)
+    extent = centres.max(axis=0) - min_xy
+    # Degenerate extents (a single row or column of dots) fall back to 100 px
+    extent[extent <= 0] = 100
+    scale = (size * 0.8 / extent).min()
+    offset = size * 0.1 - min_xy * scale
+
+    centres = centres * scale + offset
+    radii = np.maximum(4, np.floor(radii * scale * 0.5)) + 1
+    segments = segments * scale + offset
+    return centres, radii, segments
+
+
+def default_geometry(size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Geometry of the placeholder kolam drawn when no dots were detected:
+    three concentric rings, eight spokes and a ring of twelve dots.
+    Returns dot centres, dot radii, line segments and ring radii.
+    """
+    centre = np.array([size / 2, size / 2])
+    radius = size // 3
+    rings = np.array([radius - i * 30 for i in range(3)], dtype=np.float64)
+
+    spoke_angles = np.radians(np.arange(0, 360, 45))
+    spoke_ends = centre + radius * np.stack([np.cos(spoke_angles), np.sin(spoke_angles)], axis=1)
+    segments = np.stack([np.broadcast_to(centre, spoke_ends.shape), spoke_ends], axis=1)
+
+    dot_angles = np.radians(np.arange(0, 360, 30))
+    centres = centre + (radius - 15) * np.stack([np.cos(dot_angles), np.sin(dot_angles)], axis=1)
+    radii = np.full(len(centres), 4.0)
+    return centres, radii, segments, rings
+
+
+def _fixed(points: np.ndarray) -> np.ndarray:
+    return np.round(points * (1 << _SHIFT)).astype(np.int32)
+
+
+def render_png(centres: np.ndarray, radii: np.ndarray, segments: np.ndarray, size: int,
+               rings: np.ndarray = None) -> bytes:
+    """
+    Rasterizes the geometry with anti-aliased calls: one polylines call for
+    all line segments (another for rings), then one fillConvexPoly per dot.
+    """
+    canvas = np.full((size, size, 3), 255, dtype=np.uint8)
+
+    if len(segments):
+        cv2.polylines(canvas, list(_fixed(segments)), isClosed=False, color=(0, 0, 0),
+                      thickness=LINE_THICKNESS, lineType=cv2.LINE_AA, shift=_SHIFT)
+    if rings is not None and len(rings):
+        centre = np.array([size / 2, size / 2])
+        outlines = centre + rings[:, None, None] * _RING_CIRCLE[None]
+        cv2.polylines(canvas, list(_fixed(outlines)), isClosed=True, color=(0, 0, 0),
+                      thickness=LINE_THICKNESS, lineType=cv2.LINE_AA, shift=_SHIFT)
+
+    if len(centres):
+        polygons = centres[:, None, :] + radii[:, None, None] * _DOT_CIRCLE[None]
+        # Dots are filled one by one: a single fillPoly over all of them uses
+        # even-odd filling and leaves holes where two dots overlap
+        for polygon in _fixed(polygons):
+            cv2.fillConvexPoly(canvas, polygon, color=(0, 0, 0), lineType=cv2.LINE_AA, shift=_SHIFT)
+
+    success, encoded = cv2.imencode('.png', canvas, [cv2.IMWRITE_PNG_COMPRESSION, 3])
+    if not success:
+        raise ValueError("Failed to encode image")
+    return encoded.tobytes()
+
+
+def render_svg(centres: np.ndarray, radii: np.ndarray, segments: np.ndarray, size: int,
+               rings: np.ndarray = None) -> bytes:
+    """Writes the geometry as a compact, resolution-independent SVG document."""
+    path = ''.join(f"M{x0:.1f} {y0:.1f}L{x1:.1f} {y1:.1f}" for (x0, y0), (x1, y1) in segments.tolist())
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" width="{size}" height="{size}">',
+        f'<rect width="{size}" height="{size}" fill="#fff"/>',
+        f'<g fill="none" stroke="#000" stroke-width="{LINE_THICKNESS}" stroke-linecap="round">',
+    ]
+    if path:
+        parts.append(f'<path d="{path}"/>')
+    if rings is not None:
+        parts.extend(f'<circle cx="{size / 2:.1f}" cy="{size / 2:.1f}" r="{r:.1f}"/>' for r in rings.tolist())
+    parts.append('</g><g fill="#000">')
+    parts.extend(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{r:.1f}"/>'
+                 for (x, y), r in zip(centres.tolist(), radii.tolist()))
+    parts.append('</g></svg>')
+    return ''.join(parts).encode('utf-8')
+
+
+def render_kolam(dots, lines, size: int = 800, output_format: str = 'png') -> Tuple[bytes, str]:
+    """
+    Renders detected dots and lines (or the placeholder pattern when there are
+    no dots) as PNG or SVG. Returns the encoded bytes and their content type.
+    Results are cached by a hash of the geometry and the output settings.
+    """
+    if output_format not in CONTENT_TYPES:
+        raise ValueError(f"Unsupported output format '{output_format}'")
+
+    if len(dots):
+        centres, radii, segments = layout(dots, lines, size)
+        rings = None
+    else:
+        centres, radii, segments, rings = default_geometry(size)
+
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{output_format}:{size}".encode('utf-8'))
+    for array in (centres, radii, segments, rings):
+        if array is not None:
+            digest.update(np.ascontiguousarray(array).tobytes())
+
+    renderer = render_svg if output_format == 'svg' else render_png
+    data = render_cache.get_or_compute(
+        digest.hexdigest(), lambda: renderer(centres, radii, segments, size, rings))
+    return data, CONTENT_TYPES[output_format]
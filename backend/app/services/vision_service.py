@@ -1,53 +1,167 @@
+import hashlib
+import json
+import logging
+import time
 import numpy as np
 from app.kolam_analysis import image_processor, analyzer
+from app.kolam_analysis.models import KolamPattern
+from app.utils import lazy, metrics, stages
 
-def analyze_kolam_image(cv_image: np.ndarray) -> tuple:
+cv2 = lazy.module('cv2')
+
+logger = logging.getLogger(__name__)
+
+# Options that change how the analysis runs but not its output; they are
+# left out of the cache key
+OUTPUT_NEUTRAL_OPTIONS = ('tile_rows',)
+
+# Part of every analysis cache key. Bump it whenever a change to the pipeline
+# alters its output, so stale cached results are not served.
+PIPELINE_VERSION = "7"
+
+def analysis_cache_key(cv_image: np.ndarray, **params) -> str:
+    """Content hash of the decoded pixels, the pipeline version and its parameters."""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(json.dumps({
+        "version": PIPELINE_VERSION,
+        "shape": cv_image.shape,
+        "dtype": str(cv_image.dtype),
+        "params": params,
+    }, sort_keys=True).encode('utf-8'))
+    digest.update(memoryview(np.ascontiguousarray(cv_image)).cast('B'))
+    return digest.hexdigest()
+
+def analyze_kolam_image_cached(cache, cv_image: np.ndarray, **options) -> tuple:
+    """
+    Same as analyze_kolam_image, but served from the content-addressed cache
+    when the same pixels were analysed before with the same options.
+    Identical requests running at the same time share one computation.
+    """
+    key = analysis_cache_key(cv_image, **{name: value for name, value in options.items()
+                                          if name not in OUTPUT_NEUTRAL_OPTIONS})
+
+    def compute() -> bytes:
+        results, pattern = analyze_kolam_image(cv_image, **options)
+        return json.dumps({"results": results, "pattern": pattern.to_dict()}).encode('utf-8')
+
+    entry = json.loads(cache.get_or_compute(key, compute))
+    return entry["results"], KolamPattern.from_dict(entry["pattern"])
+
+def analyze_kolam_image(cv_image: np.ndarray, skeletonize: bool = True,
+                        pyramid: bool = False, refine: bool = False, dot_detector: str = 'cascade',
+                        tile_rows: int = 0, reduction: int = 1, timings: dict = None) -> tuple:
     """
     Orchestrates the full computer vision pipeline for a kolam image.
     Returns a dictionary with the analysis results.
+    When skeletonize is set, the line image is thinned to one-pixel-wide
+    centrelines before the graph is built.
+    In pyramid mode detection and graph building run on a downscaled copy
+    sized from the image and its dot scale; dot and line coordinates are then
+    mapped back to original pixels, and optionally refined at full resolution.
+    reduction is the factor the image was reduced by when it was decoded
+    (see image_utils.decode_image_bytes); coordinates are scaled by it so the
+    results are in the pixels of the uploaded image either way.
+    dot_detector names the dot detection mode in image_processor.DOT_DETECTORS.
+    With tile_rows set, preprocessing runs on bands of that many rows in
+    parallel and line pixels are streamed band by band into the graph
+    builder; the output is the same as without tiling.
+    Independent stages run concurrently; when a timings dict is given, the
+    wall time of each stage in seconds is recorded in it.
     """
-    import time
-    start_time = time.time()
-    print(f"Starting analysis at {start_time}")
-
-    # 1. Preprocess the image to get a clean binary version
-    print("Preprocessing image...")
-    preprocessed_image = image_processor.preprocess_image(cv_image)
-    print(f"Preprocessing done in {time.time() - start_time} seconds")
-    print(f"Image shape: {cv_image.shape}, Preprocessed shape: {preprocessed_image.shape if preprocessed_image is not None else 'None'}")
-
-    # 2. Detect the dots (pullis) from the original image for accuracy
-    print("Detecting dots...")
-    dots = image_processor.detect_dots(cv_image)
-    print(f"Detected {len(dots)} dots in {time.time() - start_time} seconds")
-    if dots:
-        print(f"Sample dot positions: {[(d.x, d.y, d.radius) for d in dots[:3]]}")
-    else:
-        print("No dots detected - checking image properties...")
+    stage_timings = {} if timings is None else timings
+    if dot_detector not in image_processor.DOT_DETECTORS:
+        raise ValueError(f"Unknown dot detector '{dot_detector}'")
+    detect = image_processor.DOT_DETECTORS[dot_detector]
+
+    original_image = cv_image
+    scale = image_processor.choose_working_scale(cv_image) if pyramid else 1.0
+    if scale < 1.0:
+        with metrics.stage_timer('downscale'):
+            cv_image = image_processor.downscale(cv_image, scale)
+        logger.debug("Pyramid mode: working at scale %.3f, shape %s", scale, cv_image.shape)
+
+    # 1-3. Preprocessing (with skeletonization) and dot detection are
+    # independent, so they run concurrently; the graph needs both
+    def preprocess():
+        if tile_rows:
+            return image_processor.preprocess_image_tiled(cv_image, tile_rows)
+        return image_processor.preprocess_image(cv_image)
+
+    def centrelines(preprocess):
+        if not skeletonize or preprocess is None:
+            return preprocess
+        line_image, skeleton_stats = image_processor.extract_centrelines(preprocess)
+        logger.debug("Skeletonized %d -> %d line pixels",
+                     skeleton_stats['pixels_before'], skeleton_stats['pixels_after'])
+        return line_image
+
+    def detect_dots():
+        # Detect the dots (pullis) from the original image for accuracy
+        return detect(cv_image)
+
+    def build_graph(centrelines, detect_dots):
+        if tile_rows and centrelines is not None:
+            return analysis_instance.build_graph_from_pixels(
+                detect_dots, image_processor.iter_line_pixels(centrelines, tile_rows))
+        return analysis_instance.build_graph(detect_dots, centrelines)
+
+    analysis_instance = analyzer.KolamAnalyzer(original_image.shape)
+    outputs = stages.run_stages({
+        'preprocess': (preprocess, ()),
+        'centrelines': (centrelines, ('preprocess',)),
+        'detect_dots': (detect_dots, ()),
+        'build_graph': (build_graph, ('centrelines', 'detect_dots')),
+    }, timings=stage_timings)
+    dots, pattern = outputs['detect_dots'], outputs['build_graph']
+
+    if not dots:
         gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-        print(f"Image mean intensity: {np.mean(gray):.2f}, std: {np.std(gray):.2f}")
+        logger.info("No dots detected in a %s image (mean intensity %.2f, std %.2f)",
+                    cv_image.shape, np.mean(gray), np.std(gray))
 
-    # 3. Initialize the analyzer and perform high-level analysis
-    print("Building graph...")
-    analysis_instance = analyzer.KolamAnalyzer(cv_image.shape)
-    pattern = analysis_instance.build_graph(dots, preprocessed_image)
-    print(f"Graph built with {len(pattern.dots)} dots, {len(pattern.lines)} lines in {time.time() - start_time} seconds")
+    if scale < 1.0 or reduction > 1:
+        # Map the working-scale geometry back to original pixels
+        relocate_start = time.perf_counter()
+        full_dots = pattern.dots
+        if scale < 1.0:
+            full_dots = image_processor.scale_dots(full_dots, 1.0 / scale)
+            if refine:
+                full_dots = image_processor.refine_dots(original_image, full_dots)
+        if reduction > 1:
+            full_dots = image_processor.scale_dots(full_dots, reduction)
+        pattern = analysis_instance.relocate_dots(pattern, full_dots)
+        stage_timings['relocate'] = time.perf_counter() - relocate_start
 
-    print("Analyzing pattern...")
+    analyze_start = time.perf_counter()
     final_pattern = analysis_instance.analyze_pattern(pattern)
-    print(f"Analysis done in {time.time() - start_time} seconds")
+    stage_timings['analyze_pattern'] = time.perf_counter() - analyze_start
+
+    metrics.observe_stages(stage_timings)
+    metrics.PIXELS_PROCESSED.inc(original_image.shape[0] * original_image.shape[1])
+    metrics.DOTS_DETECTED.inc(len(final_pattern.dots))
+    metrics.EDGES_DETECTED.inc(len(final_pattern.lines))
+    logger.debug("Analysed %s image: %d dots, %d lines; stage times %s", original_image.shape,
+                 len(final_pattern.dots), len(final_pattern.lines),
+                 ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in stage_timings.items()))
 
     # 4. Serialize the results into a dictionary for the AI service
     results = {
         "dot_count": final_pattern.analysis.dot_count,
         "line_count": final_pattern.analysis.line_count,
         "symmetry_score": round(final_pattern.analysis.symmetry_score, 2),
+        "axis_symmetry": {axis: round(score, 2) for axis, score in final_pattern.analysis.axis_symmetry.items()},
         "rotational_symmetry_fold": final_pattern.analysis.rotational_fold,
+        "symmetry_group": final_pattern.analysis.symmetry_group,
+        "rotation_match_ratios": final_pattern.analysis.rotation_match_ratios,
         "closed_loops": final_pattern.analysis.loops,
+        "components": final_pattern.analysis.components,
         "connectivity": final_pattern.analysis.connectivity,
         "is_eulerian": final_pattern.analysis.has_eulerian_path,
+        "is_eulerian_circuit": final_pattern.analysis.has_eulerian_circuit,
         "grid_pattern": final_pattern.analysis.grid_pattern,
+        "grid_spacing": round(final_pattern.analysis.grid_spacing, 1),
+        # Adding 0.0 turns a rounded -0.0 into 0.0
+        "grid_orientation": round(final_pattern.analysis.grid_orientation, 1) + 0.0,
         "region": final_pattern.analysis.region
     }
-    print(f"Total analysis time: {time.time() - start_time} seconds")
     return results, final_pattern
\ No newline at end of file
@@ -0,0 +1,78 @@
+import threading
+import time
+from typing import Any, Dict
+
+import numpy as np
+
+from app.services import ai_service, vision_service
+from app.utils import image_utils, lazy
+
+cv2 = lazy.module('cv2')
+
+_state: Dict[str, Any] = {'status': 'cold', 'seconds': None, 'error': None}
+_lock = threading.Lock()
+
+
+def synthetic_kolam(size: int = 1024, rows: int = 7) -> np.ndarray:
+    """A clean rows x rows dot grid with every neighbour pair joined, on a white square."""
+    image = np.full((size, size, 3), 255, dtype=np.uint8)
+    spacing = size // (rows + 1)
+    radius = max(3, spacing // 10)
+    centres = [(spacing * (i + 1), spacing * (j + 1)) for j in range(rows) for i in range(rows)]
+    for x, y in centres:
+        if x + spacing < size - spacing // 2:
+            cv2.line(image, (x + 2 * radius, y), (x + spacing - 2 * radius, y), (0, 0, 0), 2)
+        if y + spacing < size - spacing // 2:
+            cv2.line(image, (x, y + 2 * radius), (x, y + spacing - 2 * radius), (0, 0, 0), 2)
+        cv2.circle(image, (x, y), radius, (0, 0, 0), -1)
+    return image
+
+
+def warm_up(app) -> Dict[str, Any]:
+    """
+    Imports every module kept behind a lazy facade (OpenCV, SciPy, networkx,
+    Pillow and the Gemini SDK), then runs every local stage of
+    /api/analyze_kolam once on a synthetic image: PNG encode and decode, the
+    uncached vision analysis with the configured options, the offline
+    description and the procedural recreation. The Gemini API, the analysis
+    cache and the artifact store are not touched.
+
+    Call it in the server process before workers fork, so they inherit
+    loaded libraries and initialised detector state instead of paying for
+    them on their first request. Returns the warm-up state.
+    """
+    with _lock:
+        _state.update(status='warming', seconds=None, error=None)
+    start = time.perf_counter()
+    try:
+        lazy.preload()
+        with app.app_context():
+            config = app.config
+            data = image_utils.encode_image_to_bytes(synthetic_kolam())
+            image, _ = image_utils.decode_image_bytes(data, max_bytes=config['MAX_IMAGE_BYTES'],
+                                                      max_pixels=config['MAX_IMAGE_PIXELS'])
+            results, pattern = vision_service.analyze_kolam_image(
+                image, skeletonize=config['KOLAM_SKELETONIZE'], pyramid=config['KOLAM_PYRAMID'],
+                refine=config['KOLAM_PYRAMID_REFINE'], dot_detector=config['DOT_DETECTOR'],
+                tile_rows=config['KOLAM_TILE_ROWS'])
+            ai_service.describe_analysis_offline(results)
+            ai_service.generate_procedural_kolam(pattern.dot_array, pattern.segments(), results,
+                                                 config['RENDER_SIZE'], config['RENDER_FORMAT'])
+    except Exception as e:
+        with _lock:
+            _state.update(status='failed', seconds=time.perf_counter() - start, error=str(e))
+        raise
+    with _lock:
+        _state.update(status='ready', seconds=time.perf_counter() - start)
+        return dict(_state)
+
+
+def state() -> Dict[str, Any]:
+    """Warm-up status ('cold', 'warming', 'ready' or 'failed'), its duration and any error."""
+    with _lock:
+        return dict(_state)
+
+
+def configure_worker(opencv_threads: int):
+    """Caps OpenCV's internal thread pool of a server worker process."""
+    cv2.setNumThreads(opencv_threads)
@@ -0,0 +1,159 @@
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import List, Optional, Tuple
+
+# Artifact names are the SHA-256 of the content plus a file extension
+_NAME_PATTERN = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]+$')
+
+
+class SweptDirectory:
+    """
+    Directory of files held to a retention period and a size cap.
+
+    Files are kept for retention seconds after they were last written or
+    touched, and the directory is held under max_bytes by removing the
+    oldest first (0 disables either limit). Only files whose names match
+    pattern are counted or removed. Both limits are enforced by a sweep
+    after each write, at most once every sweep_interval seconds, or straight
+    away when this process's running total goes past max_bytes. Several
+    processes may share the directory; each sweep rescans it.
+    """
+
+    def __init__(self, directory: str, pattern, max_bytes: int = 0, retention: float = 0,
+                 sweep_interval: float = 300.0):
+        self.directory = directory
+        self.pattern = pattern
+        self.max_bytes = max_bytes
+        self.retention = retention
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        # Bytes written since the last sweep counted on top of what it found;
+        # None until the first sweep has scanned the directory
+        self._size: Optional[int] = None
+        self._last_sweep = 0.0
+        self._sweeping = False
+
+    def record_write(self, size: int):
+        """Counts a newly written file of size bytes and sweeps when one is due."""
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+        self._maybe_sweep()
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        with self._lock:
+            due = (self._size is None or now - self._last_sweep >= self.sweep_interval
+                   or (self.max_bytes and self._size > self.max_bytes))
+            # One sweep at a time per process; the others carry on storing
+            if self._sweeping or not due:
+                return
+            self._sweeping = True
+            self._last_sweep = now
+        try:
+            self.sweep()
+        finally:
+            with self._lock:
+                self._sweeping = False
+
+    def _scan(self) -> List[Tuple[float, int, str]]:
+        """(modification time, size, path) of every file the pattern matches."""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for file_name in files:
+                if not self.pattern.match(file_name):
+                    continue
+                path = os.path.join(root, file_name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def sweep(self) -> int:
+        """
+        Removes files past their retention, then the oldest ones until the
+        directory fits in max_bytes. Returns the number removed.
+        """
+        entries = sorted(self._scan())
+        cutoff = time.time() - self.retention if self.retention else None
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            if not ((cutoff is not None and mtime < cutoff) or (self.max_bytes and total > self.max_bytes)):
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Already removed by another process's sweep
+                pass
+            total -= size
+            removed += 1
+        with self._lock:
+            self._size = total
+        return removed
+
+
+class ArtifactStore(SweptDirectory):
+    """
+    Local content-addressed store for generated and uploaded images.
+
+    Each artifact is saved once under the SHA-256 of its bytes, so storing the
+    same image again is free and its name can double as a strong ETag.
+
+    Artifacts are kept for retention seconds after they were last stored and
+    the directory is held under max_bytes, as described in SweptDirectory.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = 1024 * 1024 * 1024,
+                 retention: float = 7 * 24 * 3600, sweep_interval: float = 300.0):
+        super().__init__(directory or os.path.join(tempfile.gettempdir(), 'kolamgpt-artifacts'),
+                         _NAME_PATTERN, max_bytes, retention, sweep_interval)
+
+    def init_app(self, app):
+        """Applies the ARTIFACT_* settings of a Flask app."""
+        self.directory = app.config.get('ARTIFACT_DIR') or self.directory
+        self.max_bytes = app.config.get('ARTIFACT_MAX_BYTES', self.max_bytes)
+        self.retention = app.config.get('ARTIFACT_RETENTION', self.retention)
+        self._size = None
+
+    def path_for(self, name: str) -> Optional[str]:
+        """Filesystem path of a stored artifact, or None for invalid or unknown names."""
+        if not _NAME_PATTERN.match(name):
+            return None
+        path = os.path.join(self.directory, name[:2], name)
+        return path if os.path.isfile(path) else None
+
+    def put(self, data: bytes, content_type: str) -> str:
+        """Stores bytes and returns the artifact name."""
+        extension = (mimetypes.guess_extension(content_type) or '.bin').lstrip('.')
+        name = f"{hashlib.sha256(data).hexdigest()}.{extension}"
+        path = os.path.join(self.directory, name[:2], name)
+        try:
+            # Storing it again restarts its retention period
+            os.utime(path)
+        except FileNotFoundError:
+            self._write(path, data)
+            self.record_write(len(data))
+        else:
+            self._maybe_sweep()
+        return name
+
+    def _write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so readers never see a partial artifact
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
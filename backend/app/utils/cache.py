@@ -0,0 +1,230 @@
+import copy
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional
+from app.utils.artifacts import SweptDirectory
+
+# Keys are hex content hashes; anything else in the directory is left alone
+_KEY_PATTERN = re.compile(r'^[0-9a-f]+$')
+
+
+class ContentCache:
+    """
+    Byte-budgeted LRU cache for content-addressed values.
+
+    Values are raw bytes keyed by a content hash. The in-memory tier evicts the
+    least recently used entries once the byte budget is exceeded; the optional
+    on-disk tier refills memory on a hit and is held to disk_max_bytes and
+    disk_retention as SweptDirectory describes, a hit restarting an entry's
+    retention.
+    Concurrent requests for the same missing key are coalesced so only one of them runs
+    the computation (single-flight).
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, directory: Optional[str] = None,
+                 disk_max_bytes: int = 256 * 1024 * 1024, disk_retention: float = 7 * 24 * 3600):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_retention = disk_retention
+        self._disk = self._make_disk()
+        self._entries = OrderedDict()
+        self._size = 0
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "coalesced": 0}
+
+    def init_app(self, app):
+        """Applies the ANALYSIS_CACHE_* settings of a Flask app."""
+        self.max_bytes = app.config.get('ANALYSIS_CACHE_MAX_BYTES', self.max_bytes)
+        self.directory = app.config.get('ANALYSIS_CACHE_DIR') or None
+        self.disk_max_bytes = app.config.get('ANALYSIS_CACHE_DISK_MAX_BYTES', self.disk_max_bytes)
+        self.disk_retention = app.config.get('ANALYSIS_CACHE_DISK_RETENTION', self.disk_retention)
+        self._disk = self._make_disk()
+        self.clear()
+
+    def _make_disk(self) -> Optional[SweptDirectory]:
+        if not self.directory:
+            return None
+        return SweptDirectory(self.directory, _KEY_PATTERN, self.disk_max_bytes, self.disk_retention)
+
+    def clear(self):
+        """Drops the in-memory tier. The on-disk tier is left untouched."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        if not self.directory:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = f.read()
+        except OSError:
+            return None
+        try:
+            # Least recently used entries are swept first
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def _write_disk(self, key: str, value: bytes):
+        if not self.directory:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._disk.record_write(len(value))
+
+    def _store_memory(self, key: str, value: bytes):
+        """Inserts into the LRU tier. Must be called with the lock held."""
+        if key in self._entries:
+            self._size -= len(self._entries.pop(key))
+        if len(value) > self.max_bytes:
+            return
+        self._entries[key] = value
+        self._size += len(value)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self._counters["evictions"] += 1
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the cached value or None, checking memory before disk."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return value
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self._counters["misses"] += 1
+            else:
+                self._counters["disk_hits"] += 1
+                self._store_memory(key, value)
+        return value
+
+    def put(self, key: str, value: bytes):
+        """Stores a value in both tiers."""
+        with self._lock:
+            self._store_memory(key, value)
+        self._write_disk(key, value)
+
+    def get_or_compute(self, key: str, compute: Callable[[], bytes]) -> bytes:
+        """
+        Returns the cached value for key, computing and storing it on a miss.
+        Callers that miss while another thread is computing the same key wait
+        for that result instead of starting their own computation.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                return value
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self._counters["coalesced"] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+            self.put(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Hit, miss and eviction counters along with the current memory usage."""
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), bytes=self._size,
+                        max_bytes=self.max_bytes, inflight=len(self._inflight))
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after a fixed time to live.
+    Values are deep-copied on the way in and out so callers cannot mutate
+    cached entries.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def init_app(self, app, prefix: str = 'LLM_CACHE'):
+        """Applies the <prefix>_MAX_ENTRIES and <prefix>_TTL settings of a Flask app."""
+        self.max_entries = app.config.get(f'{prefix}_MAX_ENTRIES', self.max_entries)
+        self.ttl = app.config.get(f'{prefix}_TTL', self.ttl)
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Returns a copy of the live value for key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                self._counters["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return copy.deepcopy(entry[1])
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), max_entries=self.max_entries)
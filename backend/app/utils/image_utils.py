@@ -1,30 +1,316 @@
 import base64
+import binascii
+import mmap
 import numpy as np
-import cv2
-from PIL import Image
 import io
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+from app.utils import lazy, metrics
 
-def decode_image(file) -> np.ndarray:
-    """Decodes a file object into an OpenCV-compatible image format (BGR)."""
+cv2 = lazy.module('cv2')
+Image = lazy.module('PIL.Image')
+ImageOps = lazy.module('PIL.ImageOps')
+
+# Default upload limits, checked before any pixel buffer is allocated.
+MAX_IMAGE_BYTES = 25 * 1024 * 1024
+MAX_IMAGE_PIXELS = 50_000_000
+
+# Binary uploads are copied in chunks of this size into a spooled buffer that
+# stays in memory up to UPLOAD_SPOOL_BYTES and moves to a temporary file beyond
+UPLOAD_CHUNK_BYTES = 64 * 1024
+UPLOAD_SPOOL_BYTES = 1024 * 1024
+
+# Names of the cv2.imdecode flags for decoding at 1/1, 1/2, 1/4 and 1/8 of the full size.
+# Reduced JPEG decoding skips most of the IDCT work, and the decoder applies
+# the EXIF orientation in every mode.
+_REDUCED_FLAGS = {
+    1: 'IMREAD_COLOR',
+    2: 'IMREAD_REDUCED_COLOR_2',
+    4: 'IMREAD_REDUCED_COLOR_4',
+    8: 'IMREAD_REDUCED_COLOR_8',
+}
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload exceeds the byte or pixel limit."""
+
+class BufferReader(io.RawIOBase):
+    """Read-only file object over a buffer. Unlike io.BytesIO it does not copy the buffer."""
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast('B')
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        chunk = self._view[self._position:self._position + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+def spool_stream(stream, max_bytes: int = None, content_length: Optional[int] = None,
+                 spool_bytes: int = None) -> tempfile.SpooledTemporaryFile:
+    """
+    Copies an upload stream chunk by chunk into a SpooledTemporaryFile, which
+    moves to disk past spool_bytes. A declared content_length over max_bytes
+    is rejected before anything is read, and the copy stops with
+    ImageTooLargeError as soon as the stream passes max_bytes.
+    """
+    max_bytes = MAX_IMAGE_BYTES if max_bytes is None else max_bytes
+    if content_length is not None and content_length > max_bytes:
+        raise ImageTooLargeError(f"Image is {content_length} bytes, the limit is {max_bytes}")
+
+    spooled = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES if spool_bytes is None else spool_bytes)
+    size = 0
+    try:
+        while True:
+            chunk = stream.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise ImageTooLargeError(f"Image is larger than {max_bytes} bytes")
+            spooled.write(chunk)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled
+
+@contextmanager
+def file_buffer(file) -> Iterator[memoryview]:
+    """
+    Read-only view of the whole content of a file object, without copying it
+    where possible: the buffer of an io.BytesIO, or a memory map of a file on
+    disk. A SpooledTemporaryFile still in memory is rolled over to disk
+    first. Other streams are read into memory.
+    """
+    mapped = None
+    if isinstance(file, io.BytesIO):
+        view = file.getbuffer()
+    elif hasattr(file, 'fileno'):
+        if isinstance(file, tempfile.SpooledTemporaryFile):
+            file.rollover()
+        file.flush()
+        try:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mapped)
+        except ValueError:
+            # An empty file cannot be mapped
+            view = memoryview(b'')
+    else:
+        view = memoryview(file.read())
     try:
-        image_data = file.read()
-        image = Image.open(io.BytesIO(image_data)).convert('RGB')
+        yield view
+    finally:
+        try:
+            view.release()
+        except BufferError:
+            # Still referenced somewhere; released when that goes away
+            pass
+        finally:
+            if mapped is not None:
+                try:
+                    mapped.close()
+                except BufferError:
+                    # Closed by the garbage collector once the last view is gone
+                    pass
+
+def probe_image_size(data) -> tuple:
+    """Reads (width, height) from the image header without decoding the pixels."""
+    with Image.open(BufferReader(data)) as image:
+        return image.size
+
+def choose_reduction(width: int, height: int, min_pixels: int) -> int:
+    """Largest decode reduction (1, 2, 4 or 8) that keeps at least min_pixels."""
+    reduction = 1
+    for factor in (2, 4, 8):
+        if (width // factor) * (height // factor) >= min_pixels:
+            reduction = factor
+    return reduction
+
+def decode_image_bytes(data, max_bytes: int = None, max_pixels: int = None,
+                       min_pixels: int = None) -> Tuple[np.ndarray, int]:
+    """
+    Decodes encoded image bytes (or any buffer) straight to a BGR array.
+
+    The byte size and the pixel count from the header are checked against the
+    limits before decoding. When min_pixels is given, the image is decoded at
+    the largest 1/2, 1/4 or 1/8 reduction that still keeps that many pixels.
+    EXIF orientation is applied.
+
+    Returns the image and its reduction factor: multiply coordinates in the
+    decoded image by it to get coordinates in the uploaded one.
+    """
+    max_bytes = MAX_IMAGE_BYTES if max_bytes is None else max_bytes
+    max_pixels = MAX_IMAGE_PIXELS if max_pixels is None else max_pixels
+
+    view = memoryview(data)
+    if view.nbytes > max_bytes:
+        raise ImageTooLargeError(f"Image is {view.nbytes} bytes, the limit is {max_bytes}")
+    try:
+        width, height = probe_image_size(view)
+    except Exception as e:
+        raise ValueError(f"Could not read image header: {e}")
+    if width * height > max_pixels:
+        raise ImageTooLargeError(f"Image is {width}x{height} pixels, the limit is {max_pixels}")
+
+    reduction = choose_reduction(width, height, min_pixels) if min_pixels else 1
+    with metrics.stage_timer('decode'):
+        image = cv2.imdecode(np.frombuffer(view, dtype=np.uint8), getattr(cv2, _REDUCED_FLAGS[reduction]))
+        if image is not None:
+            return image, reduction
+
+        # Formats OpenCV cannot read (GIF, for example) go through PIL
+        pil_image = Image.open(BufferReader(view))
+        if reduction > 1:
+            pil_image.draft('RGB', (width // reduction, height // reduction))
+            # draft() only reduces some formats, and may pick another scale
+            reduction = max(1, round(width / pil_image.size[0]))
+        pil_image = ImageOps.exif_transpose(pil_image).convert('RGB')
         # Convert from PIL's RGB to OpenCV's BGR
-        return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+        return cv2.cvtColor(np.asarray(pil_image), cv2.COLOR_RGB2BGR), reduction
+
+def decode_image(file, **limits) -> Tuple[np.ndarray, int]:
+    """
+    Decodes a file object, or an uploaded werkzeug FileStorage, into an
+    OpenCV-compatible image format (BGR), reading from its buffer in place.
+    Returns the image and its reduction factor, as decode_image_bytes does.
+    """
+    try:
+        with file_buffer(getattr(file, 'stream', file)) as view:
+            return decode_image_bytes(view, **limits)
+    except ImageTooLargeError:
+        raise
     except Exception as e:
         raise ValueError(f"Could not decode image from file: {e}")
 
-def decode_image_from_b64(base64_string: str) -> np.ndarray:
-    """Decodes a base64 string into an OpenCV-compatible image format (BGR)."""
+def b64_to_bytes(base64_string: str, max_bytes: int = None) -> bytes:
+    """Decodes a base64 upload to raw bytes, enforcing the byte limit first."""
+    max_bytes = MAX_IMAGE_BYTES if max_bytes is None else max_bytes
+    # Base64 grows data by 4/3, so oversized uploads are rejected before decoding
+    if len(base64_string) > (max_bytes * 4) // 3 + 4:
+        raise ImageTooLargeError(f"Image is larger than {max_bytes} bytes")
     try:
-        image_data = base64.b64decode(base64_string)
-        image = Image.open(io.BytesIO(image_data)).convert('RGB')
-        # Convert from PIL's RGB to OpenCV's BGR
-        return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+        return base64.b64decode(base64_string)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Could not decode image from base64 string: {e}")
+
+def decode_image_from_b64(base64_string: str, **limits) -> Tuple[np.ndarray, int]:
+    """
+    Decodes a base64 string into an OpenCV-compatible image format (BGR).
+    Returns the image and its reduction factor, as decode_image_bytes does.
+    """
+    image_data = b64_to_bytes(base64_string, limits.get('max_bytes'))
+    try:
+        return decode_image_bytes(image_data, **limits)
+    except ImageTooLargeError:
+        raise
     except Exception as e:
         # Consider logging this error
         raise ValueError(f"Could not decode image from base64 string: {e}")
 
+def sniff_content_type(data) -> str:
+    """MIME type of encoded image bytes, read from the header."""
+    try:
+        with Image.open(BufferReader(data)) as image:
+            return Image.MIME.get(image.format, 'application/octet-stream')
+    except Exception:
+        return 'application/octet-stream'
+
+def _jpeg_orientation(exif_payload: bytes) -> int:
+    """EXIF orientation tag from an APP1 payload, 1 when it is absent or unreadable."""
+    try:
+        exif = Image.Exif()
+        exif.load(exif_payload)
+        return int(exif.get(0x0112, 1))
+    except Exception:
+        return 1
+
+def strip_jpeg_metadata(data) -> bytes:
+    """
+    Copies a JPEG without its metadata: EXIF (camera, GPS position), XMP,
+    IPTC, comments, and the thumbnails or extra images stored after it. The
+    compressed image data is copied unchanged. The ICC profile, the Adobe
+    colour transform and a non-default EXIF orientation are kept, so the
+    image looks the same.
+
+    Raises ValueError when the data is not a well-formed JPEG.
+    """
+    data = bytes(data)
+    if data[:2] != b'\xff\xd8':
+        raise ValueError("Not a JPEG")
+    kept = [data[:2]]
+    # The orientation goes back in right after the JFIF header, if any
+    exif_at = 1
+    orientation = 1
+    pos = 2
+    while True:
+        if pos + 2 > len(data) or data[pos] != 0xFF:
+            raise ValueError(f"Malformed JPEG: no marker at offset {pos}")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            pos += 1
+            continue
+        if marker == 0xD9:
+            kept.append(data[pos:pos + 2])
+            break
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            kept.append(data[pos:pos + 2])
+            pos += 2
+            continue
+        if pos + 4 > len(data):
+            raise ValueError("Truncated JPEG")
+        end = pos + 2 + int.from_bytes(data[pos + 2:pos + 4], 'big')
+        if end > len(data) or end < pos + 4:
+            raise ValueError(f"Malformed JPEG: bad segment length at offset {pos}")
+        payload = data[pos + 4:end]
+        if marker == 0xE1 and payload.startswith(b'Exif\x00\x00'):
+            orientation = _jpeg_orientation(payload)
+        elif ((marker == 0xE0 and payload.startswith(b'JFIF\x00') and len(kept) == 1)
+              or (marker == 0xE2 and payload.startswith(b'ICC_PROFILE\x00'))
+              or (marker == 0xEE and payload.startswith(b'Adobe'))
+              or not (0xE0 <= marker <= 0xEF or marker == 0xFE)):
+            kept.append(data[pos:end])
+            if marker == 0xE0:
+                exif_at = 2
+        pos = end
+        if marker == 0xDA:
+            # Entropy-coded data runs up to the next marker; 0xFF is followed
+            # by 0x00 when it is data and by 0xD0-0xD7 for restart markers
+            scan = pos
+            while True:
+                pos = data.find(b'\xff', pos)
+                if pos < 0 or pos + 1 >= len(data):
+                    raise ValueError("Truncated JPEG scan")
+                if data[pos + 1] == 0x00 or 0xD0 <= data[pos + 1] <= 0xD7:
+                    pos += 2
+                elif data[pos + 1] == 0xFF:
+                    pos += 1
+                else:
+                    break
+            kept.append(data[scan:pos])
+    if orientation != 1:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        payload = exif.tobytes()
+        kept.insert(exif_at, b'\xff\xe1' + (len(payload) + 2).to_bytes(2, 'big') + payload)
+    return b''.join(kept)
+
 def encode_image_to_bytes(image_array: np.ndarray) -> bytes:
     """Encodes an OpenCV image array (BGR) to PNG bytes."""
     try:
@@ -35,4 +321,4 @@ def encode_image_to_bytes(image_array: np.ndarray) -> bytes:
         pil_image.save(buffer, format='PNG')
         return buffer.getvalue()
     except Exception as e:
-        raise ValueError(f"Could not encode image to bytes: {e}")
\ No newline at end of file
+        raise ValueError(f"Could not encode image to bytes: {e}")
@@ -0,0 +1,58 @@
+import importlib
+import threading
+import types
+from typing import List
+
+_modules: List["LazyModule"] = []
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a heavy module that imports it on first attribute access.
+
+    Use it at module level in place of the import statement:
+
+        cv2 = lazy.module('cv2')
+
+    and the import happens the first time cv2.<anything> is evaluated. After
+    that each attribute is copied onto the facade, so later lookups are plain
+    attribute reads.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lazy_module = None
+        self._lazy_lock = threading.Lock()
+
+    def _load(self) -> types.ModuleType:
+        if self._lazy_module is None:
+            with self._lazy_lock:
+                if self._lazy_module is None:
+                    self._lazy_module = importlib.import_module(self.__name__)
+        return self._lazy_module
+
+    def __getattr__(self, attribute: str):
+        # Only called for attributes not yet copied onto the facade
+        if attribute.startswith('_lazy_'):
+            raise AttributeError(attribute)
+        value = getattr(self._load(), attribute)
+        setattr(self, attribute, value)
+        return value
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self._lazy_module is not None else 'not loaded'
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def module(name: str) -> LazyModule:
+    """A facade that imports the named module on first use."""
+    facade = LazyModule(name)
+    _modules.append(facade)
+    return facade
+
+
+def preload() -> List[str]:
+    """Imports every module behind a facade now; returns their names."""
+    for facade in _modules:
+        facade._load()
+    return sorted({facade.__name__ for facade in _modules})
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+# A stage is a function and the names of the stages whose results it takes,
+# passed as keyword arguments named after those stages
+Stage = Tuple[Callable[..., Any], Iterable[str]]
+
+_executor = None
+_executor_lock = threading.Lock()
+_workers = 4
+
+
+def configure(workers: int):
+    """Sets the size of the shared stage pool. Takes effect if the pool is not created yet."""
+    global _workers
+    _workers = workers
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # Created on first use so forked server workers each get their own threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_workers, thread_name_prefix='kolam-stage')
+        return _executor
+
+
+def _forget_executor():
+    # A forked child inherits the pool object but none of its threads, so a
+    # pool created before the fork (by the server's warm-up) would queue work
+    # that never runs and leave every stage to the calling thread
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_executor)
+
+
+def run_stages(stages: Dict[str, Stage], on_stage: Optional[Callable[[str], None]] = None,
+               timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    Runs a dependency graph of stages and returns every stage's result.
+
+    Stages whose dependencies are done run concurrently on the shared pool;
+    OpenCV and NumPy release the GIL, so CPU-bound stages overlap as well.
+    The calling thread does not sit idle: it takes back stages still queued
+    on the pool and runs them itself, so nested graphs (a stage that runs its
+    own graph) cannot starve the pool. on_stage(name) is called as each stage
+    starts, and the wall time of each stage in seconds is written to timings.
+    The first exception raised by a stage is re-raised once running stages
+    have finished.
+    """
+    dependencies = {name: tuple(deps) for name, (_, deps) in stages.items()}
+    for name, deps in dependencies.items():
+        unknown = [dep for dep in deps if dep not in stages]
+        if unknown:
+            raise ValueError(f"Stage '{name}' depends on unknown stages {unknown}")
+
+    results: Dict[str, Any] = {}
+    waiting = dict(dependencies)
+    queued: Dict[str, Future] = {}
+    state = {'outstanding': 0, 'error': None}
+    condition = threading.Condition()
+
+    def schedule_ready():
+        """Submits stages whose dependencies are done. Must be called with the lock held."""
+        for name in [name for name, deps in waiting.items() if all(dep in results for dep in deps)]:
+            del waiting[name]
+            state['outstanding'] += 1
+            queued[name] = _get_executor().submit(run, name)
+
+    def run(name: str):
+        with condition:
+            queued.pop(name, None)
+        if on_stage is not None:
+            on_stage(name)
+        start = time.perf_counter()
+        try:
+            result, error = stages[name][0](**{dep: results[dep] for dep in dependencies[name]}), None
+        except BaseException as e:
+            result, error = None, e
+        elapsed = time.perf_counter() - start
+
+        with condition:
+            if timings is not None:
+                timings[name] = elapsed
+            state['outstanding'] -= 1
+            if error is None:
+                results[name] = result
+                if state['error'] is None:
+                    schedule_ready()
+            elif state['error'] is None:
+                # Stop scheduling and drop stages that have not started yet
+                state['error'] = error
+                waiting.clear()
+                for queued_name, future in list(queued.items()):
+                    if future.cancel():
+                        del queued[queued_name]
+                        state['outstanding'] -= 1
+            condition.notify_all()
+
+    with condition:
+        schedule_ready()
+    while True:
+        with condition:
+            if state['outstanding'] == 0:
+                break
+            # Run a stage that is still queued on this thread instead of waiting for it
+            inline = next((name for name, future in queued.items() if future.cancel()), None)
+            if inline is None:
+                condition.wait()
+                continue
+            del queued[inline]
+        run(inline)
+
+    if state['error'] is not None:
+        raise state['error']
+    if waiting:
+        raise ValueError(f"Stage graph has a cycle among {sorted(waiting)}")
+    return results
@@ -0,0 +1,119 @@
+"""
+Benchmark for KolamAnalyzer.build_graph.
+
+Compares the batched nearest-neighbour edge builder against the original
+per-pixel cdist/argsort loop on synthetic kolam photos at 1, 4 and 12 MP,
+and checks that both produce the same edges in the same order and
+orientation. The legacy loop runs over every line pixel by default; with
+--legacy-pixel-cap it is timed on a prefix and extrapolated, and those sizes
+are not compared. The exit status is non-zero when a compared size differs,
+or when no size was compared.
+
+Run from the backend directory:
+    python -m benchmarks.bench_build_graph
+    python -m benchmarks.bench_build_graph --sizes 1 4 12 20 --legacy-pixel-cap 200000
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+from scipy.spatial.distance import cdist
+
+from app.kolam_analysis import image_processor
+from app.kolam_analysis.analyzer import KolamAnalyzer
+from app.kolam_analysis.models import Dot
+
+
+def make_kolam_image(megapixels: float, grid: int = 7):
+    """Draws a square dot grid joined by horizontal and vertical lines."""
+    side = int(np.sqrt(megapixels * 1_000_000))
+    img = np.full((side, side, 3), 255, dtype=np.uint8)
+    spacing = side // (grid + 1)
+    radius = max(3, spacing // 12)
+    thickness = max(2, spacing // 25)
+
+    dots = []
+    for row in range(grid):
+        for col in range(grid):
+            dots.append(Dot(x=(col + 1) * spacing, y=(row + 1) * spacing, radius=radius))
+
+    for i, dot in enumerate(dots):
+        if (i + 1) % grid:
+            right = dots[i + 1]
+            cv2.line(img, (dot.x, dot.y), (right.x, right.y), (0, 0, 0), thickness)
+        if i + grid < len(dots):
+            below = dots[i + grid]
+            cv2.line(img, (dot.x, dot.y), (below.x, below.y), (0, 0, 0), thickness)
+    for dot in dots:
+        cv2.circle(img, (dot.x, dot.y), dot.radius, (0, 0, 0), -1)
+    return img, dots
+
+
+def legacy_edges(dots, skeleton_image, max_pixels=None):
+    """
+    The original build_graph loop, unchanged apart from collecting the edges
+    in a list instead of a graph. Returns them in insertion order.
+    """
+    dot_array = np.array([[d.x, d.y] for d in dots])
+    line_pixels = np.argwhere(skeleton_image > 0)
+    if max_pixels is not None:
+        line_pixels = line_pixels[:max_pixels]
+    seen = set()
+    edges = []
+    for y, x in line_pixels:
+        distances = cdist(np.array([[x, y]]), dot_array)
+        if distances.shape[1] < 2:
+            continue
+        idx1, idx2 = np.argsort(distances[0])[:2]
+        key = (min(idx1, idx2), max(idx1, idx2))
+        if key not in seen:
+            seen.add(key)
+            edges.append((int(idx1), int(idx2)))
+    return edges
+
+
+def run(sizes, grid, legacy_pixel_cap) -> int:
+    compared = mismatched = 0
+    print(f"{'MP':>5} {'line px':>10} {'edges':>6} {'batched (s)':>12} {'legacy (s)':>12} {'speedup':>8} {'identical':>9}")
+    for mp in sizes:
+        image, dots = make_kolam_image(mp, grid)
+        binary = image_processor.preprocess_image(image)
+        pixel_count = int(np.count_nonzero(binary))
+
+        start = time.perf_counter()
+        pattern = KolamAnalyzer(image.shape).build_graph(dots, binary)
+        batched_time = time.perf_counter() - start
+        batched_edges = [(int(u), int(v)) for u, v in pattern.edge_array]
+
+        # With a cap the legacy loop is timed on a prefix of the pixels and extrapolated
+        sampled = pixel_count if legacy_pixel_cap is None else min(pixel_count, legacy_pixel_cap)
+        start = time.perf_counter()
+        reference = legacy_edges(dots, binary, max_pixels=sampled)
+        legacy_time = (time.perf_counter() - start) * pixel_count / max(sampled, 1)
+
+        if sampled == pixel_count:
+            compared += 1
+            identical = 'yes' if reference == batched_edges else 'NO'
+            mismatched += identical == 'NO'
+        else:
+            identical = 'sampled'
+
+        print(f"{mp:>5} {pixel_count:>10} {len(batched_edges):>6} {batched_time:>12.3f} "
+              f"{legacy_time:>12.3f} {legacy_time / batched_time:>7.0f}x {identical:>9}")
+
+    if not compared:
+        print("FAIL: no size was compared in full; lower or drop --legacy-pixel-cap")
+    elif mismatched:
+        print(f"FAIL: {mismatched} of {compared} sizes differ from the legacy loop")
+    return 0 if compared and not mismatched else 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 4, 12], help='image sizes in megapixels')
+    parser.add_argument('--grid', type=int, default=7, help='dots per row and column')
+    parser.add_argument('--legacy-pixel-cap', type=int, default=0,
+                        help='time the legacy loop on at most this many pixels (0 = no cap)')
+    args = parser.parse_args()
+    raise SystemExit(run(args.sizes, args.grid, args.legacy_pixel_cap or None))
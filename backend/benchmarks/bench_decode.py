@@ -0,0 +1,84 @@
+"""
+Benchmark for image decoding.
+
+Compares the original PIL decode path (PIL open, convert to RGB, copy to
+NumPy, cvtColor to BGR) against image_utils.decode_image_from_b64 at full
+size and with a reduced decode. Each measurement runs in a forked child so
+the peak RSS increase can be read from getrusage.
+
+Run from the backend directory:
+    python -m benchmarks.bench_decode
+"""
+import argparse
+import base64
+import io
+import multiprocessing
+import resource
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from app.utils import image_utils
+
+
+def legacy_decode_from_b64(base64_string: str) -> np.ndarray:
+    """The decode path used before cv2.imdecode."""
+    image_data = base64.b64decode(base64_string)
+    image = Image.open(io.BytesIO(image_data)).convert('RGB')
+    return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+
+
+def make_photo_b64(megapixels: float) -> str:
+    """A noisy JPEG of the given size, base64 encoded like an upload."""
+    height = int(np.sqrt(megapixels * 1_000_000 * 3 / 4))
+    width = height * 4 // 3
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8)
+    image = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return base64.b64encode(encoded.tobytes()).decode('ascii')
+
+
+def _measure(decode, payload, conn):
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    image = decode(payload)
+    elapsed = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    conn.send((elapsed, (after - before) / 1024, image.shape))
+    conn.close()
+
+
+def measure(decode, payload):
+    """Returns (seconds, peak RSS increase in MB, decoded shape) from a fresh child."""
+    parent, child = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.get_context('fork').Process(target=_measure, args=(decode, payload, child))
+    process.start()
+    result = parent.recv()
+    process.join()
+    return result
+
+
+def run(sizes, min_pixels):
+    decoders = [
+        ('legacy PIL', legacy_decode_from_b64),
+        ('imdecode', lambda payload: image_utils.decode_image_from_b64(payload)[0]),
+        (f'imdecode >= {min_pixels / 1e6:g} MP',
+         lambda payload: image_utils.decode_image_from_b64(payload, min_pixels=min_pixels)[0]),
+    ]
+    print(f"{'MP':>5} {'decoder':<22} {'time (ms)':>10} {'peak RSS +MB':>13} {'shape':>18}")
+    for mp in sizes:
+        payload = make_photo_b64(mp)
+        for name, decode in decoders:
+            elapsed, peak_mb, shape = measure(decode, payload)
+            print(f"{mp:>5} {name:<22} {elapsed * 1000:>10.1f} {peak_mb:>13.1f} {str(shape):>18}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 4, 12], help='image sizes in megapixels')
+    parser.add_argument('--min-pixels', type=int, default=3_000_000, help='pixel floor for the reduced decode')
+    args = parser.parse_args()
+    run(args.sizes, args.min_pixels)
@@ -0,0 +1,80 @@
+"""
+Benchmark for the digital recreation step of /api/analyze_kolam.
+
+The old generate_kolam_image made a full Gemini generate_content call with
+the generation prompt, discarded the answer and rendered procedurally. This
+measures that discarded round-trip against the procedural render that is now
+all the request pays for. With GOOGLE_API_KEY set the round-trip goes to the
+real API; otherwise a fixed simulated latency stands in for it.
+
+Run from the backend directory:
+    python -m benchmarks.bench_generate_image
+"""
+import argparse
+import os
+import statistics
+import time
+
+from app import create_app
+from app.services import ai_service
+
+
+def grid_geometry(rows: int, spacing: int = 40):
+    """A rows x rows grid of dots joined to their right and lower neighbours."""
+    dots = [{'x': c * spacing, 'y': r * spacing, 'radius': 6} for r in range(rows) for c in range(rows)]
+    lines = []
+    for r in range(rows):
+        for c in range(rows):
+            if c + 1 < rows:
+                lines.append({'start': (c * spacing, r * spacing), 'end': ((c + 1) * spacing, r * spacing)})
+            if r + 1 < rows:
+                lines.append({'start': (c * spacing, r * spacing), 'end': (c * spacing, (r + 1) * spacing)})
+    return dots, lines
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def run(rows, repeat, simulated_latency):
+    app = create_app()
+    dots, lines = grid_geometry(rows)
+    analysis = {'grid_pattern': 'Square', 'rotational_symmetry_fold': 4, 'closed_loops': 0, 'region': 'Tamil Nadu'}
+
+    with app.app_context():
+        use_api = bool(os.environ.get('GOOGLE_API_KEY'))
+
+        def discarded_round_trip():
+            if use_api:
+                prompt = ai_service.create_kolam_generation_prompt(analysis, len(dots), len(lines))
+                ai_service._get_model().generate_content([prompt])
+            else:
+                time.sleep(simulated_latency)
+
+        # Distinct sizes per run keep the render cache from answering
+        sizes = iter(range(800, 800 + 4 * repeat))
+        procedural = timed(lambda: ai_service.generate_kolam_image(
+            dots, lines, analysis, size=next(sizes), strategy='procedural'), repeat)
+        round_trip = timed(discarded_round_trip, repeat)
+
+    source = 'Gemini API' if use_api else f'simulated {simulated_latency * 1000:.0f} ms'
+    print(f"{len(dots)} dots, {len(lines)} lines, median of {repeat}")
+    print(f"{'procedural render (now)':<44} {procedural:>9.1f} ms")
+    print(f"{'discarded round-trip (' + source + ')':<44} {round_trip:>9.1f} ms")
+    print(f"{'old total':<44} {procedural + round_trip:>9.1f} ms")
+    print(f"{'saved per request':<44} {round_trip:>9.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=12, help='dots per side of the grid')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--simulated-latency', type=float, default=1.5,
+                        help='seconds standing in for the API round-trip without GOOGLE_API_KEY')
+    args = parser.parse_args()
+    run(args.rows, args.repeat, args.simulated_latency)
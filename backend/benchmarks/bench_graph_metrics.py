@@ -0,0 +1,105 @@
+"""
+Benchmark for the graph metrics of analyze_pattern.
+
+analyze_pattern used to build the full networkx cycle basis just to count it,
+call nx.is_connected and guess Eulerian paths from the odd-degree count
+alone. graph_metrics computes components, loops, degree parity and a proper
+Eulerian check from the sparse adjacency matrix instead. This times both on
+graphs of about 10k edges and checks that graph_metrics agrees with the
+networkx reference (networkx_graph_metrics) on every one of them.
+
+Run from the backend directory:
+    python -m benchmarks.bench_graph_metrics
+"""
+import argparse
+import statistics
+import time
+
+import networkx as nx
+import numpy as np
+
+from app.kolam_analysis.graph_metrics import graph_metrics, networkx_graph_metrics
+from app.kolam_analysis.models import KolamPattern
+
+
+def lattice_edges(rows: int, cols: int) -> np.ndarray:
+    index = np.arange(rows * cols).reshape(rows, cols)
+    return np.concatenate([
+        np.stack([index[:, :-1].ravel(), index[:, 1:].ravel()], axis=1),
+        np.stack([index[:-1, :].ravel(), index[1:, :].ravel()], axis=1),
+    ])
+
+
+def random_edges(node_count: int, edge_count: int, rng) -> np.ndarray:
+    """Distinct random edges without self-loops."""
+    edges = set()
+    while len(edges) < edge_count:
+        u, v = rng.integers(node_count, size=2).tolist()
+        if u != v:
+            edges.add((min(u, v), max(u, v)))
+    return np.array(sorted(edges))
+
+
+def cycle_edges(node_count: int) -> np.ndarray:
+    """A single ring: every dot has degree two, so it has an Eulerian circuit."""
+    nodes = np.arange(node_count)
+    return np.stack([nodes, np.roll(nodes, -1)], axis=1)
+
+
+def cases(seed: int):
+    rng = np.random.default_rng(seed)
+    yield 'lattice 71x71', 71 * 71, lattice_edges(71, 71)
+    yield 'random sparse', 8000, random_edges(8000, 10000, rng)
+    yield 'random dense', 2000, random_edges(2000, 10000, rng)
+    ring = cycle_edges(10000)
+    yield 'ring', 10000, ring
+    yield 'ring + isolated dots', 10500, ring
+    yield 'ring, one edge cut', 10000, ring[:-1]
+    yield 'two rings', 10000, np.concatenate([cycle_edges(5000), cycle_edges(5000) + 5000])
+
+
+def legacy_metrics(graph: nx.Graph) -> dict:
+    """The networkx calls analyze_pattern used to make."""
+    loops = len(list(nx.cycle_basis(graph)))
+    connected = nx.is_connected(graph)
+    odd_degree_nodes = [n for n, d in graph.degree() if d % 2 != 0]
+    return {'loops': loops, 'connected': connected, 'eulerian_path': len(odd_degree_nodes) <= 2}
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def run(repeat, seed):
+    print(f"{'graph':<22} {'dots':>6} {'edges':>6} {'sparse ms':>10} {'legacy ms':>10} {'speedup':>8} "
+          f"{'loops':>6} {'euler':>6} {'agrees':>7} {'legacy euler':>13}")
+    mismatches = 0
+    for name, node_count, edges in cases(seed):
+        dots = np.zeros((node_count, 3), dtype=np.int32)
+
+        def sparse_metrics():
+            # Includes building the CSR matrix, as analyze_pattern pays for it
+            return graph_metrics(KolamPattern(dots=dots, edges=edges).adjacency())
+
+        graph = KolamPattern(dots=dots, edges=edges).graph
+        sparse_ms, result = timed(sparse_metrics, repeat)
+        legacy_ms, legacy = timed(lambda: legacy_metrics(graph), repeat)
+        agrees = result == networkx_graph_metrics(graph)
+        mismatches += not agrees
+        print(f"{name:<22} {node_count:>6} {len(edges):>6} {sparse_ms:>10.2f} {legacy_ms:>10.2f} "
+              f"{legacy_ms / sparse_ms:>7.0f}x {result['loops']:>6} {str(result['eulerian_path']):>6} "
+              f"{'yes' if agrees else 'NO':>7} {str(legacy['eulerian_path']):>13}")
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    raise SystemExit(1 if run(args.repeat, args.seed) else 0)
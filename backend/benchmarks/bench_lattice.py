@@ -0,0 +1,145 @@
+"""
+Benchmark for the lattice fit behind detect_grid_pattern.
+
+The old detect_grid_pattern required every gap between sorted x and y
+coordinates to be identical, so any jitter made a grid "Irregular". This
+generates jittered square, 45-degree, rectangular, hexagonal and staggered
+dot layouts, some with dots missing, and reports what both detectors make of
+them. It then times fit_lattice and the neighbour table on large grids,
+and checks that degenerate scatters (which used to hang the basis reduction
+or make the refit singular) and a random fuzz return promptly without
+raising. The exit status is non-zero if any of them fails.
+
+Run from the backend directory:
+    python -m benchmarks.bench_lattice
+"""
+import argparse
+import signal
+import statistics
+import time
+
+import numpy as np
+
+from app.kolam_analysis.analyzer import detect_grid_pattern
+from app.kolam_analysis.lattice import fit_lattice
+from app.kolam_analysis.models import Dot
+
+
+def rotate(vector, degrees):
+    angle = np.radians(degrees)
+    c, s = np.cos(angle), np.sin(angle)
+    return np.array([c * vector[0] - s * vector[1], s * vector[0] + c * vector[1]])
+
+
+def layout(rows, cols, a, b, jitter, drop, rng):
+    """Dots at origin + i * a + j * b, jittered, with a fraction dropped."""
+    ij = np.array([(i, j) for j in range(rows) for i in range(cols)])
+    points = (200, 200) + ij @ np.array([a, b]) + rng.normal(0, jitter, (len(ij), 2))
+    return points[rng.random(len(points)) >= drop]
+
+
+# Scatters whose difference-vector clusters averaged to a zero basis vector
+# (an endless reduction loop) or whose refit basis was singular
+DEGENERATE_SCATTERS = {
+    'zero basis vector': [[8, 172], [23, 96], [103, 12], [108, 23], [104, 13], [42, 35], [114, 175],
+                          [90, 76], [94, 105], [0, 42], [68, 55], [180, 134], [51, 10], [106, 44]],
+    'singular refit': [[98, 151], [146, 23], [118, 49], [73, 161], [165, 90], [49, 175], [170, 120],
+                       [83, 157], [78, 37]],
+    'singular refit, 6 dots': [[90, 15], [83, 96], [32, 199], [23, 186], [129, 63], [59, 62]],
+}
+
+
+def check_degenerate(fuzz_cases, seed, time_limit=2.0) -> int:
+    """Runs fit_lattice on the degenerate scatters and on random ones; returns the number of failures."""
+    rng = np.random.default_rng(seed)
+    cases = dict(DEGENERATE_SCATTERS)
+    for k in range(fuzz_cases):
+        cases[f'random scatter {k}'] = rng.integers(0, 200, (int(rng.integers(4, 40)), 2)).tolist()
+
+    def timed_out(signum, frame):
+        raise TimeoutError(f"fit_lattice took over {time_limit} s")
+
+    previous = signal.signal(signal.SIGALRM, timed_out)
+    failures = 0
+    try:
+        for name, points in cases.items():
+            signal.setitimer(signal.ITIMER_REAL, time_limit)
+            try:
+                fit_lattice(np.array(points))
+            except Exception as e:
+                failures += 1
+                print(f"FAIL {name}: {type(e).__name__}: {e}")
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    finally:
+        signal.signal(signal.SIGALRM, previous)
+    print(f"\ndegenerate and random scatters: {len(cases) - failures}/{len(cases)} fitted or rejected cleanly")
+    return failures
+
+
+def legacy_grid_pattern(points) -> str:
+    """The exact-gap test detect_grid_pattern used before the lattice fit."""
+    if len(points) < 4:
+        return "Irregular"
+    x_coords = sorted(set(p[0] for p in points))
+    y_coords = sorted(set(p[1] for p in points))
+    if len(x_coords) > 1 and len(y_coords) > 1:
+        x_regular = len(set(round(x_coords[i + 1] - x_coords[i], 1) for i in range(len(x_coords) - 1))) == 1
+        y_regular = len(set(round(y_coords[i + 1] - y_coords[i], 1) for i in range(len(y_coords) - 1))) == 1
+        if x_regular and y_regular:
+            return f"{len(x_coords)}x{len(y_coords)} grid"
+        if x_regular:
+            return f"{len(x_coords)} columns"
+        if y_regular:
+            return f"{len(y_coords)} rows"
+    return "Irregular"
+
+
+def run(jitter, sizes, repeat, seed):
+    rng = np.random.default_rng(seed)
+    spacing = 40.0
+    cases = {
+        '7x7 square': (7, 7, (spacing, 0), (0, spacing), 0.0),
+        '9x5 square, turned 12 deg': (5, 9, rotate((spacing, 0), 12), rotate((0, spacing), 12), 0.0),
+        '6x6 square, turned 45 deg': (6, 6, rotate((spacing, 0), 45), rotate((0, spacing), 45), 0.0),
+        '8x4 rectangular': (4, 8, (spacing, 0), (0, 1.5 * spacing), 0.0),
+        '7x6 hexagonal': (6, 7, (spacing, 0), (spacing / 2, spacing * np.sqrt(3) / 2), 0.0),
+        '7x6 staggered': (6, 7, (spacing, 0), (spacing / 2, 1.2 * spacing), 0.0),
+        '9x9 square, 20% missing': (9, 9, (spacing, 0), (0, spacing), 0.2),
+    }
+    print(f"jitter {jitter} px, spacing {spacing:.0f} px")
+    print(f"{'layout':<28} {'old detector':<16} {'lattice fit':<24} {'spacing':>8} {'angle':>7}")
+    for name, (rows, cols, a, b, drop) in cases.items():
+        points = np.rint(layout(rows, cols, a, b, jitter, drop, rng)).astype(int)
+        dots = [Dot(x=int(x), y=int(y), radius=4) for x, y in points]
+        lattice = fit_lattice(points)
+        spacing_text = f"{lattice.spacing:.1f}" if lattice else '-'
+        angle_text = f"{lattice.orientation:.1f}" if lattice else '-'
+        print(f"{name:<28} {legacy_grid_pattern(points.tolist()):<16} {detect_grid_pattern(dots):<24} "
+              f"{spacing_text:>8} {angle_text:>7}")
+
+    print(f"\n{'dots':>7} {'fit ms':>8} {'neighbour table ms':>19} {'neighbour links':>16}")
+    for side in sizes:
+        points = layout(side, side, (20, 0), (0, 20), 1.0, 0.0, rng)
+        fit_times, table_times = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            lattice = fit_lattice(points)
+            fit_times.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            table = lattice.neighbour_table()
+            table_times.append((time.perf_counter() - start) * 1000)
+        print(f"{len(points):>7} {statistics.median(fit_times):>8.1f} {statistics.median(table_times):>19.2f} "
+              f"{int(np.count_nonzero(table >= 0)):>16}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jitter', type=float, default=1.5, help='standard deviation of dot jitter in pixels')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[30, 100, 300], help='dots per side of the large grids')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--fuzz', type=int, default=1000, help='random scatters to check')
+    args = parser.parse_args()
+    run(args.jitter, args.sizes, args.repeat, args.seed)
+    raise SystemExit(1 if check_degenerate(args.fuzz, args.seed) else 0)
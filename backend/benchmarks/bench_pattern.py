@@ -0,0 +1,118 @@
+"""
+Benchmark for the array-backed KolamPattern.
+
+The old pattern kept a list of Dot dataclasses, a list of Line dataclasses
+duplicating the edges and a networkx graph with an attribute dict per node,
+and the route turned all of it into lists of dicts for the renderer. This
+builds both representations for dense lattices and compares the memory they
+hold, the time to build them, to serialize them with to_dict and to produce
+the renderer input.
+
+Run from the backend directory:
+    python -m benchmarks.bench_pattern
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Tuple
+
+import networkx as nx
+import numpy as np
+
+from app.kolam_analysis.models import KolamPattern
+
+
+@dataclass
+class LegacyDot:
+    x: int
+    y: int
+    radius: int
+
+
+@dataclass
+class LegacyLine:
+    p1: Tuple[int, int]
+    p2: Tuple[int, int]
+
+
+class LegacyPattern:
+    """The list and graph based pattern, as build_graph used to fill it."""
+
+    def __init__(self, dots, edges):
+        self.dots = [LegacyDot(x=x, y=y, radius=r) for x, y, r in dots]
+        self.graph = nx.Graph()
+        for i, dot in enumerate(self.dots):
+            self.graph.add_node(i, pos=(dot.x, dot.y))
+        self.graph.add_edges_from(edges)
+        self.lines = [LegacyLine(p1=(self.dots[u].x, self.dots[u].y), p2=(self.dots[v].x, self.dots[v].y))
+                      for u, v in edges]
+
+    def to_dict(self):
+        return {
+            "dots": [asdict(dot) for dot in self.dots],
+            "lines": [[list(line.p1), list(line.p2)] for line in self.lines],
+            "edges": [[int(u), int(v)] for u, v in self.graph.edges],
+        }
+
+    def render_input(self):
+        dots_data = [{'x': dot.x, 'y': dot.y, 'radius': dot.radius} for dot in self.dots]
+        lines_data = [{'start': line.p1, 'end': line.p2} for line in self.lines]
+        return dots_data, lines_data
+
+
+def lattice(rows: int, spacing: int = 20):
+    """A rows x rows dot lattice joined to its right and lower neighbours."""
+    grid_y, grid_x = np.divmod(np.arange(rows * rows), rows)
+    dots = np.stack([grid_x * spacing, grid_y * spacing, np.full_like(grid_x, 4)], axis=1)
+    index = np.arange(rows * rows).reshape(rows, rows)
+    edges = np.concatenate([
+        np.stack([index[:, :-1].ravel(), index[:, 1:].ravel()], axis=1),
+        np.stack([index[:-1, :].ravel(), index[1:, :].ravel()], axis=1),
+    ])
+    return dots.tolist(), edges.tolist()
+
+
+def retained_bytes(build):
+    """Bytes still allocated by build() once it returns, and its result."""
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, result
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def run(sizes, repeat):
+    print(f"{'dots':>7} {'edges':>7} {'':>8} {'memory MB':>10} {'build ms':>9} {'to_dict ms':>11} {'render in ms':>13}")
+    for rows in sizes:
+        dots, edges = lattice(rows)
+        implementations = {
+            'legacy': (lambda: LegacyPattern(dots, edges), lambda p: p.render_input()),
+            'arrays': (lambda: KolamPattern(dots=np.array(dots), edges=edges),
+                       lambda p: (p.dot_array, p.segments())),
+        }
+        for name, (build, render_input) in implementations.items():
+            memory, pattern = retained_bytes(build)
+            build_ms = timed(build, repeat)
+            to_dict_ms = timed(pattern.to_dict, repeat)
+            render_ms = timed(lambda: render_input(pattern), repeat)
+            print(f"{len(dots):>7} {len(edges):>7} {name:>8} {memory / 1e6:>10.2f} {build_ms:>9.1f} "
+                  f"{to_dict_ms:>11.1f} {render_ms:>13.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[30, 100, 300], help='dots per side of the lattice')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
@@ -0,0 +1,213 @@
+"""
+Stage-level benchmark and accuracy check for the vision pipeline.
+
+Generates synthetic kolams (benchmarks.synthetic) over a matrix of image
+sizes, grid sizes and noise levels. Every pipeline stage is timed on its
+own, repeated, and the median is kept: decode, downscale (pyramid mode),
+preprocess, centrelines, detect_dots, build_graph, analyze_pattern and
+render, plus the end-to-end analyze_kolam_image call. The end-to-end output
+is scored against the ground truth (dot recall and precision, edge recall
+and precision, exact edge set).
+
+The dot detector and the preprocessing tile height default to the app's
+configuration (DOT_DETECTOR, KOLAM_TILE_ROWS), so the stages are timed the
+way production runs them.
+
+Results are written as JSON. Given a baseline file from an earlier run, the
+benchmark exits with status 1 when a stage is slower than the baseline by
+more than the threshold, or when accuracy drops.
+
+Run from the backend directory:
+    python -m benchmarks.bench_pipeline --output results.json
+    python -m benchmarks.bench_pipeline --baseline results.json --threshold 0.2
+    python -m benchmarks.bench_pipeline --dot-detector cascade --tile-rows 0 --baseline results.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from config import Config
+
+from app.kolam_analysis import image_processor
+from app.kolam_analysis.analyzer import KolamAnalyzer
+from app.services import render_service, vision_service
+from app.utils import image_utils
+from benchmarks.synthetic import generate_kolam, score_detection
+
+ACCURACY_KEYS = ('dot_recall', 'dot_precision', 'edge_recall', 'edge_precision')
+
+
+def median_time(fn, repeat: int):
+    """Runs fn repeat times; returns the median seconds and the last result."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def bench_case(megapixels: float, rows: int, noise: float, repeat: int, pyramid: bool, seed: int,
+               dot_detector: str = Config.DOT_DETECTOR, tile_rows: int = Config.KOLAM_TILE_ROWS) -> dict:
+    truth = generate_kolam(megapixels, rows, noise=noise, seed=seed)
+    encoded = cv2.imencode('.png', truth.image)[1].tobytes()
+    stage_times = {}
+
+    stage_times['decode'], image = median_time(lambda: image_utils.decode_image_bytes(encoded)[0], repeat)
+
+    working = image
+    scale = image_processor.choose_working_scale(image) if pyramid else 1.0
+    if scale < 1.0:
+        stage_times['downscale'], working = median_time(lambda: image_processor.downscale(image, scale), repeat)
+
+    def preprocess():
+        if tile_rows:
+            return image_processor.preprocess_image_tiled(working, tile_rows)
+        return image_processor.preprocess_image(working)
+
+    stage_times['preprocess'], binary = median_time(preprocess, repeat)
+    stage_times['centrelines'], (skeleton, _) = median_time(
+        lambda: image_processor.extract_centrelines(binary), repeat)
+    detect = image_processor.DOT_DETECTORS[dot_detector]
+    stage_times['detect_dots'], dots = median_time(lambda: detect(working), repeat)
+
+    analyzer = KolamAnalyzer(image.shape)
+
+    def build_graph():
+        if tile_rows:
+            return analyzer.build_graph_from_pixels(dots, image_processor.iter_line_pixels(skeleton, tile_rows))
+        return analyzer.build_graph(dots, skeleton)
+
+    stage_times['build_graph'], _ = median_time(build_graph, repeat)
+    # analyze_pattern annotates the pattern in place, so each run gets a fresh graph
+    stage_times['analyze_pattern'] = statistics.median(_time_analyze(analyzer, build_graph) for _ in range(repeat))
+
+    stage_times['total'], (results, pattern) = median_time(
+        lambda: vision_service.analyze_kolam_image(image, pyramid=pyramid, dot_detector=dot_detector,
+                                                   tile_rows=tile_rows), repeat)
+
+    serialized = pattern.to_dict()
+    dots_xy = [(dot['x'], dot['y']) for dot in serialized['dots']]
+    stage_times['render'], _ = median_time(lambda: render_service.render_png(
+        *render_service.layout([dict(x=x, y=y, radius=truth.radius) for x, y in dots_xy],
+                               [{'start': p1, 'end': p2} for p1, p2 in serialized['lines']], 800), 800), repeat)
+
+    accuracy = score_detection(truth, dots_xy, [tuple(edge) for edge in serialized['edges']])
+    return {
+        'megapixels': megapixels,
+        'rows': rows,
+        'noise': noise,
+        'shape': list(image.shape[:2]),
+        'true_dots': len(truth.dots),
+        'true_edges': len(truth.edges),
+        'detected_dots': results['dot_count'],
+        'detected_edges': results['line_count'],
+        'stages_ms': {name: round(seconds * 1000, 3) for name, seconds in stage_times.items()},
+        'accuracy': accuracy,
+    }
+
+
+def _time_analyze(analyzer, build_graph) -> float:
+    pattern = build_graph()
+    start = time.perf_counter()
+    analyzer.analyze_pattern(pattern)
+    return time.perf_counter() - start
+
+
+def case_key(case: dict) -> tuple:
+    return case['megapixels'], case['rows'], case['noise']
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_ms: float) -> list:
+    """Regressions of results against baseline, as readable strings."""
+    previous = {case_key(case): case for case in baseline['cases']}
+    regressions = []
+    for case in results['cases']:
+        old = previous.get(case_key(case))
+        if old is None:
+            continue
+        label = f"{case['megapixels']} MP, {case['rows']}x{case['rows']}, noise {case['noise']}"
+        for stage, ms in case['stages_ms'].items():
+            old_ms = old['stages_ms'].get(stage)
+            if old_ms is not None and ms > old_ms * (1 + threshold) and ms - old_ms > min_delta_ms:
+                regressions.append(f"{label}: {stage} {old_ms:.1f} -> {ms:.1f} ms (+{(ms / old_ms - 1) * 100:.0f}%)")
+        for key in ACCURACY_KEYS:
+            if case['accuracy'][key] < old['accuracy'][key]:
+                regressions.append(f"{label}: {key} {old['accuracy'][key]} -> {case['accuracy'][key]}")
+        if old['accuracy']['edges_exact'] and not case['accuracy']['edges_exact']:
+            regressions.append(f"{label}: edge set no longer exact")
+    return regressions
+
+
+def run(args) -> int:
+    cases = []
+    header = f"{'MP':>5} {'grid':>5} {'noise':>5} {'total ms':>9} {'dots':>9} {'edges':>9} {'exact':>5}"
+    print(header)
+    for megapixels in args.megapixels:
+        for rows in args.grids:
+            for noise in args.noise:
+                case = bench_case(megapixels, rows, noise, args.repeat, not args.no_pyramid, args.seed,
+                                  args.dot_detector, args.tile_rows)
+                cases.append(case)
+                accuracy = case['accuracy']
+                print(f"{megapixels:>5} {rows:>5} {noise:>5} {case['stages_ms']['total']:>9.1f} "
+                      f"{accuracy['dot_recall']:>9.3f} {accuracy['edge_recall']:>9.3f} "
+                      f"{'yes' if accuracy['edges_exact'] else 'NO':>5}")
+
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'cpus': os.cpu_count(),
+            'repeat': args.repeat,
+            'pyramid': not args.no_pyramid,
+            'seed': args.seed,
+            'dot_detector': args.dot_detector,
+            'tile_rows': args.tile_rows,
+        },
+        'cases': cases,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--megapixels', type=float, nargs='+', default=[0.5, 2, 8], help='image sizes')
+    parser.add_argument('--grids', type=int, nargs='+', default=[5, 9, 15], help='dots per side')
+    parser.add_argument('--noise', type=float, nargs='+', default=[0, 12], help='noise std in grey levels')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per stage; the median is kept')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-pyramid', action='store_true', help='analyse at full resolution')
+    parser.add_argument('--dot-detector', default=Config.DOT_DETECTOR, choices=sorted(image_processor.DOT_DETECTORS),
+                        help='dot detection mode (default: DOT_DETECTOR, %(default)s)')
+    parser.add_argument('--tile-rows', type=int, default=Config.KOLAM_TILE_ROWS,
+                        help='preprocess in bands of this many rows, 0 for untiled '
+                             '(default: KOLAM_TILE_ROWS, %(default)s)')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed relative slowdown per stage before failing')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                        help='ignore slowdowns smaller than this many milliseconds')
+    sys.exit(run(parser.parse_args()))
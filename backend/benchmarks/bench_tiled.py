@@ -0,0 +1,63 @@
+"""
+Benchmark for tiled preprocessing of very large photos.
+
+Times preprocess_image over the whole frame against preprocess_image_tiled
+on bands of --tile-rows rows, and build_edges over the whole line image
+against build_edges_from_pixels fed band by band. Both tiled results are
+checked to be identical to the untiled ones.
+
+The bands run on the shared stage pool, so the speedup depends on
+--workers and on the cores available. Run it once per worker count to see
+how throughput scales:
+    python -m benchmarks.bench_tiled --workers 1
+    python -m benchmarks.bench_tiled --workers 4
+"""
+import argparse
+import os
+import statistics
+import time
+
+import numpy as np
+
+from app.kolam_analysis import graph_builder, image_processor
+from app.utils import stages
+from benchmarks.synthetic import generate_kolam
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def run(sizes, tile_rows, workers, repeat):
+    print(f"{os.cpu_count()} CPUs, {workers} stage workers, bands of {tile_rows} rows")
+    print(f"{'MP':>5} {'stage':>11} {'whole ms':>9} {'tiled ms':>9} {'speedup':>8} {'identical':>9}")
+    for megapixels in sizes:
+        truth = generate_kolam(megapixels, 15, noise=12, seed=0)
+        image = truth.image
+
+        whole_ms, binary = timed(lambda: image_processor.preprocess_image(image), repeat)
+        tiled_ms, tiled = timed(lambda: image_processor.preprocess_image_tiled(image, tile_rows), repeat)
+        print(f"{megapixels:>5} {'preprocess':>11} {whole_ms:>9.1f} {tiled_ms:>9.1f} "
+              f"{whole_ms / tiled_ms:>7.2f}x {'yes' if np.array_equal(binary, tiled) else 'NO':>9}")
+
+        whole_ms, edges = timed(lambda: graph_builder.build_edges(truth.dots, binary), repeat)
+        tiled_ms, streamed = timed(lambda: graph_builder.build_edges_from_pixels(
+            truth.dots, image_processor.iter_line_pixels(binary, tile_rows)), repeat)
+        print(f"{megapixels:>5} {'build_edges':>11} {whole_ms:>9.1f} {tiled_ms:>9.1f} "
+              f"{whole_ms / tiled_ms:>7.2f}x {'yes' if np.array_equal(edges, streamed) else 'NO':>9}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=float, nargs='+', default=[8, 20], help='image sizes in megapixels')
+    parser.add_argument('--tile-rows', type=int, default=512)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='threads in the stage pool')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    stages.configure(args.workers)
+    run(args.sizes, args.tile_rows, args.workers, args.repeat)
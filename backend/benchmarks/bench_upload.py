@@ -0,0 +1,96 @@
+"""
+Benchmark for the memory cost of uploading a photo to /api/analyze_kolam.
+
+A base64 JSON upload is held as the raw request body, the parsed JSON
+string and the decoded bytes at the same time. A raw image/* body is
+streamed into a spooled buffer, and a multipart upload goes to the form
+parser's spool; both are decoded in place. This posts the same JPEG in all
+three ways through the test client and reports, from tracemalloc:
+
+- upload: peak Python-heap memory from the start of the request until the
+  decoded image reaches the pipeline, minus the decoded image itself
+- request: peak over the whole request, analysis included
+
+Uploads past the in-memory spool (UPLOAD_SPOOL_BYTES, or about 500 KB for
+multipart) are read through a memory map of the temporary file. Those pages
+belong to the page cache, not the heap, so they do not show up here.
+
+Run from the backend directory:
+    python -m benchmarks.bench_upload
+    python -m benchmarks.bench_upload --megapixels 20 --spool-bytes 0
+"""
+import argparse
+import base64
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+
+from app import analysis_cache, artifact_store, create_app
+from app.services import pipeline_service
+from benchmarks.synthetic import generate_kolam
+
+
+def run(megapixels, quality, spool_bytes):
+    photo = cv2.imencode('.jpg', generate_kolam(megapixels, 15, noise=12, seed=0).image,
+                         [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+    app = create_app('production')
+    app.config['UPLOAD_SPOOL_BYTES'] = spool_bytes
+    app.config['ARTIFACT_DIR'] = tempfile.mkdtemp(prefix='kolam-bench-artifacts-')
+    artifact_store.init_app(app)
+
+    measured = {}
+    analyze = pipeline_service.run_analyze_pipeline
+
+    @app.before_request
+    def start_measuring():
+        # The test client has built the body by now; only the request's own allocations count
+        tracemalloc.reset_peak()
+        measured['baseline'] = tracemalloc.get_traced_memory()[0]
+
+    def measured_pipeline(image_array, *args, **kwargs):
+        measured['upload'] = tracemalloc.get_traced_memory()[1] - measured['baseline'] - image_array.nbytes
+        measured['image'] = image_array.nbytes
+        return analyze(image_array, *args, **kwargs)
+
+    pipeline_service.run_analyze_pipeline = measured_pipeline
+    modes = {
+        'base64 JSON': lambda: {'json': {'image_data': base64.b64encode(photo).decode()}},
+        'raw image/jpeg': lambda: {'data': photo, 'content_type': 'image/jpeg'},
+        'multipart': lambda: {'data': {'image': (io.BytesIO(photo), 'kolam.jpg')},
+                              'content_type': 'multipart/form-data'},
+    }
+
+    client = app.test_client()
+    print(f"{len(photo) / 1e6:.1f} MB JPEG, {megapixels} MP; in-memory spool up to {spool_bytes / 1e6:.1f} MB")
+    print(f"{'upload as':<16} {'upload MB':>10} {'x photo':>8} {'request MB':>11} {'ms':>7}")
+    tracemalloc.start()
+    try:
+        for name, request in modes.items():
+            # A cached analysis would make the later uploads look cheaper
+            analysis_cache.clear()
+            kwargs = request()
+            start = time.perf_counter()
+            response = client.post('/api/analyze_kolam', **kwargs)
+            elapsed = (time.perf_counter() - start) * 1000
+            peak = tracemalloc.get_traced_memory()[1] - measured['baseline']
+            assert response.status_code == 200, response.get_json()
+            print(f"{name:<16} {measured['upload'] / 1e6:>10.1f} {measured['upload'] / len(photo):>7.1f}x "
+                  f"{peak / 1e6:>11.1f} {elapsed:>7.0f}")
+    finally:
+        tracemalloc.stop()
+        pipeline_service.run_analyze_pipeline = analyze
+    print(f"(decoded image: {measured['image'] / 1e6:.1f} MB, not included in the upload column)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--megapixels', type=float, default=12)
+    parser.add_argument('--quality', type=int, default=97, help='JPEG quality of the uploaded photo')
+    parser.add_argument('--spool-bytes', type=int, default=int(os.environ.get('UPLOAD_SPOOL_BYTES', 1024 * 1024)),
+                        help='in-memory part of the upload spool')
+    args = parser.parse_args()
+    run(args.megapixels, args.quality, args.spool_bytes)
@@ -0,0 +1,77 @@
+"""
+Benchmark for the warm-up run by the production server before it forks.
+
+Starts a fresh interpreter per sample, creates the app, optionally runs
+warmup_service.warm_up and then times the first and second
+/api/analyze_kolam requests through the test client. OpenCV, SciPy and
+Pillow sit behind lazy facades, so without the warm-up the first request
+pays for importing them; with it, that cost moves to server start, before
+any traffic.
+
+Run from the backend directory:
+    python -m benchmarks.bench_warmup
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+import cv2
+
+from benchmarks.synthetic import generate_kolam
+
+SAMPLE = r'''
+import base64, json, sys, time
+start = time.perf_counter()
+from app import create_app
+from app.services import warmup_service
+app = create_app('production')
+loaded = time.perf_counter()
+if {warm}:
+    warmup_service.warm_up(app)
+ready = time.perf_counter()
+
+client = app.test_client()
+requests = []
+for path in sys.argv[1:]:
+    with open(path, 'rb') as f:
+        body = {{'image_data': base64.b64encode(f.read()).decode(), 'inline_images': True}}
+    begin = time.perf_counter()
+    assert client.post('/api/analyze_kolam', json=body).status_code == 200
+    requests.append(time.perf_counter() - begin)
+print(json.dumps({{'load': loaded - start, 'warmup': ready - loaded,
+                   'first': requests[0], 'second': requests[1]}}))
+'''
+
+
+def sample(warm: bool, paths) -> dict:
+    output = subprocess.run([sys.executable, '-W', 'ignore', '-c', SAMPLE.format(warm=warm), *paths],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(repeat, megapixels):
+    # The photos are drawn here, so the timed interpreters import nothing for them
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for seed in (1, 2):
+            paths.append(os.path.join(directory, f'kolam{seed}.png'))
+            cv2.imwrite(paths[-1], generate_kolam(megapixels, 9, noise=8, seed=seed).image)
+
+        print(f"{'mode':<6} {'app load ms':>12} {'warm-up ms':>11} {'1st request ms':>15} {'2nd request ms':>15}")
+        for warm in (False, True):
+            samples = [sample(warm, paths) for _ in range(repeat)]
+            median = {key: statistics.median(s[key] for s in samples) * 1000 for key in samples[0]}
+            print(f"{'warm' if warm else 'cold':<6} {median['load']:>12.0f} {median['warmup']:>11.0f} "
+                  f"{median['first']:>15.0f} {median['second']:>15.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3, help='fresh interpreters per mode')
+    parser.add_argument('--megapixels', type=float, default=4)
+    args = parser.parse_args()
+    run(args.repeat, args.megapixels)
@@ -0,0 +1,208 @@
+"""
+Fake-backend check for LLMClient and the Gemini calls in ai_service.
+
+Nothing here talks to Gemini. The client is driven with local callables
+that fail, stall or stream on cue, and ai_service gets a fake model through
+its model pool. Each check covers one path:
+
+- retry: transient errors are retried until one attempt succeeds, and
+  re-raised once the retries run out; other errors are raised at once
+- deadline: a stalled call or stream read is abandoned at the deadline
+- breaker: repeated failures open the circuit, calls then fail fast without
+  reaching the backend, and a successful trial call closes it again
+- ai_service: only attempts that reached the SDK count as API calls, the
+  image generation call included, and the vision answers fall back to the
+  offline interpretation when the LLM is unavailable before anything was
+  streamed
+
+Exits non-zero when any check fails.
+
+Run from the backend directory:
+    python -m benchmarks.check_llm_client
+"""
+import argparse
+import time
+
+from app.services.llm_client import CircuitOpenError, DeadlineExceededError, LLMClient
+
+RETRYABLE = (ConnectionError, TimeoutError)
+
+
+class FakeBackend:
+    """Callable backend that raises or sleeps per attempt, following a script."""
+
+    def __init__(self, *script, stall: float = 0.0):
+        self.script = list(script)
+        self.stall = stall
+        self.attempts = 0
+
+    def __call__(self, timeout: float):
+        self.attempts += 1
+        step = self.script.pop(0) if self.script else 'ok'
+        if step == 'stall':
+            time.sleep(self.stall)
+        elif isinstance(step, BaseException):
+            raise step
+        return f'answer {self.attempts}'
+
+
+class FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+def make_client(**kwargs) -> LLMClient:
+    options = dict(timeout=1.0, max_retries=2, base_delay=0.01, max_delay=0.02,
+                   failure_threshold=3, reset_timeout=0.3, workers=2, retryable=RETRYABLE)
+    options.update(kwargs)
+    return LLMClient(**options)
+
+
+def raises(error_type, fn):
+    try:
+        fn()
+    except error_type as e:
+        return e
+    raise AssertionError(f"expected {error_type.__name__}")
+
+
+def check_retry():
+    client = make_client()
+    backend = FakeBackend(ConnectionError('reset'), TimeoutError('slow'))
+    assert client.call(backend) == 'answer 3', "did not succeed on the third attempt"
+    assert client.stats()['retries'] == 2, client.stats()
+
+    backend = FakeBackend(*[ConnectionError('reset')] * 5)
+    raises(ConnectionError, lambda: client.call(backend))
+    assert backend.attempts == 3, f"{backend.attempts} attempts with max_retries=2"
+
+    # The exhausted retries above opened the breaker
+    client = make_client()
+    backend = FakeBackend(ValueError('bad request'))
+    raises(ValueError, lambda: client.call(backend))
+    assert backend.attempts == 1, "a non-retryable error was retried"
+    assert client.breaker.state == 'closed', "a non-retryable error counted against the breaker"
+
+
+def check_deadline():
+    client = make_client(timeout=0.2)
+    start = time.monotonic()
+    raises(DeadlineExceededError, lambda: client.call(FakeBackend('stall', stall=1.0)))
+    assert time.monotonic() - start < 0.5, "the call outlived its deadline"
+
+    def stalled_stream(timeout):
+        yield 'first'
+        time.sleep(1.0)
+        yield 'second'
+
+    items = []
+    start = time.monotonic()
+    raises(DeadlineExceededError, lambda: items.extend(client.stream(stalled_stream)))
+    assert items == ['first'], items
+    assert time.monotonic() - start < 0.5, "the stream read outlived its deadline"
+    assert client.stats()['timeouts'] == 2, client.stats()
+
+
+def check_breaker():
+    client = make_client(max_retries=0)
+    for _ in range(3):
+        raises(ConnectionError, lambda: client.call(FakeBackend(ConnectionError('reset'))))
+    assert client.breaker.state == 'open', client.breaker.state
+
+    backend = FakeBackend()
+    raises(CircuitOpenError, lambda: client.call(backend))
+    assert backend.attempts == 0, "an open breaker let a call through"
+
+    time.sleep(0.35)
+    assert client.breaker.state == 'half_open', client.breaker.state
+    assert client.call(backend) == 'answer 1'
+    assert client.breaker.state == 'closed', "a successful trial call did not close the breaker"
+
+    def broken_stream(timeout):
+        yield 'first'
+        raise ConnectionError('reset mid-stream')
+
+    for _ in range(3):
+        raises(ConnectionError, lambda: list(client.stream(broken_stream)))
+    assert client.breaker.state == 'open', "mid-stream failures did not reach the breaker"
+
+
+def check_ai_service():
+    from app import create_app, llm_client
+    from app.services import ai_service
+
+    class FakeModel:
+        def __init__(self, *script, stall: float = 0.0):
+            self.backend = FakeBackend(*script, stall=stall)
+
+        def generate_content(self, contents, stream=False, request_options=None):
+            text = self.backend(request_options['timeout'])
+            if not stream:
+                return FakeChunk('{"summary": "%s"}' % text)
+            return iter([FakeChunk('{"summary": '), FakeChunk('"%s"}' % text)])
+
+    def api_calls():
+        return ai_service.llm_stats()['api_calls']
+
+    app = create_app()
+    app.config.update(GOOGLE_API_KEY='fake-key', LLM_TIMEOUT=0.5, LLM_MAX_RETRIES=2,
+                      LLM_RETRY_BASE_DELAY=0.01, LLM_RETRY_MAX_DELAY=0.02,
+                      LLM_BREAKER_THRESHOLD=3, LLM_BREAKER_RESET=60.0)
+    llm_client.init_app(app)
+    analysis = {'dot_count': 9, 'line_count': 12}
+    with app.app_context():
+        key = (app.config['GOOGLE_API_KEY'], app.config['GEMINI_MODEL_NAME'])
+
+        ai_service._models[key] = FakeModel(ConnectionError('reset'))
+        before = api_calls()
+        result = ai_service.get_ai_response_with_vision('retried', analysis)
+        assert result.get('summary') == 'answer 2', result
+        assert api_calls() - before == 2, f"{api_calls() - before} API calls for two attempts"
+
+        # The remote image generator goes through the same accounting
+        ai_service._models[key] = FakeModel()
+        before = api_calls()
+        raises(ValueError, lambda: ai_service.generate_gemini_kolam([], [], analysis, 64, 'png', 0.5))
+        assert api_calls() - before == 1, "the image generation call was not counted"
+
+        ai_service._models[key] = FakeModel('stall', stall=1.0)
+        events = [event for event, _ in ai_service.stream_ai_response_with_vision('stalled', analysis)]
+        assert events == ['response'], f"no offline fallback for a stalled stream: {events}"
+
+        for _ in range(3):
+            llm_client.breaker.record_failure()
+        model = ai_service._models[key] = FakeModel()
+        before = api_calls()
+        result = ai_service.get_ai_response_with_vision('rejected', analysis)
+        assert result == ai_service.describe_analysis_offline(analysis), "no offline fallback while open"
+        events = [event for event, _ in ai_service.stream_ai_response_with_vision('rejected too', analysis)]
+        assert events == ['response'], events
+        assert model.backend.attempts == 0, "the open breaker let a call reach the model"
+        assert api_calls() == before, "calls rejected by the breaker were counted as API calls"
+
+
+CHECKS = {'retry': check_retry, 'deadline': check_deadline, 'breaker': check_breaker,
+          'ai_service': check_ai_service}
+
+
+def run(names):
+    failures = 0
+    for name in names:
+        try:
+            CHECKS[name]()
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL {name}: {e}")
+        else:
+            print(f"ok   {name}")
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('checks', nargs='*', metavar='check', help=f"checks to run: {', '.join(CHECKS)} (all by default)")
+    args = parser.parse_args()
+    unknown = set(args.checks) - set(CHECKS)
+    if unknown:
+        parser.error(f"unknown checks: {', '.join(sorted(unknown))}")
+    raise SystemExit(1 if run(args.checks or list(CHECKS)) else 0)
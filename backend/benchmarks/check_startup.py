@@ -0,0 +1,131 @@
+"""
+Startup-time budget check for the backend.
+
+OpenCV, SciPy, networkx, Pillow and the Gemini SDK sit behind lazy facades
+(app.utils.lazy), so creating the app only imports Flask and NumPy. This
+runs create_app in fresh interpreters under -X importtime and fails when:
+
+- the median time to import and create the app exceeds --budget-ms, or
+- any of the heavy modules is imported by app creation.
+
+- app creation imports a top-level package missing from the committed
+  baseline profile (benchmarks/importtime_baseline.txt), so new startup
+  dependencies are added on purpose and not by accident.
+
+It prints the imports with the largest cumulative time next to their time
+in the baseline. --profile saves the raw -X importtime log of the last run,
+and --update-baseline replaces the baseline with it.
+
+Run from the backend directory:
+    python -m benchmarks.check_startup
+    python -m benchmarks.check_startup --budget-ms 500 --profile /tmp/importtime.txt
+    python -m benchmarks.check_startup --update-baseline
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'importtime_baseline.txt')
+
+# Modules that must stay unloaded until a request needs them
+HEAVY_MODULES = ('cv2', 'scipy', 'networkx', 'PIL', 'google.generativeai', 'google.api_core')
+
+SAMPLE = r'''
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+app = create_app('production')
+created = time.perf_counter()
+response = app.test_client().get('/api/health/live')
+assert response.status_code == 200
+print(json.dumps({'create': created - start, 'first_request': time.perf_counter() - created,
+                  'heavy': [name for name in HEAVY_MODULES if name in sys.modules]}))
+'''
+
+
+def sample() -> tuple:
+    """Runs one fresh interpreter; returns its timings and its -X importtime log."""
+    code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n" + SAMPLE
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-W', 'ignore', '-c', code],
+                             capture_output=True, text=True, check=True)
+    return json.loads(process.stdout.strip().splitlines()[-1]), process.stderr
+
+
+def parse_profile(profile: str) -> dict:
+    """Cumulative microseconds of each module in an -X importtime log."""
+    times = {}
+    for line in profile.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def slowest_imports(profile: str, count: int):
+    """(cumulative microseconds, module) of the slowest imports in an -X importtime log."""
+    return sorted(((cumulative, name) for name, cumulative in parse_profile(profile).items()), reverse=True)[:count]
+
+
+def top_level_packages(profile: str) -> set:
+    return {name.split('.')[0] for name in parse_profile(profile)}
+
+
+def run(repeat, budget_ms, top, profile_path, update_baseline=False):
+    samples, profile = [], ''
+    for _ in range(repeat):
+        result, profile = sample()
+        samples.append(result)
+
+    create_ms = statistics.median(s['create'] for s in samples) * 1000
+    request_ms = statistics.median(s['first_request'] for s in samples) * 1000
+    heavy = sorted({name for s in samples for name in s['heavy']})
+
+    baseline = ''
+    if os.path.exists(BASELINE_PATH) and not update_baseline:
+        with open(BASELINE_PATH) as f:
+            baseline = f.read()
+    baseline_times = parse_profile(baseline)
+
+    print("slowest imports of the last run (cumulative ms, then the baseline's):")
+    for cumulative, name in slowest_imports(profile, top):
+        before = baseline_times.get(name)
+        print(f"{cumulative / 1000:>9.1f} {'-' if before is None else f'{before / 1000:.1f}':>9}  {name}")
+    for path in filter(None, (profile_path, BASELINE_PATH if update_baseline else None)):
+        with open(path, 'w') as f:
+            f.write(profile)
+        print(f"raw profile written to {os.path.abspath(path)}")
+
+    print(f"\ncreate_app: {create_ms:.0f} ms (budget {budget_ms:.0f} ms), first request: {request_ms:.1f} ms")
+    failures = []
+    if create_ms > budget_ms:
+        failures.append(f"app creation took {create_ms:.0f} ms, over the {budget_ms:.0f} ms budget")
+    if heavy:
+        failures.append(f"app creation imported {', '.join(heavy)}")
+    if baseline:
+        added = sorted(top_level_packages(profile) - top_level_packages(baseline))
+        if added:
+            failures.append(f"app creation imported {', '.join(added)}, which the baseline does not "
+                            f"(run with --update-baseline if that is intended)")
+    elif not update_baseline:
+        print(f"no baseline profile at {BASELINE_PATH}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK")
+    return len(failures)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('STARTUP_BUDGET_MS', 1000)))
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters to take the median over')
+    parser.add_argument('--top', type=int, default=15, help='slowest imports to list')
+    parser.add_argument('--profile', help='file to save the raw -X importtime log to')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='save the raw log of the last run as the new baseline profile')
+    args = parser.parse_args()
+    raise SystemExit(1 if run(args.repeat, args.budget_ms, args.top, args.profile, args.update_baseline) else 0)
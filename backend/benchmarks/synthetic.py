@@ -0,0 +1,113 @@
+"""
+Synthetic kolam photos with known ground truth.
+
+generate_kolam draws a rows x cols dot grid and a random subset of the
+horizontal and vertical neighbour edges at a chosen resolution, optionally
+with dot jitter, blur and sensor noise. The returned SyntheticKolam keeps the
+exact dot centres and edge set, so pipeline output can be scored with
+score_detection.
+"""
+from dataclasses import dataclass
+from typing import List, Set, Tuple
+
+import cv2
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+@dataclass
+class SyntheticKolam:
+    """A generated image together with the dots and edges it was drawn from."""
+    image: np.ndarray
+    dots: np.ndarray               # (N, 2) float centres in pixels
+    radius: int
+    spacing: float
+    edges: Set[Tuple[int, int]]    # (i, j) with i < j, indexing dots
+
+
+def generate_kolam(megapixels: float = 1.0, rows: int = 7, cols: int = None, edge_density: float = 1.0,
+                   noise: float = 0.0, blur: int = 0, jitter: float = 0.0, seed: int = 0) -> SyntheticKolam:
+    """
+    Draws a kolam-like photo of megapixels total size.
+
+    edge_density is the fraction of neighbour edges drawn (1.0 draws the full
+    lattice). Lines stop short of the dots, as in hand-drawn kolams, so each
+    line touches only its own two dots. noise is the standard deviation of
+    Gaussian noise in grey levels, blur an odd Gaussian kernel size (0 for
+    none) and jitter the dot displacement as a fraction of the spacing.
+    """
+    cols = cols or rows
+    rng = np.random.default_rng(seed)
+    aspect = cols / rows
+    height = int(np.sqrt(megapixels * 1_000_000 / aspect))
+    width = int(height * aspect)
+    spacing = min(width / (cols + 1), height / (rows + 1))
+    radius = max(2, int(round(spacing / 14)))
+    thickness = max(1, int(round(spacing / 40)))
+    gap = radius + max(2, int(round(spacing / 10)))
+
+    grid_x, grid_y = np.meshgrid(np.arange(1, cols + 1), np.arange(1, rows + 1))
+    dots = np.stack([grid_x.ravel(), grid_y.ravel()], axis=1) * spacing
+    dots += rng.uniform(-jitter, jitter, dots.shape) * spacing
+
+    candidates = []
+    for index in range(rows * cols):
+        row, col = divmod(index, cols)
+        if col + 1 < cols:
+            candidates.append((index, index + 1))
+        if row + 1 < rows:
+            candidates.append((index, index + cols))
+    keep = rng.random(len(candidates)) < edge_density
+    edges = {edge for edge, kept in zip(candidates, keep) if kept}
+
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    for i, j in sorted(edges):
+        start, end = dots[i], dots[j]
+        direction = (end - start) / np.linalg.norm(end - start)
+        a = np.round(start + direction * gap).astype(int)
+        b = np.round(end - direction * gap).astype(int)
+        cv2.line(image, tuple(a.tolist()), tuple(b.tolist()), (0, 0, 0), thickness, cv2.LINE_AA)
+    for x, y in np.round(dots).astype(int):
+        cv2.circle(image, (int(x), int(y)), radius, (0, 0, 0), -1, cv2.LINE_AA)
+
+    if blur:
+        image = cv2.GaussianBlur(image, (blur | 1, blur | 1), 0)
+    if noise:
+        noisy = image.astype(np.float32) + rng.normal(0, noise, image.shape[:2])[..., None]
+        image = np.clip(noisy, 0, 255).astype(np.uint8)
+    return SyntheticKolam(image=image, dots=dots, radius=radius, spacing=spacing, edges=edges)
+
+
+def score_detection(truth: SyntheticKolam, detected_dots: List[Tuple[float, float]],
+                    detected_edges: List[Tuple[int, int]]) -> dict:
+    """
+    Scores detected dots and edges against the ground truth. A detected dot
+    matches the nearest true dot within a quarter of the spacing (each true
+    dot at most once); edges are compared after mapping through the match.
+    """
+    tolerance = truth.spacing * 0.25
+    detected = np.asarray(detected_dots, dtype=np.float64).reshape(-1, 2)
+    mapping = {}
+    if len(detected):
+        distances, nearest = cKDTree(truth.dots).query(detected, distance_upper_bound=tolerance)
+        for index in np.argsort(distances):
+            if np.isfinite(distances[index]) and nearest[index] not in mapping.values():
+                mapping[int(index)] = int(nearest[index])
+
+    found_edges = set()
+    for u, v in detected_edges:
+        if u in mapping and v in mapping:
+            i, j = mapping[u], mapping[v]
+            found_edges.add((min(i, j), max(i, j)))
+        else:
+            # Edges touching unmatched dots can never be right
+            found_edges.add((-1 - u, -1 - v))
+
+    true_positive_edges = len(found_edges & truth.edges)
+    return {
+        'dot_recall': round(len(mapping) / len(truth.dots), 4),
+        'dot_precision': round(len(mapping) / len(detected), 4) if len(detected) else 0.0,
+        'edge_recall': round(true_positive_edges / len(truth.edges), 4) if truth.edges else 1.0,
+        'edge_precision': round(true_positive_edges / len(found_edges), 4) if found_edges else 1.0,
+        'edges_exact': found_edges == truth.edges,
+    }
@@ -7,6 +7,82 @@ class Config:
     GEMINI_MODEL_NAME = os.environ.get('GEMINI_MODEL_NAME', 'gemini-1.5-flash')
     KOLAM_GPT_SYSTEM_PROMPT = os.environ.get('KOLAM_GPT_SYSTEM_PROMPT', 'You are KolamGPT, an expert on the traditional South Indian art of kolam. Provide helpful, accurate information about kolam patterns, techniques, cultural significance, and related topics.')
 
+    # Vision pipeline: thin the line image to centrelines before building the graph
+    KOLAM_SKELETONIZE = os.environ.get('KOLAM_SKELETONIZE', 'True').lower() == 'true'
+    # Vision pipeline: analyse large photos at a working resolution picked from
+    # the dot scale, optionally re-centring dots at full resolution afterwards
+    KOLAM_PYRAMID = os.environ.get('KOLAM_PYRAMID', 'True').lower() == 'true'
+    KOLAM_PYRAMID_REFINE = os.environ.get('KOLAM_PYRAMID_REFINE', 'False').lower() == 'true'
+    # Vision pipeline: dot detection mode. 'cascade' tries the detectors one
+    # after another as fallbacks; 'fused' runs all of them concurrently and
+    # votes on their candidates
+    DOT_DETECTOR = os.environ.get('DOT_DETECTOR', 'fused')
+    # Vision pipeline: preprocess in parallel bands of this many rows (0 disables tiling)
+    KOLAM_TILE_ROWS = int(os.environ.get('KOLAM_TILE_ROWS', 512))
+
+    # Digital recreation: canvas size in pixels and output format ('png' or 'svg')
+    RENDER_SIZE = int(os.environ.get('RENDER_SIZE', 800))
+    RENDER_FORMAT = os.environ.get('RENDER_FORMAT', 'png')
+    # Digital recreation strategy: 'procedural' renders in the request; a remote
+    # strategy ('gemini') also runs as a background job limited to the timeout
+    IMAGE_GENERATOR = os.environ.get('IMAGE_GENERATOR', 'procedural')
+    IMAGE_GENERATOR_TIMEOUT = float(os.environ.get('IMAGE_GENERATOR_TIMEOUT', 60))
+
+    # Upload limits, checked before an image is decoded
+    MAX_IMAGE_BYTES = int(os.environ.get('MAX_IMAGE_BYTES', 25 * 1024 * 1024))
+    MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', 50_000_000))
+    # Binary uploads to /api/analyze_kolam are buffered in memory up to this
+    # many bytes and spooled to a temporary file beyond
+    UPLOAD_SPOOL_BYTES = int(os.environ.get('UPLOAD_SPOOL_BYTES', 1024 * 1024))
+    # In pyramid mode, large photos are decoded at 1/2, 1/4 or 1/8 size as long
+    # as at least this many pixels remain
+    DECODE_MIN_PIXELS = int(os.environ.get('DECODE_MIN_PIXELS', 3_000_000))
+
+    # Analysis cache: in-memory byte budget and an optional on-disk directory,
+    # with the size cap of that directory and how long an entry is kept after
+    # it was last used (seconds; 0 disables either limit)
+    ANALYSIS_CACHE_MAX_BYTES = int(os.environ.get('ANALYSIS_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    ANALYSIS_CACHE_DIR = os.environ.get('ANALYSIS_CACHE_DIR')
+    ANALYSIS_CACHE_DISK_MAX_BYTES = int(os.environ.get('ANALYSIS_CACHE_DISK_MAX_BYTES', 256 * 1024 * 1024))
+    ANALYSIS_CACHE_DISK_RETENTION = float(os.environ.get('ANALYSIS_CACHE_DISK_RETENTION', 7 * 24 * 3600))
+
+    # LLM response cache: entry count and time to live in seconds (0 disables it)
+    LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 1024))
+    LLM_CACHE_TTL = float(os.environ.get('LLM_CACHE_TTL', 3600))
+
+    # LLM calls: per-request deadline in seconds, retries with jittered
+    # exponential backoff inside that deadline, and the circuit breaker that
+    # opens after consecutive failures
+    LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 20))
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 2))
+    LLM_RETRY_BASE_DELAY = float(os.environ.get('LLM_RETRY_BASE_DELAY', 0.5))
+    LLM_RETRY_MAX_DELAY = float(os.environ.get('LLM_RETRY_MAX_DELAY', 4))
+    LLM_BREAKER_THRESHOLD = int(os.environ.get('LLM_BREAKER_THRESHOLD', 5))
+    LLM_BREAKER_RESET = float(os.environ.get('LLM_BREAKER_RESET', 30))
+
+    # Directory of the content-addressed image store behind /api/artifacts,
+    # how long artifacts are kept after they were last stored (seconds) and
+    # the size cap of the directory (0 disables either limit). Clients may
+    # cache an artifact for ARTIFACT_MAX_AGE, but never past its retention.
+    ARTIFACT_DIR = os.environ.get('ARTIFACT_DIR')
+    ARTIFACT_RETENTION = float(os.environ.get('ARTIFACT_RETENTION', 7 * 24 * 3600))
+    ARTIFACT_MAX_BYTES = int(os.environ.get('ARTIFACT_MAX_BYTES', 1024 * 1024 * 1024))
+    ARTIFACT_MAX_AGE = int(os.environ.get('ARTIFACT_MAX_AGE', 365 * 24 * 3600))
+
+    # Request logging: fraction of /api/chat requests logged, and the length
+    # each logged field value is cut to
+    REQUEST_LOG_SAMPLE_RATE = float(os.environ.get('REQUEST_LOG_SAMPLE_RATE', 0.1))
+    REQUEST_LOG_MAX_CHARS = int(os.environ.get('REQUEST_LOG_MAX_CHARS', 200))
+
+    # Threads shared by the concurrent stages of the analysis pipeline
+    STAGE_WORKERS = int(os.environ.get('STAGE_WORKERS', 4))
+
+    # Asynchronous analysis jobs
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', 32))
+    JOB_RESULT_TTL = float(os.environ.get('JOB_RESULT_TTL', 600))
+    JOB_MAX_WAIT = float(os.environ.get('JOB_MAX_WAIT', 30))
+
     # Email configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
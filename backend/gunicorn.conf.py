@@ -0,0 +1,50 @@
+"""
+Production server settings: gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is loaded and warmed up once in the master process: a synthetic
+kolam goes through every local stage of the analysis pipeline before any
+worker forks, so workers inherit loaded libraries and start warm, and the
+socket accepts no connection until then. Analysis is CPU-bound, so there
+is one worker per core by default, and each worker caps OpenCV's internal
+threads so that together they do not oversubscribe the cores.
+"""
+import os
+
+from dotenv import load_dotenv
+
+# The settings below, and the app preloaded after this file, read .env too
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
+
+cpus = os.cpu_count() or 1
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"
+# Worker processes, and threads per worker for long polls and event streams
+workers = int(os.environ.get('WEB_WORKERS', cpus))
+threads = int(os.environ.get('WEB_THREADS', 2))
+worker_class = 'gthread'
+# Large photos can take several seconds to analyse
+timeout = int(os.environ.get('WEB_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+preload_app = True
+accesslog = '-'
+
+# OpenCV threads per worker; BLAS and OpenMP pools follow the same cap.
+# They are set before the app (and so NumPy) is imported by the preload.
+opencv_threads = int(os.environ.get('OPENCV_THREADS', max(1, cpus // workers)))
+for variable in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(variable, str(opencv_threads))
+
+
+def when_ready(server):
+    # Runs in the master after the socket is bound and before workers fork
+    if os.environ.get('WARMUP', 'True').lower() != 'true':
+        return
+    from app.services import warmup_service
+    result = warmup_service.warm_up(server.app.wsgi())
+    server.log.info(f"Warm-up analysis finished in {result['seconds'] * 1000:.0f} ms")
+
+
+def post_fork(server, worker):
+    from app.services import warmup_service
+    warmup_service.configure_worker(opencv_threads)
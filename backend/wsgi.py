@@ -0,0 +1,11 @@
+import os
+from dotenv import load_dotenv
+
+# config.Config reads the environment when app is imported, so .env goes first
+load_dotenv()
+
+from app import create_app
+
+# Production WSGI entry point, served by gunicorn with gunicorn.conf.py:
+#     gunicorn -c gunicorn.conf.py wsgi:app
+app = create_app(os.environ.get('FLASK_CONFIG', 'production'))
@@ -3,14 +3,18 @@ const API_BASE_URL = 'http://127.0.0.1:5001/api';
 export const analyzeKolamApi = async (uploadedImage) => {
     const endpoint = `${API_BASE_URL}/analyze_kolam`;
 
-    const payload = {
-        image_data: uploadedImage?.data || null,
-    };
+    // Send the file itself when we have it; base64 JSON is the fallback
+    const file = uploadedImage?.file;
+    const request = file
+        ? { headers: { 'Content-Type': file.type }, body: file }
+        : {
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ image_data: uploadedImage?.data || null }),
+        };
 
     const response = await fetch(endpoint, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(payload),
+        ...request,
     });
 
     if (!response.ok) {